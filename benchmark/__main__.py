@@ -0,0 +1,103 @@
+"""
+Benchmark suite on a deterministic synthetic corpus:
+
+    python -m benchmark [--files 20] [--pages 5 60] [--save-baseline] [--baseline benchmark/baseline.json]
+
+Each stage runs in its own process, so its peak RSS is measured alone. Results are written as json and compared
+with the baseline: the command fails if a throughput drops or a peak RSS grows more than --tolerance, or if the
+prefilter mode does not detect the same pages as the full mode. Throughputs depend on the host, so the baseline is
+saved on each host with --save-baseline: without it, the command fails instead of only recording the results.
+"""
+import argparse, json, os, sys, tempfile, multiprocessing
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmark.corpus import generate_corpus
+from benchmark.stages import STAGES, HIGHER_IS_BETTER, LOWER_IS_BETTER, MUST_BE_ZERO, run_stage
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    Returns:
+        list: Description of each regression
+    """
+    regressions = [f"{stage}.{metric}: {value:.0f} != 0" for stage, metrics in results['stages'].items()
+                   for metric, value in metrics.items() if metric in MUST_BE_ZERO and value != 0]
+    for stage, metrics in baseline.get('stages', {}).items():
+        for metric, expected in metrics.items():
+            value = results['stages'].get(stage, {}).get(metric)
+            if value is None:
+                continue
+            if metric in HIGHER_IS_BETTER and value < expected * (1 - tolerance):
+                regressions.append(f"{stage}.{metric}: {value:.1f} < {expected:.1f} (-{1 - value / expected:.0%})")
+            if metric in LOWER_IS_BETTER and value > expected * (1 + tolerance):
+                regressions.append(f"{stage}.{metric}: {value:.1f} > {expected:.1f} (+{value / expected - 1:.0%})")
+    return regressions
+
+def main() -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmark", description="Benchmark PDFSearch on a synthetic corpus")
+    parser.add_argument('--files', type=int, default=20, help="Number of pdf of the corpus")
+    parser.add_argument('--pages', type=int, nargs=2, default=[5, 60], metavar=('MIN', 'MAX'), help="Number of pages by pdf")
+    parser.add_argument('--words', type=int, default=300, help="Number of words by page")
+    parser.add_argument('--accent-rate', type=float, default=0.3, help="Probability to add accents to a word")
+    parser.add_argument('--hit-rate', type=float, default=0.05, help="Probability for a page to contain keywords")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--keyword-file', default=os.path.join(ROOT, 'keywords.csv'))
+    parser.add_argument('--threshold', type=int, default=7)
+    parser.add_argument('--workers', type=int, default=max(1, (os.cpu_count() or 2) // 2), help="n_workers of the main stage")
+    parser.add_argument('--repeat', type=int, default=50, help="Number of copies of the corpus results for format_task and render_data")
+    parser.add_argument('--stages', nargs='+', choices=list(STAGES), default=list(STAGES))
+    parser.add_argument('--work', help="Work folder, the corpus is kept there (default: temporary folder)")
+    parser.add_argument('--output', default=os.path.join(ROOT, 'benchmark', 'benchmark_results.json'), help="Json file of the results")
+    parser.add_argument('--baseline', default=os.path.join(ROOT, 'benchmark', 'baseline.json'))
+    parser.add_argument('--save-baseline', action='store_true', help="Save the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="Accepted relative regression")
+    args = parser.parse_args()
+
+    work = args.work or tempfile.mkdtemp(prefix='pdfsearch-benchmark-')
+    corpus = os.path.join(work, f"corpus_{args.files}_{args.pages[0]}_{args.pages[1]}_{args.words}_{args.accent_rate}_{args.hit_rate}_{args.seed}")
+    if not os.path.isdir(corpus):
+        print(f"Generating corpus in {corpus}")
+        generate_corpus(corpus, args.keyword_file, args.files, tuple(args.pages), args.words, args.accent_rate, args.hit_rate, args.seed)
+
+    import pypdf
+    n_pages = sum(len(pypdf.PdfReader(os.path.join(corpus, f)).pages) for f in os.listdir(corpus))
+    stage_args = {'corpus': corpus, 'work': work, 'keyword_file': os.path.abspath(args.keyword_file), 'threshold': args.threshold,
+                  'workers': args.workers, 'repeat': args.repeat, 'n_pages': n_pages}
+
+    results = {'date': datetime.now().isoformat(timespec='seconds'), 'corpus': {**vars(args), 'pages_total': n_pages}, 'stages': {}}
+    context = multiprocessing.get_context('spawn')
+    for name in args.stages:
+        with context.Pool(1) as pool:
+            results['stages'][name] = pool.apply(run_stage, (name, stage_args))
+        print(name + ': ' + ', '.join(f"{metric}={value:.1f}" for metric, value in results['stages'][name].items()))
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2, default=str)
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        baseline = {'corpus': results['corpus'], 'stages': {stage: {metric: value for metric, value in metrics.items()
+                    if metric in HIGHER_IS_BETTER + LOWER_IS_BETTER} for stage, metrics in results['stages'].items()}}
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, default=str)
+        print(f"Baseline saved to {args.baseline}")
+    elif os.path.isfile(args.baseline):
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+    else:
+        baseline = None
+    regressions = compare(results, baseline or {}, args.tolerance)
+    for regression in regressions:
+        print(f"REGRESSION {regression}", file=sys.stderr)
+    if regressions:
+        return 1
+    if baseline is None:
+        print(f"ERROR No baseline ({args.baseline}): throughputs can not be checked. Run with --save-baseline on the reference commit first", file=sys.stderr)
+        return 2
+    print("No regression compared to the baseline")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,103 @@
+"""
+Deterministic synthetic pdf corpus. The same arguments always give byte identical pdf.
+"""
+import os, random, zlib
+import pandas as pd
+
+FILLER = [
+    "rapport", "activité", "université", "enseignement", "recherche", "budget", "étudiants", "personnel",
+    "année", "formation", "licence", "master", "doctorat", "service", "dépenses", "recettes", "conseil",
+    "administration", "bâtiment", "énergie", "numérique", "bibliothèque", "évaluation", "réussite", "le",
+    "la", "les", "de", "des", "du", "et", "pour", "dans", "sur", "avec", "une", "un", "en",
+]
+ACCENTS = str.maketrans("aeiouc", "àéîôùç")
+
+def escape(text: str) -> str:
+    return text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+
+def make_pdf(path: str, pages: list) -> None:
+    """
+    Write a pdf with one Helvetica (WinAnsiEncoding) text page by element of pages
+
+    Args:
+        path (str): Destination of the pdf
+        pages (list): Text of each page
+    """
+    n = len(pages)
+    font_id = 3 + 2 * n
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        f'<< /Type /Pages /Kids [{" ".join(f"{3 + 2 * i} 0 R" for i in range(n))}] /Count {n} >>'.encode(),
+    ]
+    for i, text in enumerate(pages):
+        lines = [text[j:j + 90] for j in range(0, len(text), 90)]
+        content = 'BT /F1 9 Tf 36 806 Td 11 TL ' + ' '.join(f"({escape(line)}) '" for line in lines) + ' ET'
+        stream = zlib.compress(content.encode('cp1252', 'replace'))
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Resources << /Font << /F1 {font_id} 0 R >> >> /Contents {4 + 2 * i} 0 R >>'.encode())
+        objects.append(f'<< /Length {len(stream)} /Filter /FlateDecode >>\nstream\n'.encode() + stream + b'\nendstream')
+    objects.append(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>')
+
+    out = bytearray(b'%PDF-1.4\n')
+    offsets = []
+    for i, obj in enumerate(objects):
+        offsets.append(len(out))
+        out += f'{i + 1} 0 obj\n'.encode() + obj + b'\nendobj\n'
+    xref = len(out)
+    out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode()
+    out += b''.join(f'{offset:010d} 00000 n \n'.encode() for offset in offsets)
+    out += f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n'.encode()
+    with open(path, 'wb') as f:
+        f.write(out)
+
+def page_text(rng: random.Random, keywords: list, n_words: int, accent_rate: float, hit: bool) -> str:
+    """
+    Args:
+        rng (random.Random): Random generator
+        keywords (list): Keywords of keyword_file
+        n_words (int): Number of words of the page
+        accent_rate (float): Probability to add accents to a filler word
+        hit (bool): Add keywords to the page, to reach a high score
+
+    Returns:
+        str: Text of the page
+    """
+    words = []
+    for _ in range(n_words):
+        word = rng.choice(FILLER)
+        if rng.random() < accent_rate:
+            word = word.translate(ACCENTS)
+        words.append(word.capitalize() if rng.random() < 0.1 else word)
+    if hit:
+        for keyword in rng.sample(keywords, k=max(1, len(keywords) * 2 // 3)):
+            cut = rng.randrange(1, len(keyword)) if len(keyword) > 1 and rng.random() < 0.3 else len(keyword)
+            words.insert(rng.randrange(len(words) + 1), f"{keyword[:cut]} {keyword[cut:]}".strip().upper()) # Split or upper case words are still detected
+    return ' '.join(words)
+
+def generate_corpus(folder: str, keyword_file: str, n_files: int = 20, n_pages: int | tuple = (5, 60), words_per_page: int = 300,
+                    accent_rate: float = 0.3, hit_rate: float = 0.05, seed: int = 0) -> list:
+    """
+    Generate a deterministic corpus of pdf
+
+    Args:
+        folder (str): Destination folder (created if needed)
+        keyword_file (str): Csv file of keywords, used to build pages that reach the threshold
+        n_files (int): Number of pdf
+        n_pages (int|tuple): Number of pages of each pdf, or (min, max) interval
+        words_per_page (int): Number of words by page
+        accent_rate (float): Probability to add accents to a filler word
+        hit_rate (float): Probability for a page to contain keywords
+        seed (int): Seed of the random generator
+
+    Returns:
+        list: Paths of the generated pdf
+    """
+    os.makedirs(folder, exist_ok=True)
+    keywords = [word for word in pd.read_csv(keyword_file, dtype={'Word': str})['Word'] if word.isalpha()]
+    rng = random.Random(seed)
+    paths = []
+    for i in range(n_files):
+        pages = n_pages if isinstance(n_pages, int) else rng.randint(*n_pages)
+        path = os.path.join(folder, f"synthetic_{seed}_{i:04d}.pdf")
+        make_pdf(path, [page_text(rng, keywords, words_per_page, accent_rate, rng.random() < hit_rate) for _ in range(pages)])
+        paths.append(path)
+    return paths
@@ -0,0 +1,274 @@
+"""
+Benchmarked stages. Each stage runs in its own process (see __main__.py) and returns its metrics.
+"""
+import json, os, sys, time, resource, subprocess, queue
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HIGHER_IS_BETTER = ('pages_per_sec', 'files_per_sec', 'rows_per_sec')
+LOWER_IS_BETTER = ('peak_rss_mb', 'query_ms', 'report_kb')
+MUST_BE_ZERO = ('mismatches',)
+
+def peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    return resource.getrusage(who).ru_maxrss / 1024 # ru_maxrss is in KiB on Linux
+
+def bench_option(args: dict, **overrides):
+    from script.option import Option
+    from script.script import load_keywords
+    import logging
+
+    values = dict(
+        pdf_folder=args['corpus'] + os.sep, data_folder=os.path.join(args['work'], 'data') + os.sep,
+        result_file=os.path.join(args['work'], 'result.html'), keyword_file=args['keyword_file'],
+        watch_import=False, force_scan=True, clear_when_force_scan=True, sort_data='Timestamp',
+        n_workers=args['workers'], check_keyword=True, threshold=args['threshold'],
+        watcher_year_interval=[2004, 2024], request_timeout=12, cache_size=0, split_pages=0, progress_bar=False, ngram_index=False, backends='pypdf',
+    )
+    values.update(overrides)
+    option = Option(**values)
+    os.makedirs(option.data_folder, exist_ok=True)
+    load_keywords(option, logging.getLogger('benchmark'))
+    return option
+
+def new_worker(option):
+    from script.pdf_scan.worker import Worker
+    return Worker(option, queue.SimpleQueue(), queue.SimpleQueue(), queue.SimpleQueue())
+
+def corpus_files(args: dict) -> list:
+    return sorted(os.path.join(args['corpus'], f) for f in os.listdir(args['corpus']) if f.endswith('.pdf'))
+
+def scan_corpus(worker, files: list) -> list:
+    return [worker.scan_task({"path": path, "timestamp": datetime.now(), "url": ""}) for path in files]
+
+def stage_analyse_text(args: dict) -> dict:
+    import pypdf
+    worker = new_worker(bench_option(args))
+    texts = []
+    for path in corpus_files(args):
+        texts.extend(page.extract_text() for page in pypdf.PdfReader(path).pages)
+    start = time.perf_counter()
+    for text in texts:
+        worker.analyse_text(text)
+    duration = time.perf_counter() - start
+    return {'pages': len(texts), 'seconds': duration, 'pages_per_sec': len(texts) / duration}
+
+def stage_scan_task(args: dict) -> dict:
+    worker = new_worker(bench_option(args))
+    files = corpus_files(args)
+    start = time.perf_counter()
+    scanned = scan_corpus(worker, files)
+    duration = time.perf_counter() - start
+    n_pages = sum(pdf_data['n_pages'] for pdf_data in scanned)
+    return {'files': len(files), 'pages': n_pages, 'seconds': duration,
+            'pages_per_sec': n_pages / duration, 'files_per_sec': len(files) / duration}
+
+def stage_prefilter(args: dict) -> dict:
+    """
+    Scan the corpus without then with the prefilter. Both must detect the same pages with the same scores
+    """
+    files = corpus_files(args)
+    durations, detected = {}, {}
+    for prefilter in (False, True):
+        worker = new_worker(bench_option(args, prefilter=prefilter))
+        start = time.perf_counter()
+        scanned = scan_corpus(worker, files)
+        durations[prefilter] = time.perf_counter() - start
+        detected[prefilter] = [(pdf_data['pages'].tolist(), pdf_data['scores'].tolist()) for pdf_data in scanned]
+    n_pages = args['n_pages']
+    return {'files': len(files), 'pages': n_pages, 'seconds': durations[True], 'pages_per_sec': n_pages / durations[True],
+            'speedup': durations[False] / durations[True],
+            'mismatches': sum(full != prefiltered for full, prefiltered in zip(detected[False], detected[True]))}
+
+def stage_profiles(args: dict) -> dict:
+    """
+    Scan the corpus once for three keyword profiles (keyword_file with three thresholds), then once for each of them.
+    Each profile must detect the same pages with the same scores
+    """
+    files = corpus_files(args)
+    thresholds = [args['threshold'], args['threshold'] - 2, args['threshold'] + 2]
+    option = bench_option(args, profiles=f"low={args['keyword_file']}:{thresholds[1]},high={args['keyword_file']}:{thresholds[2]}")
+    start = time.perf_counter()
+    scanned = scan_corpus(new_worker(option), files)
+    duration = time.perf_counter() - start
+    detected = [[(pdf_data['pages'].tolist(), pdf_data['scores'].tolist()) for pdf_data in scanned]]
+    detected += [[(pdf_data['profiles'][i][0].tolist(), pdf_data['profiles'][i][1].tolist()) for pdf_data in scanned] for i in range(2)]
+    separate, mismatches = 0, 0
+    for threshold, found in zip(thresholds, detected):
+        start = time.perf_counter()
+        expected = scan_corpus(new_worker(bench_option(args, threshold=threshold)), files)
+        separate += time.perf_counter() - start
+        mismatches += sum(pages != (pdf_data['pages'].tolist(), pdf_data['scores'].tolist()) for pages, pdf_data in zip(found, expected))
+    n_pages = args['n_pages']
+    return {'files': len(files), 'pages': n_pages, 'seconds': duration, 'pages_per_sec': n_pages / duration,
+            'speedup': separate / duration, 'mismatches': mismatches}
+
+def stage_first_hit(args: dict) -> dict:
+    """
+    Scan the corpus fully then until the first detected page, last third first. The first hit must be a page detected
+    by the full scan, with the same score, and found in every pdf with a detected page
+    """
+    files = corpus_files(args)
+    durations, detected = {}, {}
+    for max_hits in (0, 1):
+        worker = new_worker(bench_option(args, max_hits=max_hits, page_order='last_third'))
+        start = time.perf_counter()
+        scanned = scan_corpus(worker, files)
+        durations[max_hits] = time.perf_counter() - start
+        detected[max_hits] = [set(zip(pdf_data['pages'], pdf_data['scores'])) for pdf_data in scanned]
+    n_pages = args['n_pages']
+    return {'files': len(files), 'pages': n_pages, 'seconds': durations[1], 'speedup': durations[0] / durations[1],
+            'mismatches': sum(not hit <= full or bool(full) != bool(hit) for full, hit in zip(detected[0], detected[1]))}
+
+def stage_backends(args: dict) -> dict:
+    """
+    Scan the corpus with each installed backend alone, then with 'raw,pypdf' which must detect the same pages as pypdf
+    """
+    from script.pdf_scan.backends import BACKENDS
+    files = corpus_files(args)
+    n_pages = args['n_pages']
+    result, detected = {'files': len(files), 'pages': n_pages}, {}
+    for backends in [name for name, backend in BACKENDS.items() if backend.available] + ['raw,pypdf']:
+        worker = new_worker(bench_option(args, backends=backends))
+        start = time.perf_counter()
+        scanned = scan_corpus(worker, files)
+        duration = time.perf_counter() - start
+        detected[backends] = [(pdf_data['pages'].tolist(), pdf_data['scores'].tolist()) for pdf_data in scanned]
+        result[f"{backends.replace(',', '_')}_pages_per_sec"] = n_pages / duration
+    result.update({'seconds': duration, 'pages_per_sec': n_pages / duration,
+                   'mismatches': sum(full != fast for full, fast in zip(detected['pypdf'], detected['raw,pypdf']))})
+    return result
+
+def stage_ngram_index(args: dict) -> dict:
+    """
+    Scan the corpus while building the n-gram index, then search every keyword of keyword_file.
+    Counts must be the ones of the scanned texts
+    """
+    import shutil, pypdf
+    from script.pdf_scan.ngram_index import NgramIndex
+    option = bench_option(args, ngram_index=True)
+    shutil.rmtree(os.path.join(option.data_folder, 'index'), ignore_errors=True)
+    files = corpus_files(args)
+    start = time.perf_counter()
+    scan_corpus(new_worker(option), files)
+    duration = time.perf_counter() - start
+
+    words = list(dict.fromkeys(option.matcher.words))
+    index = NgramIndex(os.path.join(option.data_folder, 'index'))
+    start = time.perf_counter()
+    results = index.search(words)
+    query = time.perf_counter() - start
+    found = {(row[0], row[1]): tuple(row[2:]) for row in results.itertuples(index=False)}
+    expected = {}
+    for path in files:
+        for k, page in enumerate(pypdf.PdfReader(path).pages):
+            text = option.matcher.normalize(page.extract_text())
+            counts = tuple(text.count(word) for word in words)
+            if any(counts):
+                expected[(os.path.basename(path), k + 1)] = counts
+    n_pages = args['n_pages']
+    return {'files': len(files), 'pages': n_pages, 'seconds': duration, 'pages_per_sec': n_pages / duration, 'query_ms': query * 1000,
+            'mismatches': len(found.keys() ^ expected.keys()) + sum(found[key] != expected[key] for key in found.keys() & expected.keys())}
+
+def stage_rescore(args: dict) -> dict:
+    """
+    Score the scanned corpus (repeat copies) again from the count matrix with a lower threshold.
+    Detected pages must be the ones of a scan with this threshold
+    """
+    import shutil
+    from script.pdf_scan.worker import Worker
+    from script.pdf_scan.record import records_to_dataframe, best_first
+    from script.pdf_scan.count_matrix import CountMatrix
+    option = bench_option(args)
+    folder = os.path.join(option.data_folder, 'counts')
+    shutil.rmtree(folder, ignore_errors=True)
+    matrix = CountMatrix(folder)
+    scanned = scan_corpus(new_worker(option), corpus_files(args))
+    records = []
+    for i in range(args['repeat']):
+        for pdf_data in scanned:
+            record = Worker.format_task(pdf_data)
+            record.filename, record.hash = f"{i}_{record.filename}", f"{i}_{record.hash}"
+            matrix.append(record)
+            records.append(record)
+    data = records_to_dataframe(records)
+
+    option.threshold -= 2
+    start = time.perf_counter()
+    updated, rescan = matrix.rescore(data, option)
+    duration = time.perf_counter() - start
+    detected = dict(zip(data['Filename'], data['Pages']))
+    detected.update(zip(updated['Filename'], updated['Pages']))
+    expected = {f"0_{pdf_data['filename']}": best_first(record.pages, record.scores)
+                for record in map(Worker.format_task, scan_corpus(new_worker(option), corpus_files(args)))}
+    n_pages = len(matrix)
+    return {'pages': n_pages, 'seconds': duration, 'pages_per_sec': n_pages / duration,
+            'mismatches': len(rescan) + sum(detected[filename] != found for filename, found in expected.items())}
+
+def stage_format_task(args: dict) -> dict:
+    from script.pdf_scan.worker import Worker
+    from script.pdf_scan.record import records_to_dataframe
+    scanned = scan_corpus(new_worker(bench_option(args)), corpus_files(args)) * args['repeat']
+    start = time.perf_counter()
+    records_to_dataframe([Worker.format_task(pdf_data) for pdf_data in scanned])
+    duration = time.perf_counter() - start
+    return {'files': len(scanned), 'seconds': duration, 'files_per_sec': len(scanned) / duration}
+
+def stage_render_data(args: dict) -> dict:
+    from script.pdf_scan.worker import Worker
+    from script.pdf_scan.render_data import render_data, data_file
+    from script.pdf_scan.result_store import ResultStore
+    option = bench_option(args)
+    scanned = scan_corpus(new_worker(option), corpus_files(args))
+    records = []
+    for i in range(args['repeat']):
+        for pdf_data in scanned:
+            record = Worker.format_task(pdf_data)
+            record.filename = f"{i}_{record.filename}"
+            records.append(record)
+    store = ResultStore(option.data_folder)
+    store.clear()
+    qresult = queue.Queue()
+    qresult.put(records)
+    start = time.perf_counter()
+    render_data(option, qresult, datetime.now(), store)
+    duration = time.perf_counter() - start
+    size = sum(os.path.getsize(path) for path in (option.result_file, data_file(option.result_file)))
+    return {'rows': len(records), 'seconds': duration, 'rows_per_sec': len(records) / duration, 'report_kb': size / 1024}
+
+def stage_main(args: dict) -> dict:
+    config = os.path.join(args['work'], 'config.json')
+    with open(config, 'w') as f:
+        json.dump({
+            'pdf_folder': args['corpus'] + os.sep, 'data_folder': os.path.join(args['work'], 'main_data') + os.sep,
+            'result_file': os.path.join(args['work'], 'main_result.html'), 'keyword_file': args['keyword_file'],
+            'threshold': args['threshold'], 'n_workers': args['workers'], 'force_scan': True, 'progress_bar': False,
+        }, f)
+    files = corpus_files(args)
+    start = time.perf_counter()
+    subprocess.run([sys.executable, '-m', 'script', 'scan', '--config', config], cwd=ROOT, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    duration = time.perf_counter() - start
+    return {'files': len(files), 'pages': args['n_pages'], 'seconds': duration,
+            'pages_per_sec': args['n_pages'] / duration, 'files_per_sec': len(files) / duration,
+            'children_peak_rss_mb': peak_rss_mb(resource.RUSAGE_CHILDREN)}
+
+STAGES = {
+    'analyse_text': stage_analyse_text,
+    'scan_task': stage_scan_task,
+    'prefilter': stage_prefilter,
+    'profiles': stage_profiles,
+    'first_hit': stage_first_hit,
+    'backends': stage_backends,
+    'ngram_index': stage_ngram_index,
+    'rescore': stage_rescore,
+    'format_task': stage_format_task,
+    'render_data': stage_render_data,
+    'main': stage_main,
+}
+
+def run_stage(name: str, args: dict) -> dict:
+    result = STAGES[name](args)
+    result['peak_rss_mb'] = peak_rss_mb()
+    return result
+
@@ -0,0 +1,201 @@
+"""
+Command line entry point, without jupyter:
+
+    python -m script scan [--config config.json] [--pdf-folder pdf/] [--watch-import] ...
+    python -m script import list.csv [--connections 4] [--scan]
+    python -m script search "new keyword" other [--data-folder data/]
+    python -m script node --coordinator host:port --authkey KEY [--pdf-folder /mnt/pdf/] [--n-workers 4]
+
+Every Option parameter can be given in a json config file and overridden by its --flag.
+Heavy modules (pandas, pypdf, ...) are only imported once the command line has been parsed.
+"""
+import argparse, json, os, sys, time, types, logging
+from inspect import signature
+
+from .option import Option
+
+DEFAULTS = { # Same values as main.ipynb
+    "pdf_folder": "pdf/",
+    "data_folder": "data/",
+    "result_file": "result.html",
+    "keyword_file": "keywords.csv",
+    "threshold": 7,
+    "watch_import": False,
+    "force_scan": False,
+    "clear_when_force_scan": True,
+    "sort_data": "Timestamp",
+    "n_workers": max(1, (os.cpu_count() or 2) // 2),
+    "check_keyword": True,
+    "watcher_year_interval": [2004, 2024],
+    "request_timeout": 12,
+}
+
+def parse_value(annotation, value: str):
+    """
+    Convert a command line value to the type of an Option parameter
+
+    Args:
+        annotation (type): Annotation of the parameter
+        value (str): Value given in the command line
+
+    Returns:
+        Any: Converted value
+    """
+    types_ = annotation.__args__ if isinstance(annotation, types.UnionType) else (annotation,)
+    if type(None) in types_ and value.lower() == 'none':
+        return None
+    for t in (int, float, str):
+        if t in types_:
+            try:
+                return t(value)
+            except ValueError:
+                continue
+    raise argparse.ArgumentTypeError(f"invalid value {value}")
+
+def add_option_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add a --flag for every Option parameter
+
+    Args:
+        parser (argparse.ArgumentParser): Parser of the command
+    """
+    group = parser.add_argument_group("options", "Option parameters (see script/option.py). Override values of --config")
+    for name, param in signature(Option).parameters.items():
+        flag = '--' + name.replace('_', '-')
+        if param.annotation is bool:
+            group.add_argument(flag, dest=name, action=argparse.BooleanOptionalAction, default=None)
+        elif param.annotation is list:
+            group.add_argument(flag, dest=name, nargs='+', type=int, default=None, metavar='INT')
+        else:
+            group.add_argument(flag, dest=name, type=lambda value, a=param.annotation: parse_value(a, value), default=None,
+                               metavar=name.split('_')[-1].upper())
+
+def build_option(args: argparse.Namespace) -> Option:
+    """
+    Args:
+        args (argparse.Namespace): Parsed command line
+
+    Returns:
+        Option: Option built from DEFAULTS, then the config file, then the command line
+    """
+    values = dict(DEFAULTS)
+    if args.config is not None:
+        with open(args.config, 'r') as f:
+            values.update(json.load(f))
+    for name in signature(Option).parameters:
+        if getattr(args, name, None) is not None:
+            values[name] = getattr(args, name)
+    unknown = set(values) - set(signature(Option).parameters)
+    if unknown:
+        raise ValueError(f"Unknown option {', '.join(sorted(unknown))}")
+    for folder in ('pdf_folder', 'data_folder'): # Paths are built by concatenation
+        if not values[folder].endswith(os.sep):
+            values[folder] += os.sep
+    return Option(**values)
+
+def scan(args: argparse.Namespace) -> int:
+    from .script import initialize, main, stop_workers
+
+    option = build_option(args)
+    ini = initialize(logging.getLogger('pdfsearch'), widgets=False)
+    process = main(option, ini)
+    if not option.watch_import:
+        return 0
+
+    _, logger, _, qresult, CancelProcessEvent, _ = ini
+    try:
+        while any(p.is_alive() for p in process):
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logger.info("Interrupted: stopping workers")
+    stop_workers(process, qresult, CancelProcessEvent, logger)
+    return 0
+
+def bulk(args: argparse.Namespace) -> int:
+    from .import_pdf.bulk_import import bulk_import
+    from .script import initialize, main, stop_workers
+
+    option = build_option(args)
+    os.makedirs(option.pdf_folder, exist_ok=True)
+    if not args.scan:
+        downloaded = bulk_import(option, args.csv_file, n_connections=args.connections, force=args.force)
+        print(f"{len(downloaded)} pdf downloaded to {option.pdf_folder}")
+        return 0
+
+    option.watch_import = True # Workers wait for the pdf submitted by bulk_import
+    ini = initialize(logging.getLogger('pdfsearch'), widgets=False)
+    process = main(option, ini)
+    _, logger, queue, qresult, CancelProcessEvent, _ = ini
+    try:
+        downloaded = bulk_import(option, args.csv_file, queue, n_connections=args.connections, force=args.force)
+        logger.info(f"{len(downloaded)} pdf downloaded to {option.pdf_folder}")
+        queue.join()
+    except KeyboardInterrupt:
+        logger.info("Interrupted: stopping workers")
+    stop_workers(process, qresult, CancelProcessEvent, logger)
+    return 0
+
+def search(args: argparse.Namespace) -> int:
+    from .pdf_scan.ngram_index import NgramIndex
+    from .pdf_scan.keyword_matcher import KeywordMatcher
+
+    option = build_option(args)
+    if not os.path.isfile(os.path.join(option.data_folder, 'index', 'ngram_index.sqlite')):
+        print(f"No n-gram index in {option.data_folder}. Scan the pdf with ngram_index enabled first", file=sys.stderr)
+        return 1
+    words = list(dict.fromkeys(word for word in map(KeywordMatcher.normalize, args.words) if word))
+    index = NgramIndex(os.path.join(option.data_folder, 'index'))
+    start = time.perf_counter()
+    results = index.search(words)
+    duration = time.perf_counter() - start
+    index.close()
+    print(results.to_string(index=False, max_rows=args.limit))
+    print(f"{len(results)} pages in {results['Filename'].nunique()} pdf, found in {duration * 1000:.0f} ms")
+    return 0
+
+def node(args: argparse.Namespace) -> int:
+    import colorlog
+    from .pdf_scan.coordinator import run_node
+
+    option = build_option(args)
+    if not option.coordinator:
+        print("--coordinator host:port of the scan to join is required", file=sys.stderr)
+        return 1
+    logger = logging.getLogger('pdfsearch')
+    logger.setLevel(logging.INFO)
+    handler = colorlog.StreamHandler()
+    handler.setFormatter(colorlog.ColoredFormatter('%(log_color)s[%(levelname)s] %(message)s'))
+    logger.addHandler(handler)
+    return run_node(option.coordinator, option.authkey, option.n_workers, option.pdf_folder, option.data_folder, logger, args.name)
+
+def parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m script", description="Search keywords in pdf files")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    command = commands.add_parser('scan', help="Scan pdf_folder (batch, or watch with --watch-import) and write result_file")
+    command.set_defaults(func=scan)
+
+    command = commands.add_parser('import', help="Download the pdf of a csv file with name, year and url columns")
+    command.add_argument('csv_file', help="Csv file with name, year and url columns")
+    command.add_argument('--connections', type=int, default=4, help="Number of simultaneous downloads")
+    command.add_argument('--force', action='store_true', help="Download again pdf already in pdf_folder")
+    command.add_argument('--scan', action='store_true', help="Scan each pdf as soon as it is downloaded, then write result_file")
+    command.set_defaults(func=bulk)
+
+    command = commands.add_parser('search', help="Count keywords in every scanned page with the n-gram index, without scanning the pdf again")
+    command.add_argument('words', nargs='+', help="Keywords, normalized like keyword_file (accents, spaces and case are ignored)")
+    command.add_argument('--limit', type=int, default=100, help="Maximum number of pages printed")
+    command.set_defaults(func=search)
+
+    command = commands.add_parser('node', help="Scan the pdf of a coordinator (scan with --coordinator) from this host, reading them in --pdf-folder")
+    command.add_argument('--name', default="", help="Name of the node in the logs. Default: hostname-pid")
+    command.set_defaults(func=node)
+
+    for command in commands.choices.values():
+        command.add_argument('--config', help="Json file with Option parameters")
+        add_option_arguments(command)
+    return parser
+
+if __name__ == '__main__':
+    arguments = parser().parse_args()
+    sys.exit(arguments.func(arguments))
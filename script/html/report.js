@@ -0,0 +1,112 @@
+/*
+ * Result table of result.html. Rows are loaded from the data file written next to result.html (render_data.py),
+ * sorted, filtered and paginated here. Only the rows on screen are in the document (virtual scrolling),
+ * so a large corpus opens as fast as a small one.
+ */
+"use strict";
+
+const OVERSCAN = 20; // Rows created above and under the screen
+
+let rows = []; // Every row of the data file, as objects
+let shown = []; // Rows of the filter, sorted
+let sort = {key: "timestamp", ascending: false};
+let page = 0;
+let rowHeight = 0;
+
+function showResults(data) {
+    rows = data.rows.map(row => Object.fromEntries(data.columns.map((column, i) => [column, row[i]])));
+    sort = data.sort === "Filename" ? {key: "filename", ascending: true} : {key: "timestamp", ascending: false};
+    update();
+}
+
+function escapeHtml(text) {
+    return String(text).replace(/[&<>"']/g, c => ({"&": "&amp;", "<": "&lt;", ">": "&gt;", '"': "&quot;", "'": "&#39;"})[c]);
+}
+
+function detectedHtml(row) {
+    if (typeof row.pages === "string") { // Result saved before the data file, already in html
+        return row.pages;
+    }
+    const best = Math.max(...row.pages.map(([, score]) => score));
+    const path = escapeHtml(row.path);
+    const links = row.pages.map(([page, score]) =>
+        `<a class="${score === best ? "max-score" : ""}" title="Score: ${score}" href="${path}#page=${page}" target="_blank">${page}</a>`);
+    const timedOut = row.timed_out.map(page => `<span class="timed-out" title="Scan timed out">${page > 0 ? page : "Timed out"}</span>`);
+    const partial = row.partial > 0 ? [`<span class="partial" title="Scan stopped early">Partial (${row.partial}/${row.n_pages})</span>`] : [];
+    return links.concat(timedOut, partial).join(" ");
+}
+
+function rowHtml(row, index) {
+    const name = escapeHtml(row.filename);
+    const filename = row.url ? `<a class="filename" href="${escapeHtml(row.url)}" target="_blank">${name}</a>` : name;
+    return `<tr class="${index % 2 ? "even" : ""}"><td>${filename}</td><td>${row.n_pages}</td><td>${row.n_detected}</td>` +
+        `<td><div class="pages">${detectedHtml(row)}</div></td><td>${row.new ? 1 : 0}</td></tr>`;
+}
+
+function pageSize() {
+    const size = Number(document.getElementById("page-size").value);
+    return size > 0 ? size : shown.length;
+}
+
+function update() {
+    const filter = document.getElementById("filter").value.toLowerCase();
+    const onlyDetected = document.getElementById("only-detected").checked;
+    const onlyNew = document.getElementById("only-new").checked;
+    shown = rows.filter(row => (!filter || row.filename.toLowerCase().includes(filter)) &&
+        (!onlyDetected || row.n_detected > 0 || row.timed_out.length > 0) && (!onlyNew || row.new));
+
+    const {key, ascending} = sort;
+    const order = ascending ? 1 : -1;
+    shown.sort((a, b) => (a[key] < b[key] ? -order : a[key] > b[key] ? order : 0));
+    for (const th of document.querySelectorAll("th[data-sort]")) {
+        th.classList.toggle("ascending", th.dataset.sort === key && ascending);
+        th.classList.toggle("descending", th.dataset.sort === key && !ascending);
+    }
+
+    page = Math.min(page, Math.max(0, Math.ceil(shown.length / Math.max(1, pageSize())) - 1));
+    document.getElementById("viewport").scrollTop = 0;
+    draw();
+}
+
+function draw() {
+    const size = Math.max(1, pageSize());
+    const first = page * size;
+    const count = Math.min(size, shown.length - first);
+    const nPages = Math.max(1, Math.ceil(shown.length / size));
+    document.getElementById("page-info").textContent = `Page ${page + 1} / ${nPages} (${shown.length} pdf)`;
+    document.getElementById("previous").disabled = page === 0;
+    document.getElementById("next").disabled = page >= nPages - 1;
+
+    const viewport = document.getElementById("viewport");
+    const tbody = document.getElementById("rows");
+    if (rowHeight === 0 && count > 0) { // Every row has the height of the first one (see .pages in style.css)
+        tbody.innerHTML = rowHtml(shown[first], 0);
+        rowHeight = tbody.rows[0].getBoundingClientRect().height || 1;
+    }
+    const height = Math.max(rowHeight, 1);
+    const start = Math.max(0, Math.floor(viewport.scrollTop / height) - OVERSCAN);
+    const end = Math.min(count, Math.ceil((viewport.scrollTop + viewport.clientHeight) / height) + OVERSCAN);
+    let html = start > 0 ? `<tr style="height: ${start * height}px"></tr>` : "";
+    for (let i = start; i < end; i++) {
+        html += rowHtml(shown[first + i], i);
+    }
+    if (end < count) {
+        html += `<tr style="height: ${(count - end) * height}px"></tr>`;
+    }
+    tbody.innerHTML = html;
+}
+
+document.getElementById("viewport").addEventListener("scroll", () => window.requestAnimationFrame(draw), {passive: true});
+window.addEventListener("resize", () => window.requestAnimationFrame(draw));
+for (const id of ["filter", "only-detected", "only-new"]) {
+    document.getElementById(id).addEventListener("input", () => { page = 0; update(); });
+}
+document.getElementById("page-size").addEventListener("change", () => { page = 0; update(); });
+document.getElementById("previous").addEventListener("click", () => { page--; update(); });
+document.getElementById("next").addEventListener("click", () => { page++; update(); });
+for (const th of document.querySelectorAll("th[data-sort]")) {
+    th.addEventListener("click", () => {
+        sort = {key: th.dataset.sort, ascending: sort.key === th.dataset.sort ? !sort.ascending : th.dataset.sort === "filename"};
+        update();
+    });
+}
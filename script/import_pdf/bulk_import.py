@@ -0,0 +1,103 @@
+import os, requests
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from validators import url as is_url
+
+from .pdf_import import stream_to_file, PDF_HEADER
+from ..script import submit_pdf
+
+def new_session(n_connections: int) -> requests.Session:
+    """
+    Args:
+        n_connections (int): Number of connections kept open by host
+
+    Returns:
+        requests.Session: Session reusing connections, with retries on connection errors
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=n_connections, pool_maxsize=n_connections,
+                          max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=(502, 503, 504)))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def download_pdf(session: requests.Session, url: str, pdf_path: str, timeout: int | None) -> bool:
+    """
+    Download a pdf in streaming. An interrupted download (pdf_path + '.part') is resumed with a Range request
+
+    Args:
+        session (requests.Session): Session used for the request
+        url (str): Url of the pdf
+        pdf_path (str): Destination of the pdf
+        timeout (int|None): Time before the request expire
+
+    Returns:
+        bool: True if the pdf has been downloaded
+    """
+    part_path = pdf_path + '.part'
+    offset = os.path.getsize(part_path) if os.path.isfile(part_path) else 0
+    if offset > 0:
+        with open(part_path, 'rb') as f:
+            if f.read(len(PDF_HEADER)) != PDF_HEADER[:min(offset, len(PDF_HEADER))]:
+                offset = 0 # Not the beginning of a pdf, restart the download
+    headers = {'Range': f'bytes={offset}-'} if offset > 0 else {}
+
+    with session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+        if response.status_code == 206 and offset > 0:
+            return stream_to_file(response, pdf_path, resume=True)
+        if response.status_code != 200:
+            print(f"Failed to download {url}. (Status code: {response.status_code})")
+            return False
+        if not stream_to_file(response, pdf_path): # Server ignored the Range header: restart from the beginning
+            print(f"{url} does not give a pdf file")
+            return False
+        return True
+
+def bulk_import(option, csv_file: str, queue = None, n_connections: int = 4, force: bool = False) -> list:
+    """
+    Download every pdf of a csv file with name, year and url columns. Each pdf is saved as {name}_{year}.pdf
+    in pdf_folder and submitted to the queue as soon as it is downloaded (see submit_pdf)
+
+    Args:
+        option (Option): Option object
+        csv_file (str): Csv file with name, year and url columns
+        queue (Scheduler): Queue of pdf to scan. None to only download
+        n_connections (int): Number of simultaneous downloads
+        force (bool): Download again pdf already in pdf_folder
+
+    Returns:
+        list: Path of downloaded pdf
+    """
+    requests_data = pd.read_csv(csv_file, dtype=str).fillna('')
+    missing = {'name', 'year', 'url'} - set(requests_data.columns)
+    if missing:
+        raise ValueError(f"{csv_file} must contain name, year and url columns (missing: {', '.join(sorted(missing))})")
+
+    to_download = []
+    for name, year, url in requests_data[['name', 'year', 'url']].itertuples(index=False):
+        pdf_path = option.pdf_folder + f"{name}_{year}.pdf"
+        if not is_url(url):
+            print(f"Invalid url: {url}")
+        elif os.path.isfile(pdf_path) and not force:
+            print(f"{pdf_path} already exists")
+        else:
+            to_download.append((url, pdf_path))
+
+    downloaded = []
+    with new_session(n_connections) as session, ThreadPoolExecutor(max_workers=n_connections) as executor:
+        futures = {executor.submit(download_pdf, session, url, pdf_path, option.request_timeout): (url, pdf_path) for url, pdf_path in to_download}
+        for future in as_completed(futures):
+            url, pdf_path = futures[future]
+            try:
+                if not future.result():
+                    continue
+            except requests.exceptions.RequestException as error:
+                print(f"Failed to download {url}: {error}. Run the import again to resume it")
+                continue
+            print(f"Downloaded {url} to {pdf_path}")
+            downloaded.append(pdf_path)
+            if queue is not None:
+                submit_pdf(queue, pdf_path, url)
+    return downloaded
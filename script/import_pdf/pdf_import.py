@@ -1,13 +1,44 @@
-import requests
+import os, requests
 from validators import url as is_url
 
+PDF_HEADER = b'%PDF-'
+CHUNK_SIZE = 1024 * 64
+
+def stream_to_file(response: requests.Response, pdf_path: str, resume: bool = False) -> bool:
+    """
+    Write the body of a streamed response in pdf_path + '.part', then rename it to pdf_path.
+    The file is never held entirely in memory
+
+    Args:
+        response (requests.Response): Response opened with stream=True
+        pdf_path (str): Destination of the pdf
+        resume (bool): Append to the existing .part file (response to a Range request)
+
+    Returns:
+        bool: True if the file has been downloaded, False if it is not a pdf
+    """
+    part_path = pdf_path + '.part'
+    with open(part_path, mode='ab' if resume else 'wb') as file:
+        header = b''
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            if not resume and len(header) < len(PDF_HEADER):
+                header += chunk[:len(PDF_HEADER)]
+                if len(header) >= len(PDF_HEADER) and not header.startswith(PDF_HEADER):
+                    break
+            file.write(chunk)
+    if not resume and not header.startswith(PDF_HEADER):
+        os.remove(part_path)
+        return False
+    os.replace(part_path, pdf_path)
+    return True
+
 def url_request(option, url: str, new_name: str = None) -> bool | None:
     if not is_url(url):
         print(f"Invalid url: {url}")
         return
 
     try:
-        response = requests.get(url, timeout=option.request_timeout)
+        response = requests.get(url, timeout=option.request_timeout, stream=True)
     except requests.exceptions.Timeout:
         print(f"Timeout (>{option.request_timeout}s) for {url}")
         return
@@ -38,8 +69,10 @@ def url_request(option, url: str, new_name: str = None) -> bool | None:
                 print(f"{url} does not give a pdf file")
 
     pdf_path = option.pdf_folder + (new_name if new_name != None else old_name)
-    with open(pdf_path, mode="wb") as file:
-        file.write(response.content)
-        print(f"Downloaded {url} to {pdf_path}")
+    with response:
+        if not stream_to_file(response, pdf_path):
+            print(f"{url} does not give a pdf file")
+            return
+    print(f"Downloaded {url} to {pdf_path}")
     
     return True
\ No newline at end of file
@@ -1,3 +1,4 @@
+import re, copy, os
 from inspect import signature
 inf = float('inf')
 
@@ -21,6 +22,36 @@ class Option:
                  threshold: int,
                  watcher_year_interval: list,
                  request_timeout: int | None,
+                 cache_size: int = 1024,
+                 render_debounce: int | float = 2,
+                 render_max_latency: int | float = 10,
+                 split_pages: int = 200,
+                 result_batch_size: int = 32,
+                 result_batch_latency: int | float = 1,
+                 watch_folder: bool = True,
+                 progress_bar: bool = True,
+                 prefilter: bool = False,
+                 bundle_size: int = 256,
+                 max_tasks_per_worker: int = 0,
+                 max_worker_memory: int = 0,
+                 page_timeout: int | float = 0,
+                 file_timeout: int | float = 0,
+                 retry_timeout_factor: int | float = 4,
+                 backends: str = 'pypdf',
+                 ngram_index: bool = False,
+                 ngram_index_size: int = 1024,
+                 coordinator: str = '',
+                 authkey: str = '',
+                 lease_timeout: int | float = 30,
+                 count_matrix: bool = True,
+                 journal: bool = True,
+                 profiles: str = '',
+                 max_hits: int = 0,
+                 max_pages: int = 0,
+                 page_order: str = 'natural',
+                 autotune: bool = False,
+                 min_workers: int = 1,
+                 max_workers: int = 0,
                  ) -> None:
         """
         Args:
@@ -36,6 +67,36 @@ class Option:
             check_keyword (bool): Vérifie que les mots clés sont correctement formatés
             threshold (int): Seuil de détection des mots clés
             request_timeout (int|None): Temps d'attente avant qu'une requête n'expire. None pour désactiver
+            cache_size (int): Taille maximale (en Mo) du cache des textes extraits des pdf. 0 pour désactiver
+            render_debounce (int|float): Quand watch_import est activé, temps (en seconde) sans nouveau résultat avant de mettre à jour result_file
+            render_max_latency (int|float): Quand watch_import est activé, temps maximum (en seconde) entre un nouveau résultat et la mise à jour de result_file
+            split_pages (int): Les pdf de plus de split_pages pages sont découpés en parties analysées par plusieurs threads. 0 pour désactiver
+            result_batch_size (int): Nombre de résultats envoyés ensemble par un thread. Avec page_timeout ou file_timeout, les résultats d'un lot de pdf (bundle_size) sont envoyés avant le lot suivant
+            result_batch_latency (int|float): Temps maximum (en seconde) pendant lequel un thread garde un résultat avant de l'envoyer
+            watch_folder (bool): Quand watch_import est activé, analyse aussi les pdf ajoutés dans pdf_folder par d'autres outils
+            progress_bar (bool): Affiche une barre de progression par pdf (atpbar)
+            prefilter (bool): Estime d'abord le score maximum de chaque page depuis son contenu brut, et n'extrait le texte que des pages pouvant atteindre threshold
+            bundle_size (int): Les petits pdf sont donnés aux threads par lots, tant que la taille du lot ne dépasse pas bundle_size Ko. 0 pour désactiver
+            max_tasks_per_worker (int): Un thread est remplacé par un nouveau après avoir analysé max_tasks_per_worker pdf. 0 pour désactiver
+            max_worker_memory (int): Un thread est remplacé par un nouveau quand sa mémoire dépasse max_worker_memory Mo. 0 pour désactiver
+            page_timeout (int|float): Temps maximum (en seconde) d'analyse d'une page. Au-delà, le worker abandonne la page (il est remplacé s'il ne répond pas) et la page est marquée comme expirée. 0 pour désactiver
+            file_timeout (int|float): Temps maximum (en seconde) d'analyse d'un pdf (ou d'une partie de pdf). Au-delà, le worker abandonne le pdf (il est remplacé s'il ne répond pas) et le pdf est réessayé après les autres. 0 pour désactiver
+            retry_timeout_factor (int|float): Les temps maximum d'un pdf réessayé sont multipliés par retry_timeout_factor. S'il expire encore, il est marqué comme expiré
+            backends (str): Moteurs d'extraction du texte, séparés par des virgules, par ordre de préférence ('raw', 'pymupdf', 'pdfium', 'pypdf', 'pypdf-layout'). Le suivant est utilisé en cas d'erreur ou de texte vide. 'auto' pour pymupdf et pdfium s'ils sont installés puis pypdf. 'raw' n'est utilisé que s'il est demandé
+            ngram_index (bool): Indexe les trigrammes du texte de chaque page, pour chercher de nouveaux mots clés sans réanalyser les pdf (python -m script search)
+            ngram_index_size (int): Taille maximale (en Mo) de l'index des trigrammes. Les pdf indexés les plus anciens en sont retirés au-delà. 0 pour ne pas limiter
+            coordinator (str): Adresse 'host:port' sur laquelle attendre des noeuds de calcul (python -m script node), qui analysent aussi les pdf. Vide pour désactiver
+            authkey (str): Clé d'authentification des noeuds de calcul, obligatoire avec coordinator
+            lease_timeout (int|float): Temps (en seconde) sans nouvelle d'un noeud de calcul avant de redonner ses pdf aux autres threads
+            count_matrix (bool): Enregistre le nombre de chaque mot clé dans chaque page (data_folder/counts), pour recalculer les scores sans réanalyser les pdf quand keyword_file ou threshold changent
+            journal (bool): Écrit le résultat de chaque pdf dans un journal (data_folder/journal) dès qu'il est analysé, pour ne pas l'analyser à nouveau si le script est interrompu
+            profiles (str): Profils de mots clés supplémentaires 'nom=fichier.csv:seuil', séparés par des virgules. Les pdf ne sont analysés qu'une fois pour tous les profils, chaque profil a son propre rapport (result_file suffixé par son nom)
+            max_hits (int): Arrête l'analyse d'un pdf dès que max_hits pages sont détectées (1 pour s'arrêter à la première). Le résultat est marqué comme partiel. 0 pour désactiver
+            max_pages (int): Analyse au plus max_pages pages de chaque pdf. Le résultat est marqué comme partiel. 0 pour désactiver
+            page_order ['natural', 'reverse', 'last_third']: Ordre d'analyse des pages. 'last_third' commence par le dernier tiers du pdf (tableaux récapitulatifs), utile avec max_hits et max_pages
+            autotune (bool): Ajuste le nombre de threads au débit mesuré (pages/s) et à la mémoire disponible, entre min_workers et max_workers. Le meilleur nombre est gardé dans data_folder/autotune.json et utilisé au lancement suivant à la place de n_workers
+            min_workers (int): Nombre minimum de threads avec autotune
+            max_workers (int): Nombre maximum de threads avec autotune. 0 pour le nombre de processeurs
 
         Returns:
             None
@@ -79,6 +140,104 @@ class Option:
         if not (request_timeout > 0 or request_timeout is None):
             raise ValueError("request_timeout must be a positive integer")
         self.request_timeout = request_timeout
+
+        if cache_size < 0:
+            raise ValueError("cache_size must be a positive integer")
+        self.cache_size = cache_size
+
+        if render_debounce < 0 or render_max_latency < render_debounce:
+            raise ValueError("render_debounce must be positive and smaller or equal to render_max_latency")
+        self.render_debounce = render_debounce
+        self.render_max_latency = render_max_latency
+
+        if split_pages < 0:
+            raise ValueError("split_pages must be a positive integer")
+        self.split_pages = split_pages
+
+        if result_batch_size < 1 or result_batch_latency < 0:
+            raise ValueError("result_batch_size must be a strictly positive integer and result_batch_latency must be positive")
+        self.result_batch_size = result_batch_size
+        self.result_batch_latency = result_batch_latency
+
+        self.watch_folder = watch_folder
+        self.progress_bar = progress_bar
+        self.prefilter = prefilter
+
+        if bundle_size < 0:
+            raise ValueError("bundle_size must be a positive integer")
+        self.bundle_size = bundle_size
+
+        if max_tasks_per_worker < 0 or max_worker_memory < 0:
+            raise ValueError("max_tasks_per_worker and max_worker_memory must be positive integers")
+        self.max_tasks_per_worker = max_tasks_per_worker
+        self.max_worker_memory = max_worker_memory
+
+        if page_timeout < 0 or file_timeout < 0 or retry_timeout_factor < 1:
+            raise ValueError("page_timeout and file_timeout must be positive and retry_timeout_factor must be greater or equal to 1")
+        self.page_timeout = page_timeout
+        self.file_timeout = file_timeout
+        self.retry_timeout_factor = retry_timeout_factor
+
+        if backends != 'auto' and not all(backend.strip() in ['raw', 'pymupdf', 'pdfium', 'pypdf', 'pypdf-layout'] for backend in backends.split(',')):
+            raise ValueError("backends must be 'auto' or a comma separated list of 'raw', 'pymupdf', 'pdfium', 'pypdf' and 'pypdf-layout'")
+        self.backends = backends
+        if ngram_index_size < 0:
+            raise ValueError("ngram_index_size must be a positive integer")
+        self.ngram_index = ngram_index
+        self.ngram_index_size = ngram_index_size
+
+        if coordinator and (':' not in coordinator or not authkey):
+            raise ValueError("coordinator must be a 'host:port' address and authkey must be set with coordinator")
+        if lease_timeout <= 0:
+            raise ValueError("lease_timeout must be strictly positive")
+        self.coordinator = coordinator
+        self.authkey = authkey
+        self.lease_timeout = lease_timeout
+        self.count_matrix = count_matrix
+        self.journal = journal
+
+        self.profiles = {} # {name: (keyword_file, threshold)}
+        for profile in filter(None, (profile.strip() for profile in profiles.split(','))):
+            name, _, rest = profile.partition('=')
+            file, _, value = rest.rpartition(':')
+            if not re.fullmatch(r'[\w-]+', name) or not file.endswith('.csv') or not re.fullmatch(r'-?\d+', value):
+                raise ValueError(f"profiles must be 'name=keyword_file.csv:threshold' separated by commas, got '{profile}'")
+            if name in self.profiles:
+                raise ValueError(f"Profile {name} is defined twice")
+            self.profiles[name] = (file, int(value))
+
+        if max_hits < 0 or max_pages < 0:
+            raise ValueError("max_hits and max_pages must be positive")
+        if page_order not in ['natural', 'reverse', 'last_third']:
+            raise ValueError("page_order must be 'natural', 'reverse' or 'last_third'")
+        self.max_hits = max_hits
+        self.max_pages = max_pages
+        self.page_order = page_order
+
+        if min_workers < 1 or max_workers < 0 or 0 < max_workers < min_workers:
+            raise ValueError("min_workers must be strictly positive and max_workers must be 0 or greater or equal to min_workers")
+        self.autotune = autotune
+        self.min_workers = min_workers
+        self.max_workers = max_workers
+
+    def profile(self, name: str) -> 'Option':
+        """
+        Option of a keyword profile. Must be called once keywords are loaded (see script.load_keywords)
+
+        Args:
+            name (str): Name of the profile in profiles
+
+        Returns:
+            Option: Copy scoring with the keywords and threshold of the profile, rendered in its own result_file
+        """
+        option = copy.copy(self)
+        option.keyword_file, option.threshold = self.profiles[name]
+        option.keywords = self.profile_keywords[name]
+        option.matcher = self.scorer.matchers[1 + list(self.profiles).index(name)]
+        root, extension = os.path.splitext(self.result_file)
+        option.result_file = f"{root}.{name}{extension}"
+        option.profiles = {}
+        return option
     
     @classmethod
     def first_initialization(cls):
@@ -0,0 +1,141 @@
+import os, json, tempfile, time, multiprocessing
+
+from .metrics import Metrics, available_memory
+from .scheduler import Scheduler
+from .supervisor import Supervisor
+
+PERIOD = 10 # Seconds of scan measured for each number of workers
+TOLERANCE = 0.05 # Throughputs closer than 5% are equal: the smallest number of workers is kept
+EXPIRY = 6 * PERIOD # Seconds after which the throughput of a number of workers is measured again: it changes with the pdf scanned
+WORKER_MEMORY = 256 * 1024**2 # Memory of a worker in bytes, until a pdf has been scanned
+SAVE_FILE = 'autotune.json'
+
+class Autotuner(object):
+    """
+    Thread adapting the number of workers to the measured throughput (Option.autotune). Every PERIOD seconds the pages
+    scanned by the workers (see Metrics) give the pages/s of the current number of workers. Starting from the best
+    number, one worker is added, and kept only if it raises the throughput. Measures older than EXPIRY seconds are
+    forgotten, so a number of workers measured worse is tried again later. Workers are removed when the available
+    memory is lower than the memory of a worker. The best number is saved in data_folder/autotune.json for the next run.
+    The first period, periods following a change, without scanned pages or with less pdf waiting than workers (end of a
+    scan, idle watch) are not measured.
+    """
+    def __init__(self, option, supervisor: Supervisor, queue: Scheduler, metrics: Metrics, as_started: list, logger,
+                 CancelProcessEvent: multiprocessing.Event) -> None:
+        """
+        Args:
+            option (Option): Option object
+            supervisor (Supervisor): Supervisor of the workers
+            queue (Scheduler): Queue of pdf to scan
+            metrics (Metrics): Run statistics, giving the pages scanned
+            as_started (list): List of boolean to know if a worker has started, extended when workers are added
+            logger (logging.Logger): Logger object
+            CancelProcessEvent (multiprocessing.Event): Event to cancel the process
+        """
+        self.option = option
+        self.supervisor = supervisor
+        self.queue = queue
+        self.metrics = metrics
+        self.as_started = as_started
+        self.logger = logger
+        self.CancelProcessEvent = CancelProcessEvent
+        self.n_workers = len(as_started)
+        self.rates = {} # {number of workers: pages/s of its last period}
+        self.measured = {} # {number of workers: time.monotonic() of its last period}
+        self.saved = None
+
+    @staticmethod
+    def bounds(option) -> tuple:
+        """
+        Returns:
+            tuple: (min_workers, max_workers) of option, max_workers being the number of cpu when not set
+        """
+        max_workers = option.max_workers or os.cpu_count() or 1
+        return option.min_workers, max(option.min_workers, max_workers)
+
+    @classmethod
+    def load(cls, option) -> int | None:
+        """
+        Returns:
+            int | None: Number of workers chosen by the last run, within the bounds of option. None if it has never been saved
+        """
+        try:
+            with open(os.path.join(option.data_folder, SAVE_FILE), 'r') as f:
+                n_workers = int(json.load(f)['n_workers'])
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        low, high = cls.bounds(option)
+        return min(max(n_workers, low), high)
+
+    def save(self, n_workers: int) -> None:
+        """
+        Args:
+            n_workers (int): Best number of workers measured, written in data_folder/autotune.json when it changes
+        """
+        if n_workers == self.saved:
+            return
+        with tempfile.NamedTemporaryFile('w', dir=self.option.data_folder, delete=False) as f:
+            json.dump({'n_workers': n_workers, 'pages_per_second': round(self.rates[n_workers], 2)}, f)
+        os.replace(f.name, os.path.join(self.option.data_folder, SAVE_FILE))
+        self.saved = n_workers
+        self.logger.info(f"Autotune: best throughput with {n_workers} workers ({self.rates[n_workers]:.1f} pages/s), saved for the next run")
+
+    def expire(self, now: float) -> None:
+        """
+        Forget the measures older than EXPIRY seconds
+
+        Args:
+            now (float): time.monotonic()
+        """
+        for n in [n for n, measured in self.measured.items() if now - measured > EXPIRY]:
+            del self.rates[n], self.measured[n]
+
+    def best(self) -> int:
+        """
+        Returns:
+            int: Smallest number of workers measured with the best throughput (within TOLERANCE)
+        """
+        top = max(self.rates.values())
+        return min(n for n, rate in self.rates.items() if rate * (1 + TOLERANCE) >= top)
+
+    def next(self, free: int) -> int:
+        """
+        Args:
+            free (int): Available memory in bytes, 0 if unknown
+
+        Returns:
+            int: Number of workers for the next period
+        """
+        low, high = self.bounds(self.option)
+        worker_memory = max([WORKER_MEMORY, *(rss for rss, _, _ in self.metrics.largest_files)])
+        if free and free < worker_memory:
+            for n in [n for n in self.rates if n >= self.n_workers]: # Not enough memory for this number anymore
+                del self.rates[n], self.measured[n]
+            return max(low, self.n_workers - 1)
+        best = self.best()
+        if best == self.n_workers and best < high and best + 1 not in self.rates and (not free or free >= 2 * worker_memory):
+            return best + 1
+        return best
+
+    def run(self) -> None:
+        pages, start = self.metrics.pages, time.monotonic()
+        warming = True # Period after a change, while added workers start and removed ones finish their bundle
+        while not self.CancelProcessEvent.wait(PERIOD) and not self.supervisor.stopped:
+            now = time.monotonic()
+            rate = (self.metrics.pages - pages) / (now - start)
+            pages, start = self.metrics.pages, now
+            if warming or rate == 0 or self.queue.qsize() < self.n_workers or not all(self.as_started):
+                warming = False
+                continue
+            self.rates[self.n_workers], self.measured[self.n_workers] = rate, now
+            self.expire(now)
+            self.save(self.best())
+            free = available_memory()
+            n_workers = self.next(free)
+            if n_workers == self.n_workers:
+                continue
+            memory = f", {free / 1024**2:.0f} Mo available" if free else ""
+            self.logger.info(f"Autotune: {self.n_workers} -> {n_workers} workers ({rate:.1f} pages/s with {self.n_workers}{memory})")
+            self.as_started.extend([False] * (n_workers - len(self.as_started)))
+            self.supervisor.resize(n_workers)
+            self.n_workers, warming = n_workers, True
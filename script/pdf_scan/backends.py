@@ -0,0 +1,187 @@
+"""
+Text extraction backends. A backend opens a pdf once and extracts the text of its pages.
+Engines faster than pypdf are used when their package is installed (pymupdf, pypdfium2).
+"""
+import time, pypdf
+
+from .prefilter import raw_text
+
+try:
+    import fitz # pymupdf
+except ImportError:
+    fitz = None
+
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+class Backend(object):
+    """
+    Default backend, reading pages from the pypdf reader opened by the worker
+    """
+    name = ''
+    available = True
+
+    def open(self, path: str, reader: pypdf.PdfReader):
+        """
+        Args:
+            path (str): Path of the pdf
+            reader (pypdf.PdfReader): Reader opened by the worker
+
+        Returns:
+            Any: Document given to text and close
+        """
+        return reader
+
+    def text(self, document, k: int) -> str | None:
+        """
+        Args:
+            document (Any): Document returned by open
+            k (int): Index of the page
+
+        Returns:
+            str | None: Text of the page, None if the backend can not extract it
+        """
+        raise NotImplementedError
+
+    def close(self, document) -> None:
+        pass
+
+class PypdfBackend(Backend):
+    name = 'pypdf'
+
+    def text(self, reader: pypdf.PdfReader, k: int) -> str:
+        return reader.pages[k].extract_text()
+
+class PypdfLayoutBackend(Backend):
+    """
+    pypdf layout mode: keeps the position of the text, slower
+    """
+    name = 'pypdf-layout'
+
+    def text(self, reader: pypdf.PdfReader, k: int) -> str:
+        return reader.pages[k].extract_text(extraction_mode='layout')
+
+class RawBackend(Backend):
+    """
+    Strings of the content stream (see prefilter.raw_text). Only pages with simple fonts are extracted,
+    the next backend extracts the other pages
+    """
+    name = 'raw'
+
+    def text(self, reader: pypdf.PdfReader, k: int) -> str | None:
+        return raw_text(reader.pages[k])
+
+class PymupdfBackend(Backend):
+    name = 'pymupdf'
+    available = fitz is not None
+
+    def open(self, path: str, reader: pypdf.PdfReader):
+        return fitz.open(path)
+
+    def text(self, document, k: int) -> str:
+        return document[k].get_text()
+
+    def close(self, document) -> None:
+        document.close()
+
+class PdfiumBackend(Backend):
+    name = 'pdfium'
+    available = pypdfium2 is not None
+
+    def open(self, path: str, reader: pypdf.PdfReader):
+        return pypdfium2.PdfDocument(path)
+
+    def text(self, document, k: int) -> str:
+        page = document[k]
+        textpage = page.get_textpage()
+        try:
+            return textpage.get_text_range()
+        finally:
+            textpage.close()
+            page.close()
+
+    def close(self, document) -> None:
+        document.close()
+
+BACKENDS = {backend.name: backend for backend in (RawBackend, PymupdfBackend, PdfiumBackend, PypdfBackend, PypdfLayoutBackend)}
+AUTO = ('pymupdf', 'pdfium', 'pypdf') # Fastest first. raw is only used when asked for: its text may differ from pypdf
+
+def select_backends(names: str) -> list:
+    """
+    Args:
+        names (str): Comma separated names of backends, in order of preference. 'auto' for the installed engines of AUTO, fastest first
+
+    Returns:
+        list: Backend objects
+    """
+    names = [name.strip() for name in names.split(',')]
+    if names == ['auto']:
+        return [BACKENDS[name]() for name in AUTO if BACKENDS[name].available]
+    for name in names:
+        if name not in BACKENDS:
+            raise ValueError(f"Unknown backend {name}. Available backends: {', '.join(BACKENDS)}")
+        if not BACKENDS[name].available:
+            raise ValueError(f"Backend {name} is not installed")
+    return [BACKENDS[name]() for name in names]
+
+class Extractor(object):
+    """
+    Text of the pages of a pdf, extracted by the first backend giving usable text.
+    A backend raising an error or giving an empty text is replaced by the next one for the rest of the pdf.
+    A backend not able to extract a page (None) only hands this page to the next one
+    """
+    def __init__(self, backends: list, path: str, reader: pypdf.PdfReader, stats: dict) -> None:
+        """
+        Args:
+            backends (list): Backend objects, in order of preference
+            path (str): Path of the pdf
+            reader (pypdf.PdfReader): Reader opened by the worker
+            stats (dict): {backend name: [pages extracted, seconds, errors, pages handed to the next backend]}, updated by text
+        """
+        self.backends = backends
+        self.path = path
+        self.reader = reader
+        self.stats = stats
+        self.documents = {} # Documents opened by each backend
+        self.current = 0 # Index of the backend used for this pdf
+
+    def text(self, k: int) -> str:
+        """
+        Args:
+            k (int): Index of the page
+
+        Returns:
+            str: Text of the page. Empty if every backend gives an empty text
+        """
+        empty = False # An earlier backend gave an empty text
+        for i in range(self.current, len(self.backends)):
+            backend = self.backends[i]
+            stats = self.stats.setdefault(backend.name, [0, 0.0, 0, 0])
+            start = time.perf_counter()
+            try:
+                if backend.name not in self.documents:
+                    self.documents[backend.name] = backend.open(self.path, self.reader)
+                text = backend.text(self.documents[backend.name], k)
+            except Exception:
+                stats[1] += time.perf_counter() - start
+                stats[2] += 1
+                if i == len(self.backends) - 1:
+                    raise
+                self.current = i + 1
+                continue
+            stats[1] += time.perf_counter() - start
+            if text is not None and (text.strip() or i == len(self.backends) - 1):
+                stats[0] += 1
+                if empty and text.strip():
+                    self.current = i
+                return text
+            stats[3] += 1
+            empty = empty or text is not None
+        return ''
+
+    def close(self) -> None:
+        for backend in self.backends:
+            if backend.name in self.documents:
+                backend.close(self.documents.pop(backend.name))
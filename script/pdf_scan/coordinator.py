@@ -0,0 +1,179 @@
+"""
+Scan on several hosts. The main process of the coordinator (Option.coordinator) serves its scan queue, result queue
+and log queue over TCP. Worker nodes (python -m script node) connect to it, lease tasks, send heartbeats and
+read the pdf from a shared storage. Tasks of a node without heartbeat for lease_timeout seconds are requeued.
+"""
+import os, socket, threading, time, multiprocessing, copy
+from multiprocessing.managers import BaseManager, DictProxy
+from queue import Queue
+
+from .supervisor import Supervisor
+from .scheduler import Scheduler
+
+class CoordinatorManager(BaseManager):
+    """
+    Server of the coordinator, running in its main process. Worker nodes connect to it as clients
+    """
+
+for typeid in ('scheduler', 'results', 'logs'):
+    CoordinatorManager.register(typeid)
+CoordinatorManager.register('settings', proxytype=DictProxy)
+
+class SharedFolder(object):
+    """
+    Path of the pdf of the coordinator on a worker node
+    """
+    def __init__(self, remote: str, remote_abs: str, local: str) -> None:
+        """
+        Args:
+            remote (str): pdf_folder of the coordinator, as in the paths of its tasks
+            remote_abs (str): Absolute path of pdf_folder on the coordinator, for links in the results
+            local (str): Folder where the node reads the same pdf
+        """
+        self.remote = remote
+        self.remote_abs = remote_abs
+        self.local = local
+
+    def local_path(self, path: str) -> str:
+        return os.path.join(self.local, os.path.relpath(path, self.remote))
+
+    def abs_path(self, path: str) -> str:
+        return os.path.join(self.remote_abs, os.path.relpath(path, self.remote))
+
+def parse_address(address: str) -> tuple:
+    """
+    Args:
+        address (str): 'host:port'
+
+    Returns:
+        tuple: (host, port)
+    """
+    host, port = address.rsplit(':', 1)
+    return host, int(port)
+
+def serve(option, queue: Scheduler, qresult: Queue, qlog: multiprocessing.SimpleQueue, logger, CancelProcessEvent: multiprocessing.Event) -> None:
+    """
+    Start the server of the coordinator and the thread expiring leases of dead nodes. The server runs until the process exits
+
+    Args:
+        option (Option): Option object, sent to worker nodes
+        queue (Scheduler): Queue of pdf to scan
+        qresult (queue.Queue): Queue containing results of workers
+        qlog (multiprocessing.SimpleQueue): Queue containing log messages of workers
+        logger (logging.Logger): Logger object
+        CancelProcessEvent (multiprocessing.Event): Event to cancel the process
+    """
+    settings = {'option': option, 'pdf_folder': option.pdf_folder, 'abs_pdf_folder': os.path.abspath(option.pdf_folder)}
+    CoordinatorManager.register('scheduler', callable=lambda: queue)
+    CoordinatorManager.register('results', callable=lambda: qresult)
+    CoordinatorManager.register('logs', callable=lambda: qlog)
+    CoordinatorManager.register('settings', callable=lambda: settings, proxytype=DictProxy)
+    server = CoordinatorManager(parse_address(option.coordinator), option.authkey.encode()).get_server()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    threading.Thread(target=expire_nodes, args=(option, queue, logger, CancelProcessEvent), daemon=True).start()
+    logger.info(f"Coordinator listening on {option.coordinator} for worker nodes")
+
+def expire_nodes(option, queue: Scheduler, logger, CancelProcessEvent: multiprocessing.Event) -> None:
+    """
+    Thread requeuing the tasks of worker nodes without heartbeat for lease_timeout seconds
+    """
+    while not CancelProcessEvent.is_set():
+        time.sleep(option.lease_timeout / 3)
+        for node, n_tasks in queue.expire(option.lease_timeout).items():
+            logger.warning(f"[{node}] No heartbeat for {option.lease_timeout} s. Requeuing its {n_tasks} tasks")
+
+def relay(node: str, as_started: list, qlog: multiprocessing.SimpleQueue, logs, supervisor: Supervisor, CancelProcessEvent: multiprocessing.Event) -> None:
+    """
+    Thread of a worker node handling the messages of its workers (like script.qlogger) and sending the others to the coordinator
+
+    Args:
+        node (str): Name of the worker node
+        as_started (list): List of boolean to know if a worker has started
+        qlog (multiprocessing.SimpleQueue): Queue containing log messages of the workers of the node
+        logs (multiprocessing.SimpleQueue): Proxy of the log queue of the coordinator
+        supervisor (Supervisor): Supervisor of the workers of the node
+        CancelProcessEvent (multiprocessing.Event): Event to cancel the process
+    """
+    while not CancelProcessEvent.is_set():
+        level, message = qlog.get()
+        match level:
+            case 'started':
+                as_started[message-1] = True
+                logs.put(('info', f"[{node}] [P{message}] Worker has started"))
+            case 'retired':
+                worker_id, reason = message
+                logs.put(('info', f"[{node}] [P{worker_id}] Worker has been retired ({reason}). Starting a new one"))
+                supervisor.respawn(worker_id)
+            case 'bundle':
+                supervisor.assign(*message)
+            case 'debug' | 'info' | 'warning' | 'error' | 'fatal':
+                logs.put((level, f"[{node}] {message}"))
+            case _: # exception, metrics, cache and timeout are handled by the coordinator
+                logs.put((level, message))
+
+def heartbeat(node: str, queue: Scheduler, lease_timeout: int | float, CancelProcessEvent: multiprocessing.Event) -> None:
+    """
+    Thread of a worker node keeping its leases alive. Cancel the node if the coordinator can not be reached
+    """
+    while not CancelProcessEvent.is_set():
+        try:
+            queue.heartbeat(node)
+        except (OSError, EOFError):
+            CancelProcessEvent.set()
+            return
+        CancelProcessEvent.wait(lease_timeout / 3)
+
+def run_node(address: str, authkey: str, n_workers: int, pdf_folder: str, data_folder: str, logger, name: str = "") -> int:
+    """
+    Scan the pdf of a coordinator until its scan is over (or forever if it watches for new pdf)
+
+    Args:
+        address (str): 'host:port' of the coordinator
+        authkey (str): Authentication key of the coordinator (Option.authkey)
+        n_workers (int): Number of workers of the node
+        pdf_folder (str): Folder where the node reads the pdf of the coordinator (shared storage)
+        data_folder (str): Folder of the text cache and n-gram index of the node
+        logger (logging.Logger): Logger object
+        name (str): Name of the node. Empty for hostname-pid
+
+    Returns:
+        int: Exit code
+    """
+    name = name or f"{socket.gethostname()}-{os.getpid()}"
+    manager = CoordinatorManager(parse_address(address), authkey.encode())
+    manager.connect()
+    settings = manager.settings()
+    queue, qresult, logs = manager.scheduler(), manager.results(), manager.logs()
+
+    option = copy.copy(settings.get('option'))
+    option.pdf_folder, option.data_folder, option.n_workers, option.progress_bar = pdf_folder, data_folder, n_workers, False
+    os.makedirs(data_folder, exist_ok=True)
+    shared = SharedFolder(settings.get('pdf_folder'), settings.get('abs_pdf_folder'), pdf_folder)
+
+    CancelProcessEvent = multiprocessing.Event()
+    qlog = multiprocessing.SimpleQueue()
+    as_started = [False] * n_workers
+    supervisor = Supervisor(option, qresult, qlog, queue, CancelProcessEvent, node=name, shared=shared)
+    queue.heartbeat(name)
+    threading.Thread(target=heartbeat, args=(name, queue, option.lease_timeout, CancelProcessEvent), daemon=True).start()
+    threading.Thread(target=relay, args=(name, as_started, qlog, logs, supervisor, CancelProcessEvent), daemon=True).start()
+    supervisor.start(n_workers)
+    logger.info(f"[{name}] Connected to {address} with {n_workers} workers")
+    logs.put(('info', f"[{name}] Worker node connected with {n_workers} workers"))
+
+    try:
+        supervisor.join()
+    except KeyboardInterrupt:
+        logger.info(f"[{name}] Interrupted: stopping workers")
+        CancelProcessEvent.set()
+        for p in supervisor.process:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.kill()
+                p.join() # Results it sent are relayed before leaving
+    try:
+        queue.leave(name) # Unfinished tasks are requeued for the other workers
+        logs.put(('info', f"[{name}] Worker node has left"))
+    except (OSError, EOFError):
+        logger.warning(f"[{name}] Coordinator is not reachable anymore")
+    return 0
@@ -0,0 +1,293 @@
+import os, json, tempfile
+import numpy as np
+import pandas as pd
+
+from .record import ScanRecord, best_first
+
+UNKNOWN = np.iinfo(np.uint16).max # Count of a keyword added after the page has been scanned, without text to count it
+COMPACT_MIN_ROWS = 4096
+BLOCK_ROWS = 65536 # Rows of the memory-mapped arrays read at once by blocks and compact
+
+def page_keys(rows: np.ndarray) -> np.ndarray:
+    """
+    Args:
+        rows (np.ndarray): [doc id, page, exact] rows
+
+    Returns:
+        np.ndarray: Key of each page, in the order of the rows of the arrays
+    """
+    return (rows[:, 0].astype(np.uint64) << np.uint64(32)) | rows[:, 1]
+
+class CountMatrix(object):
+    """
+    Number of occurrences of every keyword in every scanned page (one row by page of a pdf content hash, one column
+    by keyword), so results can be scored again without scanning the pdf when keyword_file or threshold change.
+    Rows are memory-mapped from counts-N.npy and rows-N.npy, sorted by page, and only read by blocks. New rows are appended
+    to delta-N.bin (kept in memory) and merged in a new generation N+1 once the delta is as large as the arrays,
+    so a render only writes its new pages.
+    Counts of pruned pages (see Option.prefilter) come from the content stream and are only an upper bound.
+    Written by the main process only (see Renderer).
+    """
+    def __init__(self, folder: str) -> None:
+        """
+        Args:
+            folder (str): Folder of the matrix (created if needed)
+        """
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        meta = self.read_json('meta.json', {'generation': 0, 'words': []})
+        self.generation = meta['generation']
+        self.words = meta['words'] # Keyword of each column
+        with open(os.path.join(folder, 'docs.txt'), 'a+') as f: # Content hash of each doc id, append only
+            f.seek(0)
+            self.docs = f.read().split()
+        self.doc_ids = {h: i for i, h in enumerate(self.docs)}
+
+        width = len(self.words) + 3
+        if os.path.isfile(self.path('counts')):
+            self.counts = np.load(self.path('counts'), mmap_mode='r')
+            self.rows = np.load(self.path('rows'), mmap_mode='r')
+        else:
+            self.counts = np.empty((0, len(self.words)), dtype=np.uint16)
+            self.rows = np.empty((0, 3), dtype=np.uint32)
+        delta = np.fromfile(self.path('delta'), dtype=np.uint32) if os.path.isfile(self.path('delta')) else np.empty(0, dtype=np.uint32)
+        delta = delta[:len(delta) - len(delta) % width] # Last row may be half-written
+        self.delta = [delta.reshape(-1, width)] # [doc id, page (starting at 1), exact, counts...] rows
+
+    def path(self, name: str, generation: int | None = None) -> str:
+        generation = self.generation if generation is None else generation
+        return os.path.join(self.folder, f'{name}-{generation}.bin' if name == 'delta' else f'{name}-{generation}.npy')
+
+    def read_json(self, name: str, default):
+        path = os.path.join(self.folder, name)
+        if not os.path.isfile(path):
+            return default
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def write_json(self, name: str, value) -> None:
+        with tempfile.NamedTemporaryFile('w', dir=self.folder, delete=False) as f:
+            json.dump(value, f)
+        os.replace(f.name, os.path.join(self.folder, name))
+
+    def __len__(self) -> int:
+        return len(self.rows) + sum(len(delta) for delta in self.delta)
+
+    def doc_id(self, doc_hash: str) -> int:
+        if doc_hash not in self.doc_ids:
+            with open(os.path.join(self.folder, 'docs.txt'), 'a') as f:
+                f.write(doc_hash + '\n')
+            self.doc_ids[doc_hash] = len(self.docs)
+            self.docs.append(doc_hash)
+        return self.doc_ids[doc_hash]
+
+    def append(self, record: ScanRecord) -> None:
+        """
+        Add the counts of the pages of a record. Pages scanned again replace their previous counts
+
+        Args:
+            record (ScanRecord): Record with counts (see Option.count_matrix)
+        """
+        if len(record.counted) == 0:
+            return
+        if any(word not in self.words for word in record.words): # First pages counted for these words
+            self.compact(record.words)
+        counts = np.frombuffer(record.counts, dtype=np.uint16).reshape(len(record.counted), len(record.words))
+        block = np.full((len(record.counted), len(self.words) + 3), UNKNOWN, dtype=np.uint32)
+        block[:, 0] = self.doc_id(record.hash)
+        block[:, 1] = record.counted
+        block[:, 2] = np.frombuffer(record.exact, dtype=np.uint8)
+        columns = {word: i for i, word in enumerate(record.words)}
+        for j, word in enumerate(self.words):
+            if word in columns:
+                block[:, 3 + j] = counts[:, columns[word]]
+        with open(self.path('delta'), 'ab') as f:
+            f.write(block.tobytes())
+        self.delta.append(block)
+        if len(self) - len(self.rows) >= max(COMPACT_MIN_ROWS, len(self.rows)):
+            self.compact()
+
+    def sorted_delta(self) -> tuple:
+        """
+        Returns:
+            tuple: rows, counts and keys (see page_keys) of the delta, sorted by page, last counts of each page
+        """
+        delta = np.concatenate(self.delta)
+        keys = page_keys(delta)
+        _, last = np.unique(keys[::-1], return_index=True) # Sorted keys, index of their last occurrence
+        last = len(keys) - 1 - last
+        return delta[last, :3], delta[last, 3:].astype(np.uint16), keys[last]
+
+    def blocks(self):
+        """
+        Read the arrays by blocks of BLOCK_ROWS rows, without the pages counted again in the delta, then the delta
+
+        Yields:
+            tuple: rows ([doc id, page, exact] by page) and counts (one column by word of self.words) of a block, last counts of each page
+        """
+        delta_rows, delta_counts, delta_keys = self.sorted_delta()
+        for start in range(0, len(self.rows), BLOCK_ROWS):
+            rows = np.asarray(self.rows[start:start + BLOCK_ROWS])
+            kept = ~self.in_delta(page_keys(rows), delta_keys)
+            yield rows[kept], np.asarray(self.counts[start:start + BLOCK_ROWS])[kept]
+        yield delta_rows, delta_counts
+
+    @staticmethod
+    def in_delta(keys: np.ndarray, delta_keys: np.ndarray) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: True for the keys which are in delta_keys (sorted)
+        """
+        if len(delta_keys) == 0:
+            return np.zeros(len(keys), dtype=bool)
+        found = np.searchsorted(delta_keys, keys)
+        return delta_keys[np.minimum(found, len(delta_keys) - 1)] == keys
+
+    def compact(self, words: list = (), texts=None) -> None:
+        """
+        Merge the delta in a new generation of the arrays. The arrays are merged by blocks into memory-mapped files
+
+        Args:
+            words (list): Keywords to add as new columns
+            texts (callable): Function giving {page index: normalized text} of a content hash (see NgramIndex.texts), to count
+                the new words. Pages without text get UNKNOWN counts. None to not count them
+        """
+        words = [word for word in dict.fromkeys(words) if word not in self.words]
+        delta_rows, delta_counts, delta_keys = self.sorted_delta()
+        n_kept = sum(int((~self.in_delta(page_keys(np.asarray(self.rows[start:start + BLOCK_ROWS])), delta_keys)).sum())
+                     for start in range(0, len(self.rows), BLOCK_ROWS))
+        generation = self.generation + 1
+        rows = self.create('rows', generation, (n_kept + len(delta_rows), 3), np.uint32)
+        counts = self.create('counts', generation, (n_kept + len(delta_rows), len(self.words) + len(words)), np.uint16)
+        if words:
+            counts[:, len(self.words):] = UNKNOWN
+
+        # Sorted merge: a row goes after the rows of the other array with a smaller key
+        kept_before, delta_offset = 0, np.zeros(len(delta_rows), dtype=np.int64)
+        for start in range(0, len(self.rows), BLOCK_ROWS):
+            block = np.asarray(self.rows[start:start + BLOCK_ROWS])
+            keys = page_keys(block)
+            kept = ~self.in_delta(keys, delta_keys)
+            positions = kept_before + np.arange(int(kept.sum())) + np.searchsorted(delta_keys, keys[kept])
+            rows[positions] = block[kept]
+            counts[positions, :len(self.words)] = np.asarray(self.counts[start:start + BLOCK_ROWS])[kept]
+            kept_before += len(positions)
+            delta_offset += np.searchsorted(keys[kept], delta_keys)
+        positions = np.arange(len(delta_rows)) + delta_offset
+        rows[positions] = delta_rows
+        counts[positions, :len(self.words)] = delta_counts
+
+        if words and texts is not None:
+            for start in range(0, len(rows), BLOCK_ROWS):
+                block = np.asarray(rows[start:start + BLOCK_ROWS])
+                bounds = np.flatnonzero(np.diff(block[:, 0])) + 1
+                for first, end in zip(np.r_[0, bounds], np.r_[bounds, len(block)]): # A doc at the end of a block is read again by the next one
+                    pages = texts(self.docs[block[first, 0]])
+                    for i in range(first, end):
+                        text = pages.get(int(block[i, 1]) - 1)
+                        if text is not None:
+                            counts[start + i, -len(words):] = [min(text.count(word), UNKNOWN - 1) for word in words]
+        for name, values in (('rows', rows), ('counts', counts)):
+            if isinstance(values, np.memmap):
+                values.flush()
+            else:
+                with open(self.path(name, generation), 'wb') as f:
+                    np.save(f, values)
+        del rows, counts
+        self.write_json('meta.json', {'generation': generation, 'words': self.words + words}) # New generation is complete
+        for name in ('counts', 'rows', 'delta'):
+            if os.path.isfile(self.path(name)):
+                os.remove(self.path(name))
+        self.generation = generation
+        self.words = self.words + words
+        self.counts = np.load(self.path('counts'), mmap_mode='r')
+        self.rows = np.load(self.path('rows'), mmap_mode='r')
+        self.delta = [np.empty((0, len(self.words) + 3), dtype=np.uint32)]
+
+    def create(self, name: str, generation: int, shape: tuple, dtype) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: Array of a new generation, memory-mapped in its file. Empty arrays are kept in memory (saved by compact)
+        """
+        if 0 in shape:
+            return np.zeros(shape, dtype=dtype)
+        return np.lib.format.open_memmap(self.path(name, generation), mode='w+', dtype=dtype, shape=shape)
+
+    def clear(self) -> None:
+        self.docs, self.doc_ids = [], {}
+        open(os.path.join(self.folder, 'docs.txt'), 'w').close()
+        self.delta = [np.empty((0, len(self.words) + 3), dtype=np.uint32)]
+        self.rows = np.empty((0, 3), dtype=np.uint32)
+        self.counts = np.empty((0, len(self.words)), dtype=np.uint16)
+        self.compact()
+
+    def scoring(self, option) -> dict:
+        """
+        Returns:
+            dict: Keywords and threshold used to score the saved results, and those of each profile of option.profiles
+        """
+        scoring = {'keywords': option.keywords.to_dict('list'), 'threshold': option.threshold}
+        if option.profiles:
+            scoring['profiles'] = {name: {'keywords': option.profile_keywords[name].to_dict('list'), 'threshold': threshold}
+                                   for name, (_, threshold) in option.profiles.items()}
+        return scoring
+
+    def scoring_changed(self, option) -> bool:
+        """
+        Args:
+            option (Option): Option object
+
+        Returns:
+            bool: True if keyword_file or threshold changed since the last save_scoring. False if it has never been saved
+        """
+        saved = self.read_json('scoring.json', None)
+        return saved is not None and saved != json.loads(json.dumps(self.scoring(option)))
+
+    def save_scoring(self, option) -> None:
+        self.write_json('scoring.json', self.scoring(option))
+
+    def rescore(self, data: pd.DataFrame, option, texts=None) -> tuple:
+        """
+        Score results again with the keywords and threshold of option, from the saved counts
+
+        Args:
+            data (pd.DataFrame): Results to score, with result_store.COLUMNS columns
+            option (Option): Option object
+            texts (callable): Function giving the normalized text of the pages of a content hash, to count new keywords (see compact)
+
+        Returns:
+            tuple: Updated results (pd.DataFrame) and filenames (set) which must be scanned again: pdf without counts,
+                with pages whose counts are unknown for a new keyword or pruned pages which may now reach the threshold
+        """
+        matcher, threshold = option.matcher, option.threshold
+        if any(word not in self.words for word in matcher.words):
+            self.compact(matcher.words, texts)
+        columns = [self.words.index(word) for word in matcher.words]
+
+        detected_blocks, stale_docs, counted = [], set(), set()
+        for rows, counts in self.blocks(): # Only the detected pages of each block are kept
+            counts = counts[:, columns]
+            unknown = (counts == UNKNOWN).any(axis=1)
+            exact = rows[:, 2] == 1
+            scores = matcher.score_matrix(counts)
+            stale = unknown | (~exact & (matcher.upper_bound_matrix(counts) >= threshold))
+            detected = exact & ~stale & (scores >= threshold)
+            stale_docs.update(rows[stale, 0].tolist())
+            counted.update(np.unique(rows[:, 0]).tolist())
+            detected_blocks.append((rows[detected, 0], rows[detected, 1], scores[detected]))
+        docs, pages, scores = (np.concatenate(values) for values in zip(*detected_blocks))
+        order = np.argsort(docs, kind='stable') # The pages of the delta come after the blocks of the arrays
+        docs, pages, scores = docs[order], pages[order], scores[order]
+
+        updated, rescan = [], set()
+        for row in data.itertuples(index=False):
+            filename, doc_hash = row[0], row[9]
+            doc = self.doc_ids.get(doc_hash)
+            if doc is None or doc not in counted or doc in stale_docs:
+                rescan.add(filename)
+                continue
+            start, end = np.searchsorted(docs, [doc, doc + 1])
+            detected_pages = best_first(pages[start:end].tolist(), scores[start:end].tolist())
+            if detected_pages != row[4]: # Timed out pages and pages not scanned by a partial scan have no counts: they stay in the result
+                updated.append((filename, row[1], row[2], end - start, detected_pages, *row[5:]))
+        return pd.DataFrame(updated, columns=data.columns), rescan
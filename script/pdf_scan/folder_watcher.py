@@ -0,0 +1,128 @@
+import os, sys, select, struct, threading, ctypes, ctypes.util
+import multiprocessing
+
+# inotify constants (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+EVENT_HEADER = struct.Struct('iIII')
+
+class FolderWatcher(threading.Thread):
+    """
+    Thread submitting pdf added to a folder by any tool. Use inotify on Linux and poll the folder elsewhere.
+    A pdf is submitted once it is fully written: when its writer closes it (inotify) or when its size and
+    modification time stop changing (polling).
+    """
+    def __init__(self, folder: str, submit, CancelProcessEvent: multiprocessing.Event, logger, poll_interval: int | float = 1) -> None:
+        """
+        Args:
+            folder (str): Folder to watch
+            submit (callable): Function called with the path of each new pdf. Return True if the pdf has been put in the queue
+            CancelProcessEvent (multiprocessing.Event): Event to cancel the process
+            logger (logging.Logger): Logger object
+            poll_interval (int|float): Time (in second) between two checks of the folder when inotify is not available
+        """
+        super().__init__(name="FolderWatcher", daemon=True)
+        self.folder = folder
+        self.submit = submit
+        self.CancelProcessEvent = CancelProcessEvent
+        self.logger = logger
+        self.poll_interval = poll_interval
+
+    def run(self) -> None:
+        try:
+            fd = self.inotify_init()
+        except OSError as error:
+            self.logger.info(f"inotify is not available ({error}). Polling {self.folder} every {self.poll_interval}s")
+            self.poll()
+            return
+        try:
+            self.logger.info(f"Watching {self.folder} for new pdf (inotify)")
+            self.watch(fd)
+        finally:
+            os.close(fd)
+
+    def inotify_init(self) -> int:
+        """
+        Returns:
+            int: inotify file descriptor watching the folder
+        """
+        if not sys.platform.startswith('linux'):
+            raise OSError("not a linux system")
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), os.strerror(ctypes.get_errno()))
+        if libc.inotify_add_watch(fd, os.fsencode(os.path.abspath(self.folder)), IN_CLOSE_WRITE | IN_MOVED_TO) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, os.strerror(errno))
+        return fd
+
+    def watch(self, fd: int) -> None:
+        """
+        Submit pdf closed after writing or moved in the folder
+
+        Args:
+            fd (int): inotify file descriptor
+        """
+        while not self.CancelProcessEvent.is_set():
+            ready, _, _ = select.select([fd], [], [], 1) # Wake up every second to check CancelProcessEvent
+            if not ready:
+                continue
+            try:
+                buffer = os.read(fd, 64 * 1024)
+            except BlockingIOError:
+                continue
+            offset = 0
+            while offset < len(buffer):
+                _, mask, _, length = EVENT_HEADER.unpack_from(buffer, offset)
+                name = os.fsdecode(buffer[offset + EVENT_HEADER.size:offset + EVENT_HEADER.size + length].rstrip(b'\0'))
+                offset += EVENT_HEADER.size + length
+                if mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and name.endswith('.pdf'):
+                    self.add(name)
+
+    def poll(self) -> None:
+        """
+        Submit new or modified pdf whose size and modification time did not change since the previous check
+        """
+        known = self.signatures() # Pdf already in the folder are handled by main
+        pending = {}
+        while not self.CancelProcessEvent.wait(self.poll_interval):
+            current = self.signatures()
+            for name, signature in current.items():
+                if known.get(name) == signature:
+                    continue
+                if pending.get(name) == signature: # Unchanged since the previous check: fully written
+                    known[name] = signature
+                    del pending[name]
+                    self.add(name)
+                else:
+                    pending[name] = signature
+            for name in set(known) - set(current):
+                del known[name]
+
+    def add(self, name: str) -> None:
+        """
+        Args:
+            name (str): Filename of the new pdf
+        """
+        try:
+            if self.submit(os.path.join(self.folder, name)):
+                self.logger.info(f"New pdf detected in {self.folder}: adding {name} to queue")
+        except FileNotFoundError: # Removed or renamed right after being written
+            pass
+
+    def signatures(self) -> dict:
+        """
+        Returns:
+            dict: {filename: (size, modification time)} of pdf in the folder
+        """
+        signatures = {}
+        with os.scandir(self.folder) as it:
+            for entry in it:
+                if entry.name.endswith('.pdf') and entry.is_file():
+                    stat = entry.stat()
+                    signatures[entry.name] = (stat.st_size, stat.st_mtime_ns)
+        return signatures
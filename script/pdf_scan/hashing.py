@@ -0,0 +1,22 @@
+import hashlib
+
+def file_hash(path: str) -> str:
+    """
+    Args:
+        path (str): Path of the file to hash
+
+    Returns:
+        str: Hash of the file content
+    """
+    with open(path, 'rb') as f:
+        return hashlib.file_digest(f, 'sha1').hexdigest()
+
+def text_hash(text: str) -> str:
+    """
+    Args:
+        text (str): Text to hash
+
+    Returns:
+        str: Hash of the text
+    """
+    return hashlib.sha1(text.encode('utf-8', 'surrogatepass')).hexdigest()
@@ -0,0 +1,142 @@
+import os, pickle, struct, time, zlib
+
+try:
+    import fcntl
+except ImportError: # Not available on Windows: the journal is only cleared at startup, once replayed
+    fcntl = None
+
+from .record import ScanRecord
+
+HEADER = struct.Struct('<II') # Length and crc32 of a pickled record
+
+class Journal(object):
+    """
+    Append-only journal of the records of scanned pdf, so pdf scanned by an interrupted run (crash, kill, cancel) are not
+    scanned again. Each worker appends a record to its own segment as soon as its pdf is scanned, the main process
+    replays every segment at the next start (see script.replay_journal), then removes them.
+    An entry is the length and crc32 of a pickled ScanRecord followed by the record: a half-written entry ends its segment.
+    In watching mode, the main process removes the rendered records after each render (see truncate). Segments are
+    locked while a record is appended and while they are truncated: a worker whose segment has been removed opens a new one.
+    """
+    def __init__(self, folder: str) -> None:
+        """
+        Args:
+            folder (str): Folder of the segments (created if needed)
+        """
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.file = None
+
+    def append(self, record: ScanRecord) -> None:
+        """
+        Write a record in the segment of this process. It is kept if the process is killed, see sync to keep it if the host stops
+
+        Args:
+            record (ScanRecord): Record of a scanned pdf (or part of pdf)
+        """
+        data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+        entry = HEADER.pack(len(data), zlib.crc32(data)) + data
+        while True:
+            if self.file is None: # A new process may get the pid of a killed one: its segment may end with a half-written entry
+                self.file = open(self.new_segment(), 'ab', buffering=0)
+            if fcntl is None:
+                self.file.write(entry)
+                return
+            fcntl.flock(self.file.fileno(), fcntl.LOCK_EX)
+            try:
+                if os.fstat(self.file.fileno()).st_nlink > 0:
+                    self.file.write(entry)
+                    return
+            finally:
+                fcntl.flock(self.file.fileno(), fcntl.LOCK_UN)
+            self.close() # Segment removed by truncate
+
+    def new_segment(self) -> str:
+        return os.path.join(self.folder, f'{os.getpid()}-{time.time_ns()}.bin')
+
+    def sync(self) -> None:
+        """
+        Write the appended records to the disk
+        """
+        if self.file is not None:
+            os.fsync(self.file.fileno())
+
+    def segments(self) -> list:
+        return sorted(os.path.join(self.folder, name) for name in os.listdir(self.folder) if name.endswith('.bin'))
+
+    def read(self) -> list:
+        """
+        Returns:
+            list: ScanRecord of every segment, in order of writing within a segment
+        """
+        records = []
+        for segment in self.segments():
+            with open(segment, 'rb') as f:
+                records.extend(self.parse(f.read()))
+        return records
+
+    @staticmethod
+    def parse(data: bytes) -> list:
+        """
+        Returns:
+            list: ScanRecord of the complete entries of a segment
+        """
+        records = []
+        offset = 0
+        while offset + HEADER.size <= len(data):
+            length, crc = HEADER.unpack_from(data, offset)
+            entry = data[offset + HEADER.size:offset + HEADER.size + length]
+            if len(entry) < length or zlib.crc32(entry) != crc:
+                break
+            records.append(pickle.loads(entry))
+            offset += HEADER.size + length
+        return records
+
+    def truncate(self, rendered) -> int:
+        """
+        Remove the rendered records while workers keep appending. Records not rendered yet are written in a new segment
+        before their segment is removed. Must not be called by a process appending to the journal
+
+        Args:
+            rendered (callable): Function giving True if a ScanRecord has been saved in the store
+
+        Returns:
+            int: Number of removed records
+        """
+        if fcntl is None:
+            return 0
+        removed = 0
+        for segment in self.segments():
+            try:
+                f = open(segment, 'rb')
+            except FileNotFoundError:
+                continue
+            with f:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX) # Released when closed, after the segment is removed
+                records = self.parse(f.read())
+                kept = [record for record in records if not rendered(record)]
+                if len(kept) == len(records):
+                    continue
+                if kept:
+                    with open(self.new_segment(), 'wb') as new:
+                        for record in kept:
+                            data = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+                            new.write(HEADER.pack(len(data), zlib.crc32(data)) + data)
+                        new.flush()
+                        os.fsync(new.fileno())
+                os.remove(segment)
+            removed += len(records) - len(kept)
+        return removed
+
+    def clear(self) -> None:
+        """
+        Remove every segment. Only once no worker writes in the journal anymore
+        """
+        self.close()
+        for segment in self.segments():
+            os.remove(segment)
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
@@ -0,0 +1,207 @@
+import re
+import numpy as np
+import pandas as pd
+from unidecode import unidecode
+
+try: # Optional: single pass multi-pattern search when many keywords are used
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+WHITESPACE = re.compile(r'\s+')
+
+class NormalizeTable(dict):
+    """
+    {code point: normalized text} for str.translate, filled on first use. unidecode, lower and whitespace
+    removal work character by character, so translating with this table gives the same text in a single C loop
+    """
+    def __missing__(self, code: int) -> str:
+        value = WHITESPACE.sub('', unidecode(chr(code)).lower())
+        self[code] = value
+        return value
+
+NORMALIZE_TABLE = NormalizeTable()
+
+class KeywordMatcher(object):
+    """
+    Keyword table compiled once per run. Count every keyword of a page together and apply
+    the min/max/score rules as arrays instead of a pandas apply on each page.
+    """
+    automaton_min_words = 32 # Under this number of keywords, str.count (C loop) is faster than the automaton
+
+    def __init__(self, keywords: pd.DataFrame) -> None:
+        """
+        Args:
+            keywords (pd.DataFrame): Keywords loaded from keyword_file (Word, Nb min, Nb max, Score if true, Score if false)
+        """
+        self.words = tuple(keywords['Word'])
+        self.nb_min = keywords['Nb min'].to_numpy(dtype=float)
+        self.nb_max = keywords['Nb max'].to_numpy(dtype=float)
+        self.score_true = keywords['Score if true'].to_numpy(dtype=np.int64)
+        self.score_false = keywords['Score if false'].to_numpy(dtype=np.int64)
+
+        self.automaton = None
+        if ahocorasick is not None and len(self.words) >= KeywordMatcher.automaton_min_words:
+            self.automaton = ahocorasick.Automaton()
+            index = {}
+            for i, word in enumerate(self.words):
+                index.setdefault(word, []).append(i)
+            for word, columns in index.items():
+                self.automaton.add_word(word, (len(word), columns))
+            self.automaton.make_automaton()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """
+        Normalize a page text the same way keywords are written
+
+        Args:
+            text (str): Raw text extracted from the pdf
+
+        Returns:
+            str: Text without accents, spaces and in lower case
+        """
+        return text.translate(NORMALIZE_TABLE) # Retrait des accents et des espaces, mise en minuscule
+
+    def count(self, text: str) -> np.ndarray:
+        """
+        Count non overlapping occurrences of every keyword (same result as str.count)
+
+        Args:
+            text (str): Normalized text (see normalize)
+
+        Returns:
+            np.ndarray: Number of occurrences of each keyword, in keyword_file order
+        """
+        if self.automaton is None:
+            return np.fromiter((text.count(word) for word in self.words), dtype=np.int64, count=len(self.words))
+
+        counts = np.zeros(len(self.words), dtype=np.int64)
+        last_end = {}
+        for end, (length, columns) in self.automaton.iter(text):
+            start = end - length + 1
+            if start < last_end.get(columns[0], 0): # Overlap with the previous occurrence of this word
+                continue
+            last_end[columns[0]] = end + 1
+            counts[columns] += 1
+        return counts
+
+    def score_counts(self, counts: np.ndarray) -> int:
+        """
+        Args:
+            counts (np.ndarray): Keyword counts of one page (see count)
+
+        Returns:
+            int: Score of the page
+        """
+        return int(self.score_matrix(counts))
+
+    def score_matrix(self, counts: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            counts (np.ndarray): Keyword counts of many pages, one row by page and one column by keyword (or of one page)
+
+        Returns:
+            np.ndarray: Score of each page
+        """
+        in_range = (self.nb_min <= counts) & (counts <= self.nb_max)
+        return np.where(in_range, self.score_true, self.score_false).sum(axis=-1)
+
+    def upper_bound(self, counts: np.ndarray) -> int:
+        """
+        Args:
+            counts (np.ndarray): Upper bound of the keyword counts of one page
+
+        Returns:
+            int: Highest score a page can reach if each keyword appears at most counts times
+        """
+        return int(self.upper_bound_matrix(counts))
+
+    def upper_bound_matrix(self, counts: np.ndarray) -> np.ndarray:
+        """
+        Args:
+            counts (np.ndarray): Upper bound of the keyword counts of many pages, one row by page and one column by keyword (or of one page)
+
+        Returns:
+            np.ndarray: Highest score each page can reach (see upper_bound)
+        """
+        can_true = self.nb_min <= counts # Some count in [0, counts] is in [Nb min, Nb max]
+        can_false = (self.nb_min > 0) | (self.nb_max < counts) # Some count in [0, counts] is outside
+        lowest = np.iinfo(np.int64).min
+        return np.maximum(np.where(can_true, self.score_true, lowest), np.where(can_false, self.score_false, lowest)).sum(axis=-1)
+
+    def score(self, text: str) -> int:
+        """
+        Args:
+            text (str): Raw text extracted from the pdf
+
+        Returns:
+            int: Score of the page
+        """
+        return self.score_counts(self.count(self.normalize(text)))
+
+class ProfileScorer(object):
+    """
+    Score pages for several keyword profiles in a single pass (see Option.profiles): each distinct keyword is counted once,
+    then every profile scores the counts of its own keywords
+    """
+    def __init__(self, matchers: list, thresholds: list) -> None:
+        """
+        Args:
+            matchers (list): KeywordMatcher of each profile, the one of keyword_file first
+            thresholds (list): Threshold of each profile
+        """
+        self.matchers = matchers
+        self.thresholds = np.array(thresholds, dtype=np.int64)
+        if len(matchers) == 1:
+            self.counter = matchers[0]
+        else: # Rules of the counter are never used
+            words = list(dict.fromkeys(word for matcher in matchers for word in matcher.words))
+            self.counter = KeywordMatcher(pd.DataFrame({'Word': words, 'Nb min': 0.0, 'Nb max': np.inf, 'Score if true': 0, 'Score if false': 0}))
+        self.words = self.counter.words
+        columns = {word: i for i, word in enumerate(self.words)}
+        self.columns = [np.array([columns[word] for word in matcher.words], dtype=np.intp) for matcher in matchers]
+
+    @classmethod
+    def from_option(cls, option) -> 'ProfileScorer':
+        """
+        Args:
+            option (Option): Option object, with option.matcher and the keywords of its profiles in option.profile_keywords
+
+        Returns:
+            ProfileScorer: Scorer of keyword_file and of every profile of option.profiles
+        """
+        return cls([option.matcher] + [KeywordMatcher(keywords) for keywords in option.profile_keywords.values()],
+                   [option.threshold] + [threshold for _, threshold in option.profiles.values()])
+
+    def count(self, text: str) -> np.ndarray:
+        """
+        Args:
+            text (str): Normalized text
+
+        Returns:
+            np.ndarray: Number of occurrences of each keyword of self.words
+        """
+        return self.counter.count(text)
+
+    def scores(self, counts: np.ndarray) -> list:
+        """
+        Args:
+            counts (np.ndarray): Keyword counts of one page (see count)
+
+        Returns:
+            list: Score of the page for each profile
+        """
+        if len(self.matchers) == 1: # Counts are already in the order of the keywords
+            return [self.counter.score_counts(counts)]
+        return [matcher.score_counts(counts[columns]) for matcher, columns in zip(self.matchers, self.columns)]
+
+    def can_detect(self, counts: np.ndarray) -> bool:
+        """
+        Args:
+            counts (np.ndarray): Upper bound of the keyword counts of one page
+
+        Returns:
+            bool: True if the page may reach the threshold of a profile
+        """
+        return any(matcher.upper_bound(counts[columns]) >= threshold for matcher, columns, threshold in zip(self.matchers, self.columns, self.thresholds))
@@ -0,0 +1,51 @@
+import os, sqlite3
+
+from .hashing import file_hash
+
+class Manifest(object):
+    """
+    Size, modification time and content hash of every pdf of pdf_folder.
+    A file is hashed again only when its size or its modification time changed.
+    """
+    def __init__(self, data_folder: str) -> None:
+        """
+        Args:
+            data_folder (str): Folder containing saved data
+        """
+        self.db = sqlite3.connect(os.path.join(data_folder, 'manifest.sqlite'), timeout=60, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS files (filename TEXT PRIMARY KEY, size INTEGER NOT NULL, mtime_ns INTEGER NOT NULL, hash TEXT NOT NULL)')
+
+    def refresh(self, pdf_folder: str) -> tuple[dict, set]:
+        """
+        Update the manifest with the current content of pdf_folder
+
+        Args:
+            pdf_folder (str): Folder containing pdf
+
+        Returns:
+            tuple: dict {filename: content hash} of pdf in the folder, and set of filenames deleted since the last refresh
+        """
+        known = {filename: (size, mtime_ns, h) for filename, size, mtime_ns, h in self.db.execute('SELECT * FROM files')}
+        files = {}
+        updated = []
+        with os.scandir(pdf_folder) as it:
+            for entry in it:
+                if not entry.name.endswith('.pdf') or not entry.is_file(): # Ignore non pdf files
+                    continue
+                stat = entry.stat()
+                size, mtime_ns, h = known.get(entry.name, (None, None, None))
+                if (size, mtime_ns) != (stat.st_size, stat.st_mtime_ns):
+                    h = file_hash(entry.path)
+                    updated.append((entry.name, stat.st_size, stat.st_mtime_ns, h))
+                files[entry.name] = h
+
+        deleted = set(known) - set(files)
+        self.db.execute('BEGIN')
+        self.db.executemany('INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)', updated)
+        self.db.executemany('DELETE FROM files WHERE filename = ?', ((filename,) for filename in deleted))
+        self.db.execute('COMMIT')
+        return files, deleted
+
+    def close(self) -> None:
+        self.db.close()
@@ -0,0 +1,304 @@
+import os, json, heapq, tempfile, threading, time
+from html import escape
+
+try:
+    import resource
+except ImportError: # Not available on Windows
+    resource = None
+
+WORKER_STAGES = ('wait', 'open', 'prefilter', 'extract', 'normalize', 'score', 'cache', 'index', 'format', 'send')
+RENDER_STAGES = ('render',)
+N_SLOWEST = 10
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE') if hasattr(os, 'sysconf') else 4096
+
+def current_rss() -> int:
+    """
+    Returns:
+        int: Resident memory of the process in bytes. Peak resident memory when /proc is not available
+    """
+    try:
+        with open('/proc/self/statm', 'rb') as f:
+            return int(f.read().split()[1]) * PAGE_SIZE
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 if resource is not None else 0
+
+def available_memory() -> int:
+    """
+    Returns:
+        int: Memory available to new processes in bytes (MemAvailable of /proc/meminfo). Free memory when /proc is not available, 0 if unknown
+    """
+    try:
+        with open('/proc/meminfo', 'rb') as f:
+            for line in f:
+                if line.startswith(b'MemAvailable:'):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * PAGE_SIZE
+    except (AttributeError, ValueError, OSError):
+        return 0
+
+class StageTimer(object):
+    """
+    Time spent by a worker in each stage of a pdf. Only uses time.perf_counter, cheap enough to stay enabled
+    """
+    __slots__ = ('name', 'stages', 'pages', 'pruned', 'slowest_page', 'peak_rss', 'backends')
+
+    def __init__(self, name: str = "") -> None:
+        """
+        Args:
+            name (str): Name of the timed pdf (or part of pdf)
+        """
+        self.name = name
+        self.stages = dict.fromkeys(WORKER_STAGES, 0.0)
+        self.pages = 0
+        self.pruned = 0
+        self.slowest_page = (0.0, 0) # (seconds, page)
+        self.peak_rss = 0
+        self.backends = {} # {backend name: [pages extracted, seconds, errors, pages handed to the next backend]}, see backends.Extractor
+
+    def lap(self, stage: str, start: float) -> float:
+        """
+        Add the time elapsed since start to a stage
+
+        Args:
+            stage (str): Name of the stage
+            start (float): time.perf_counter() at the beginning of the stage
+
+        Returns:
+            float: time.perf_counter() now, beginning of the next stage
+        """
+        now = time.perf_counter()
+        self.stages[stage] += now - start
+        return now
+
+    def page(self, page: int, seconds: float, pruned: bool = False) -> None:
+        """
+        Args:
+            page (int): Scanned page (starting at 1)
+            seconds (float): Time spent on the page (extraction and scoring)
+            pruned (bool): The page has been skipped by the prefilter
+        """
+        self.pages += 1
+        self.pruned += pruned
+        if seconds > self.slowest_page[0]:
+            self.slowest_page = (seconds, page)
+
+    def memory(self, rss: int) -> None:
+        """
+        Args:
+            rss (int): Resident memory of the worker in bytes, measured while scanning the pdf
+        """
+        if rss > self.peak_rss:
+            self.peak_rss = rss
+
+    def sample(self) -> tuple:
+        """
+        Returns:
+            tuple: (name, pages, pruned, stages, slowest_page, peak_rss, backends), sent to the main process through qlog
+        """
+        return (self.name, self.pages, self.pruned, self.stages, self.slowest_page, self.peak_rss, self.backends)
+
+class Metrics(object):
+    """
+    Aggregate the samples of every worker (received by qlogger) and the render times.
+    Exported as json and as a Prometheus textfile, and summarized in result_file
+    """
+    def __init__(self) -> None:
+        self.lock = threading.Lock() # Samples are added by qlogger while the watcher renders
+        self.start = time.time()
+        self.files = 0
+        self.pages = 0
+        self.pruned = 0
+        self.stages = dict.fromkeys(WORKER_STAGES + RENDER_STAGES, 0.0)
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.slowest_files = [] # Heap of (seconds, name, pages)
+        self.slowest_pages = [] # Heap of (seconds, name, page)
+        self.largest_files = [] # Heap of (peak rss, name, pages)
+        self.recycled = 0
+        self.timeouts = 0
+        self.backends = {} # {backend name: [pages extracted, seconds, errors, pages handed to the next backend]}
+
+    def add(self, sample: tuple) -> None:
+        """
+        Args:
+            sample (tuple): Sample of a worker (see StageTimer.sample)
+        """
+        name, pages, pruned, stages, (page_seconds, page), peak_rss, backends = sample
+        with self.lock:
+            for backend, values in backends.items():
+                total = self.backends.setdefault(backend, [0, 0.0, 0, 0])
+                for i, value in enumerate(values):
+                    total[i] += value
+            self.files += 1
+            self.pages += pages
+            self.pruned += pruned
+            for stage, seconds in stages.items():
+                self.stages[stage] += seconds
+            push = heapq.heappush if len(self.slowest_files) < N_SLOWEST else heapq.heappushpop
+            push(self.slowest_files, (sum(seconds for stage, seconds in stages.items() if stage != 'wait'), name, pages))
+            if pages > 0:
+                push = heapq.heappush if len(self.slowest_pages) < N_SLOWEST else heapq.heappushpop
+                push(self.slowest_pages, (page_seconds, name, page))
+            if peak_rss > 0:
+                push = heapq.heappush if len(self.largest_files) < N_SLOWEST else heapq.heappushpop
+                push(self.largest_files, (peak_rss, name, pages))
+
+    def add_recycled(self) -> None:
+        with self.lock:
+            self.recycled += 1
+
+    def add_timeout(self) -> None:
+        with self.lock:
+            self.timeouts += 1
+
+    def add_stage(self, stage: str, seconds: float) -> None:
+        with self.lock:
+            self.stages[stage] += seconds
+
+    def add_cache(self, hits: int, misses: int) -> None:
+        with self.lock:
+            self.cache_hits += hits
+            self.cache_misses += misses
+
+    def to_dict(self) -> dict:
+        """
+        Returns:
+            dict: Every metric, slowest files and pages first
+        """
+        with self.lock:
+            return {
+                "start": self.start,
+                "elapsed": time.time() - self.start,
+                "files": self.files,
+                "pages": self.pages,
+                "pruned_pages": self.pruned,
+                "stages": dict(self.stages),
+                "cache": {"hits": self.cache_hits, "misses": self.cache_misses},
+                "recycled_workers": self.recycled,
+                "timeouts": self.timeouts,
+                "backends": {backend: {"pages": pages, "seconds": seconds, "pages_per_sec": pages / seconds if seconds > 0 else 0.0,
+                                       "errors": errors, "fallbacks": fallbacks}
+                             for backend, (pages, seconds, errors, fallbacks) in self.backends.items()},
+                "slowest_files": [{"name": name, "seconds": seconds, "pages": pages} for seconds, name, pages in sorted(self.slowest_files, reverse=True)],
+                "slowest_pages": [{"name": name, "seconds": seconds, "page": page} for seconds, name, page in sorted(self.slowest_pages, reverse=True)],
+                "largest_memory_files": [{"name": name, "peak_rss": rss, "pages": pages} for rss, name, pages in sorted(self.largest_files, reverse=True)],
+            }
+
+    def to_prometheus(self) -> str:
+        """
+        Returns:
+            str: Metrics in the Prometheus text format
+        """
+        label = lambda value: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        data = self.to_dict()
+        lines = [
+            "# HELP pdfsearch_files_total Pdf (or parts of pdf) scanned by workers",
+            "# TYPE pdfsearch_files_total counter",
+            f"pdfsearch_files_total {data['files']}",
+            "# HELP pdfsearch_pages_total Pages scanned by workers",
+            "# TYPE pdfsearch_pages_total counter",
+            f"pdfsearch_pages_total {data['pages']}",
+            "# HELP pdfsearch_pruned_pages_total Pages skipped by the prefilter, without text extraction",
+            "# TYPE pdfsearch_pruned_pages_total counter",
+            f"pdfsearch_pruned_pages_total {data['pruned_pages']}",
+            "# HELP pdfsearch_stage_seconds_total Time spent in each stage, summed over workers",
+            "# TYPE pdfsearch_stage_seconds_total counter",
+            *(f'pdfsearch_stage_seconds_total{{stage="{stage}"}} {seconds:.6f}' for stage, seconds in data['stages'].items()),
+            "# HELP pdfsearch_text_cache_total Pages found (hit) or not (miss) in the text cache",
+            "# TYPE pdfsearch_text_cache_total counter",
+            f'pdfsearch_text_cache_total{{result="hit"}} {data["cache"]["hits"]}',
+            f'pdfsearch_text_cache_total{{result="miss"}} {data["cache"]["misses"]}',
+            "# HELP pdfsearch_slowest_file_seconds Scan time of the slowest pdf",
+            "# TYPE pdfsearch_slowest_file_seconds gauge",
+            *(f'pdfsearch_slowest_file_seconds{{name="{label(row["name"])}"}} {row["seconds"]:.6f}' for row in data['slowest_files']),
+            "# HELP pdfsearch_slowest_page_seconds Extraction and scoring time of the slowest pages",
+            "# TYPE pdfsearch_slowest_page_seconds gauge",
+            *(f'pdfsearch_slowest_page_seconds{{name="{label(row["name"])}",page="{row["page"]}"}} {row["seconds"]:.6f}' for row in data['slowest_pages']),
+            "# HELP pdfsearch_backend_pages_total Pages extracted by each text extraction backend",
+            "# TYPE pdfsearch_backend_pages_total counter",
+            *(f'pdfsearch_backend_pages_total{{backend="{backend}"}} {row["pages"]}' for backend, row in data['backends'].items()),
+            "# HELP pdfsearch_backend_seconds_total Time spent in each text extraction backend, including failed pages",
+            "# TYPE pdfsearch_backend_seconds_total counter",
+            *(f'pdfsearch_backend_seconds_total{{backend="{backend}"}} {row["seconds"]:.6f}' for backend, row in data['backends'].items()),
+            "# HELP pdfsearch_backend_fallbacks_total Pages handed to the next backend, after an error or an empty text",
+            "# TYPE pdfsearch_backend_fallbacks_total counter",
+            *(f'pdfsearch_backend_fallbacks_total{{backend="{backend}",reason="error"}} {row["errors"]}' for backend, row in data['backends'].items()),
+            *(f'pdfsearch_backend_fallbacks_total{{backend="{backend}",reason="empty"}} {row["fallbacks"]}' for backend, row in data['backends'].items()),
+            "# HELP pdfsearch_recycled_workers_total Workers replaced after max_tasks_per_worker tasks or above max_worker_memory",
+            "# TYPE pdfsearch_recycled_workers_total counter",
+            f"pdfsearch_recycled_workers_total {data['recycled_workers']}",
+            "# HELP pdfsearch_timeouts_total Workers killed by the watchdog after page_timeout or file_timeout",
+            "# TYPE pdfsearch_timeouts_total counter",
+            f"pdfsearch_timeouts_total {data['timeouts']}",
+            "# HELP pdfsearch_file_peak_rss_bytes Resident memory of the worker while scanning the pdf using the most memory",
+            "# TYPE pdfsearch_file_peak_rss_bytes gauge",
+            *(f'pdfsearch_file_peak_rss_bytes{{name="{label(row["name"])}"}} {row["peak_rss"]}' for row in data['largest_memory_files']),
+            "# HELP pdfsearch_start_time_seconds Start time of the run",
+            "# TYPE pdfsearch_start_time_seconds gauge",
+            f"pdfsearch_start_time_seconds {data['start']:.0f}",
+        ]
+        return '\n'.join(lines) + '\n'
+
+    def write(self, folder: str) -> None:
+        """
+        Write metrics.json and metrics.prom. Files are replaced atomically, as expected by the textfile collector
+
+        Args:
+            folder (str): Destination folder (data_folder)
+        """
+        for filename, content in (('metrics.json', json.dumps(self.to_dict(), indent=2)), ('metrics.prom', self.to_prometheus())):
+            with tempfile.NamedTemporaryFile('w', dir=folder, prefix='.metrics-', delete=False) as f:
+                f.write(content)
+            os.chmod(f.name, 0o644)
+            os.replace(f.name, os.path.join(folder, filename))
+
+    def summary(self) -> str:
+        """
+        Returns:
+            str: Share of each stage in the total time, for the log
+        """
+        data = self.to_dict()
+        total = sum(data['stages'].values()) or 1
+        return ', '.join(f"{stage} {seconds / total:.0%}" for stage, seconds in data['stages'].items() if seconds > 0)
+
+    def backends_summary(self) -> str:
+        """
+        Returns:
+            str: Pages extracted by each backend and its throughput, for the log
+        """
+        backends = self.to_dict()['backends']
+        if not backends:
+            return "no page extracted"
+        return ', '.join(f"{backend} {row['pages']} pages ({row['pages_per_sec']:.0f} pages/s)" for backend, row in backends.items())
+
+    def to_html(self) -> str:
+        """
+        Returns:
+            str: Html tables of stage times and of slowest files and pages, for result_file
+        """
+        data = self.to_dict()
+        total = sum(data['stages'].values()) or 1
+        html = ['<table class="dataframe">\n  <thead>\n    <tr><th>Stage</th><th>Time (s)</th><th>Share</th><th>ms/page</th></tr>\n  </thead>\n  <tbody>\n']
+        for stage, seconds in data['stages'].items():
+            html.append(f'    <tr><td>{stage}</td><td>{seconds:.2f}</td><td>{seconds / total:.0%}</td><td>{1000 * seconds / max(1, data["pages"]):.1f}</td></tr>\n')
+        html.append('  </tbody>\n</table>\n')
+        html.append('<table class="dataframe">\n  <thead>\n    <tr><th>Backend</th><th>Pages</th><th>Pages/s</th><th>Errors</th><th>Fallbacks</th></tr>\n  </thead>\n  <tbody>\n')
+        for backend, row in data['backends'].items():
+            html.append(f'    <tr><td>{backend}</td><td>{row["pages"]}</td><td>{row["pages_per_sec"]:.1f}</td><td>{row["errors"]}</td><td>{row["fallbacks"]}</td></tr>\n')
+        html.append('  </tbody>\n</table>\n')
+        html.append('<table class="dataframe">\n  <thead>\n    <tr><th>Slowest pdf</th><th>Time (s)</th><th>Pages</th></tr>\n  </thead>\n  <tbody>\n')
+        for row in data['slowest_files']:
+            html.append(f'    <tr><td>{escape(row["name"])}</td><td>{row["seconds"]:.2f}</td><td>{row["pages"]}</td></tr>\n')
+        html.append('  </tbody>\n</table>\n')
+        html.append('<table class="dataframe">\n  <thead>\n    <tr><th>Slowest page</th><th>Page</th><th>Time (s)</th></tr>\n  </thead>\n  <tbody>\n')
+        for row in data['slowest_pages']:
+            html.append(f'    <tr><td>{escape(row["name"])}</td><td>{row["page"]}</td><td>{row["seconds"]:.3f}</td></tr>\n')
+        html.append('  </tbody>\n</table>\n')
+        html.append('<table class="dataframe">\n  <thead>\n    <tr><th>Largest memory</th><th>Peak RSS (Mo)</th><th>Pages</th></tr>\n  </thead>\n  <tbody>\n')
+        for row in data['largest_memory_files']:
+            html.append(f'    <tr><td>{escape(row["name"])}</td><td>{row["peak_rss"] / 1024**2:.0f}</td><td>{row["pages"]}</td></tr>\n')
+        html.append('  </tbody>\n</table>')
+        return ''.join(html)
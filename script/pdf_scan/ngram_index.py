@@ -0,0 +1,219 @@
+import os, sqlite3, zlib
+import numpy as np
+import pandas as pd
+
+N = 3 # Length of the indexed n-grams
+POSTING_SIZE = 16 # Bytes of a posting without its pages (gram, chunk id), counted in the size of a chunk
+
+def ngrams(text: str) -> np.ndarray:
+    """
+    Args:
+        text (str): Normalized text
+
+    Returns:
+        np.ndarray: Sorted distinct n-grams of the text, each packed in an integer (21 bits by code point)
+    """
+    codes = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32).astype(np.int64)
+    if len(codes) < N:
+        return np.empty(0, dtype=np.int64)
+    return np.unique((codes[:-2] << 42) | (codes[1:-1] << 21) | codes[2:])
+
+class NgramIndex(object):
+    """
+    On-disk inverted index of the n-grams of the normalized text of every scanned page, stored in SQLite (WAL mode).
+    Pages are indexed by chunk (a pdf, or a part of a split pdf) of a pdf content hash, so pdf with the same content
+    share their entries. A search only counts keywords in the pages containing every n-gram of the keyword.
+    Oldest chunks are removed when the index is larger than max_size: their pdf are not found by a search anymore.
+    """
+    def __init__(self, folder: str, max_size: int = 0) -> None:
+        """
+        Args:
+            folder (str): Folder of the index (created if needed)
+            max_size (int): Maximum size of the pages and postings in bytes. 0 for no limit (search)
+        """
+        os.makedirs(folder, exist_ok=True)
+        self.max_size = max_size
+        self.db = sqlite3.connect(os.path.join(folder, 'ngram_index.sqlite'), timeout=60, isolation_level=None, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS files (filename TEXT PRIMARY KEY, doc_hash TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS chunks (chunk_id INTEGER PRIMARY KEY, doc_hash TEXT NOT NULL, first_page INTEGER NOT NULL, last_page INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS pages (chunk_id INTEGER, page INTEGER, data BLOB NOT NULL, PRIMARY KEY (chunk_id, page)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS postings (gram INTEGER, chunk_id INTEGER, pages BLOB NOT NULL, PRIMARY KEY (gram, chunk_id)) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS files_doc_hash ON files (doc_hash);
+            CREATE INDEX IF NOT EXISTS chunks_doc_hash ON chunks (doc_hash);
+            CREATE INDEX IF NOT EXISTS postings_chunk_id ON postings (chunk_id);
+        """)
+        if 'size' not in [column for _, column, *_ in self.db.execute('PRAGMA table_info(chunks)')]: # Index of an older version
+            self.db.execute('ALTER TABLE chunks ADD COLUMN size INTEGER NOT NULL DEFAULT 0')
+
+    def put(self, filename: str, doc_hash: str, first_page: int, last_page: int, texts: dict) -> None:
+        """
+        Index the pages of a scanned chunk. Nothing is done if the chunk is already indexed
+
+        Args:
+            filename (str): Name of the pdf
+            doc_hash (str): Hash of the pdf content
+            first_page (int): Index of the first page of the chunk
+            last_page (int): Index after the last page of the chunk
+            texts (dict): {page index: normalized text} of the chunk
+        """
+        grams = [ngrams(text) for text in texts.values()]
+        pages = np.repeat(np.fromiter(texts, dtype=np.uint32, count=len(texts)), [len(g) for g in grams])
+        grams = np.concatenate(grams) if grams else np.empty(0, dtype=np.int64)
+        order = np.argsort(grams, kind='stable') # Pages of each n-gram stay in increasing order
+        grams, pages = grams[order], pages[order]
+        bounds = np.flatnonzero(np.diff(grams)) + 1
+        postings = list(zip(grams[np.r_[0, bounds]].tolist() if len(grams) else [], np.split(pages, bounds)))
+        data = {k: zlib.compress(text.encode('utf-8', 'surrogatepass')) for k, text in texts.items()}
+        size = sum(map(len, data.values())) + sum(POSTING_SIZE + pages.nbytes for _, pages in postings)
+
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            self._link(filename, doc_hash)
+            overlapping = self.db.execute('SELECT chunk_id, first_page, last_page FROM chunks WHERE doc_hash = ? AND first_page < ? AND last_page > ?',
+                                          (doc_hash, last_page, first_page)).fetchall()
+            if any(chunk[1:] == (first_page, last_page) for chunk in overlapping):
+                self.db.execute('COMMIT')
+                return
+            self._delete_chunks([chunk_id for chunk_id, _, _ in overlapping]) # Indexed with other page ranges
+            chunk_id = self.db.execute('INSERT INTO chunks (doc_hash, first_page, last_page, size) VALUES (?, ?, ?, ?)',
+                                       (doc_hash, first_page, last_page, size)).lastrowid
+            self.db.executemany('INSERT INTO pages VALUES (?, ?, ?)', ((chunk_id, k, blob) for k, blob in data.items()))
+            self.db.executemany('INSERT INTO postings VALUES (?, ?, ?)', ((gram, chunk_id, pages.tobytes()) for gram, pages in postings))
+            self._evict()
+            self.db.execute('COMMIT')
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+
+    def link(self, filename: str, doc_hash: str) -> None:
+        """
+        Give a pdf the pages already indexed for the same content (pdf identical to a scanned one)
+
+        Args:
+            filename (str): Name of the pdf
+            doc_hash (str): Hash of the pdf content
+        """
+        self.db.execute('BEGIN IMMEDIATE')
+        self._link(filename, doc_hash)
+        self.db.execute('COMMIT')
+
+    def delete(self, filenames: set) -> None:
+        """
+        Args:
+            filenames (set): Names of pdf to remove. Their pages are removed when no other pdf has the same content
+        """
+        self.db.execute('BEGIN IMMEDIATE')
+        for filename in filenames:
+            self._unlink(filename)
+        self.db.execute('COMMIT')
+
+    def _link(self, filename: str, doc_hash: str) -> None:
+        """
+        Must be called inside a transaction
+        """
+        row = self.db.execute('SELECT doc_hash FROM files WHERE filename = ?', (filename,)).fetchone()
+        if row is not None and row[0] == doc_hash:
+            return
+        self._unlink(filename)
+        self.db.execute('INSERT INTO files VALUES (?, ?)', (filename, doc_hash))
+
+    def _unlink(self, filename: str) -> None:
+        """
+        Must be called inside a transaction
+        """
+        row = self.db.execute('SELECT doc_hash FROM files WHERE filename = ?', (filename,)).fetchone()
+        if row is None:
+            return
+        self.db.execute('DELETE FROM files WHERE filename = ?', (filename,))
+        if self.db.execute('SELECT 1 FROM files WHERE doc_hash = ?', row).fetchone() is None: # Content of no other pdf
+            self._delete_chunks([chunk_id for chunk_id, in self.db.execute('SELECT chunk_id FROM chunks WHERE doc_hash = ?', row)])
+
+    def _evict(self) -> None:
+        """
+        Remove the oldest chunks until the index is under 90% of max_size. Must be called inside a transaction
+        """
+        if self.max_size <= 0:
+            return
+        size = self.db.execute('SELECT COALESCE(SUM(size), 0) FROM chunks').fetchone()[0]
+        if size <= self.max_size:
+            return
+        to_free = size - int(self.max_size * 0.9)
+        evicted = []
+        for chunk_id, chunk_size in self.db.execute('SELECT chunk_id, size FROM chunks ORDER BY chunk_id'):
+            evicted.append(chunk_id)
+            to_free -= chunk_size
+            if to_free <= 0:
+                break
+        self._delete_chunks(evicted)
+
+    def _delete_chunks(self, chunk_ids: list) -> None:
+        """
+        Must be called inside a transaction
+        """
+        for table in ('postings', 'pages', 'chunks'):
+            self.db.executemany(f'DELETE FROM {table} WHERE chunk_id = ?', ((chunk_id,) for chunk_id in chunk_ids))
+
+    def texts(self, doc_hash: str) -> dict:
+        """
+        Args:
+            doc_hash (str): Hash of the pdf content
+
+        Returns:
+            dict: {page index: normalized text} of the indexed pages of the pdf
+        """
+        rows = self.db.execute('SELECT page, data FROM pages JOIN chunks ON chunks.chunk_id = pages.chunk_id WHERE doc_hash = ?', (doc_hash,))
+        return {k: zlib.decompress(data).decode('utf-8', 'surrogatepass') for k, data in rows}
+
+    def candidates(self, word: str) -> dict | None:
+        """
+        Args:
+            word (str): Normalized keyword
+
+        Returns:
+            dict | None: {chunk_id: set of page indexes} of pages containing every n-gram of word. None if word is shorter than N (every page)
+        """
+        grams = ngrams(word).tolist()
+        if not grams:
+            return None
+        found = {}
+        for chunk_id, pages in self.db.execute(f'SELECT chunk_id, pages FROM postings WHERE gram IN ({", ".join("?" * len(grams))})', grams):
+            found.setdefault(chunk_id, []).append(np.frombuffer(pages, dtype=np.uint32))
+        return {chunk_id: set.intersection(*(set(pages.tolist()) for pages in lists)) for chunk_id, lists in found.items() if len(lists) == len(grams)}
+
+    def search(self, words: list) -> pd.DataFrame:
+        """
+        Count keywords in every indexed page, like a scan would (non overlapping occurrences in the normalized text)
+
+        Args:
+            words (list): Normalized keywords (see KeywordMatcher.normalize)
+
+        Returns:
+            pd.DataFrame: Filename, Page (starting at 1) and the number of occurrences of each word, for pages containing at least one word
+        """
+        candidates = {}
+        for word in words:
+            pages = self.candidates(word)
+            if pages is None:
+                pages = {}
+                for chunk_id, k in self.db.execute('SELECT chunk_id, page FROM pages'):
+                    pages.setdefault(chunk_id, set()).add(k)
+            for chunk_id, ks in pages.items():
+                candidates.setdefault(chunk_id, set()).update(ks)
+
+        rows = []
+        for chunk_id, ks in candidates.items():
+            filenames = [filename for filename, in self.db.execute(
+                'SELECT filename FROM files JOIN chunks ON chunks.doc_hash = files.doc_hash WHERE chunk_id = ?', (chunk_id,))]
+            for k in sorted(ks):
+                data = self.db.execute('SELECT data FROM pages WHERE chunk_id = ? AND page = ?', (chunk_id, k)).fetchone()[0]
+                text = zlib.decompress(data).decode('utf-8', 'surrogatepass')
+                counts = [text.count(word) for word in words]
+                if any(counts):
+                    rows.extend((filename, k + 1, *counts) for filename in filenames)
+        return pd.DataFrame(rows, columns=['Filename', 'Page', *words]).sort_values(['Filename', 'Page'], ignore_index=True)
+
+    def close(self) -> None:
+        self.db.close()
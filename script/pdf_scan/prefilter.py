@@ -0,0 +1,137 @@
+"""
+Raw text of a page read directly from its content stream, without the layout work of extract_text.
+Only trusted when the page uses simple fonts (standard encodings, no ToUnicode) and literal strings:
+the text is then the same as extract_text once normalized, since both read strings in content stream order.
+"""
+import re
+from pypdf.generic import ArrayObject
+
+STANDARD_14 = {'/Helvetica', '/Helvetica-Bold', '/Helvetica-Oblique', '/Helvetica-BoldOblique',
+               '/Times-Roman', '/Times-Bold', '/Times-Italic', '/Times-BoldItalic',
+               '/Courier', '/Courier-Bold', '/Courier-Oblique', '/Courier-BoldOblique'}
+
+def byte_map(encoding: str) -> dict:
+    """
+    Returns:
+        dict: {byte: character} for bytes decoded differently from latin-1, for str.translate
+    """
+    table = {}
+    for i in range(256):
+        try:
+            char = bytes((i,)).decode(encoding)
+        except UnicodeDecodeError: # Undefined in the encoding: kept as latin-1, like pypdf
+            continue
+        if char != chr(i):
+            table[i] = char
+    return table
+
+# {encoding: (translate table, highest trusted byte)}
+ENCODINGS = {
+    '/WinAnsiEncoding': (byte_map('cp1252'), 255),
+    '/MacRomanEncoding': (byte_map('mac_roman'), 255),
+    '/StandardEncoding': ({0x27: '\u2019', 0x60: '\u2018'}, 127), # Upper half differs from latin-1: not trusted
+}
+
+TOKENS = re.compile(rb"""
+      (?P<string>\((?:[^()\\]|\\.)*\))               # Literal string without nested parentheses
+    | /(?P<font>[^\s/\[\]()<>{}%]+)\s+\S+\s+Tf       # Font selection
+    | (?P<dict><<|>>)                                # Dictionary delimiters: strings of dictionaries are not shown (/ActualText...)
+    | %[^\r\n]*                                      # Comment
+    | (?P<untrusted>[<()]|(?<!\S)BI(?!\S))           # Hex string, nested parentheses, inline image
+""", re.S | re.X)
+ESCAPE = re.compile(rb'\\([0-7]{1,3}|\r\n|[\s\S])')
+ESCAPES = {b'n': b'\n', b'r': b'\r', b't': b'\t', b'b': b'\b', b'f': b'\f', b'\r\n': b'', b'\n': b'', b'\r': b''}
+
+def unescape(match: re.Match) -> bytes:
+    value = match.group(1)
+    if value[:1] in b'01234567':
+        return bytes((int(value, 8) & 0xff,))
+    return ESCAPES.get(value, value)
+
+def font_encoding(font) -> tuple | None:
+    """
+    Args:
+        font (pypdf.generic.DictionaryObject): Font of the page resources
+
+    Returns:
+        tuple | None: (translate table, highest trusted byte) of the font, None if its text can not be decoded without pypdf
+    """
+    font = font.get_object()
+    if '/ToUnicode' in font or font.get('/Subtype') not in ('/Type1', '/MMType1', '/TrueType'):
+        return None
+    encoding = font.get('/Encoding')
+    if encoding is None: # Built-in encoding, only known for non symbolic standard fonts
+        return ENCODINGS['/StandardEncoding'] if font.get('/Subtype') == '/Type1' and font.get('/BaseFont') in STANDARD_14 else None
+    return ENCODINGS.get(encoding) if isinstance(encoding, str) else None # Dictionaries with /Differences are not trusted
+
+def raw_text(page) -> str | None:
+    """
+    Args:
+        page (pypdf.PageObject): Page of the pdf
+
+    Returns:
+        str | None: Strings shown by the page, in content stream order. None if the page can not be trusted
+    """
+    resources = page.get('/Resources')
+    resources = resources.get_object() if resources is not None else {}
+    xobjects = resources.get('/XObject')
+    if xobjects is not None and any(xobject.get_object().get('/Subtype') == '/Form' for xobject in xobjects.get_object().values()):
+        return None # Text of forms is drawn by the Do operator
+    fonts = resources.get('/Font')
+    fonts = fonts.get_object() if fonts is not None else {}
+
+    contents = page.get('/Contents')
+    if contents is None:
+        return ''
+    contents = contents.get_object()
+    if isinstance(contents, ArrayObject):
+        data = b'\n'.join(content.get_object().get_data() for content in contents)
+    else:
+        data = contents.get_data()
+
+    encodings = {}
+    encoding = None
+    text = []
+    strings = [] # Strings shown with the current font, decoded together
+    depth = 0 # Nesting of dictionaries (marked-content properties, inline image parameters)
+    for match in TOKENS.finditer(data):
+        if match.group('dict') is not None:
+            depth = max(0, depth + (1 if match.group('dict') == b'<<' else -1))
+        elif match.group('string') is not None:
+            if depth > 0:
+                continue
+            if encoding is None:
+                return None
+            strings.append(ESCAPE.sub(unescape, match.group('string')[1:-1]))
+        elif match.group('font') is not None:
+            text.append(decode(strings, encoding))
+            strings = []
+            name = '/' + match.group('font').decode('latin-1')
+            if name not in encodings:
+                encodings[name] = font_encoding(fonts[name]) if name in fonts else None
+            encoding = encodings[name]
+        elif match.group('untrusted') is not None:
+            if depth > 0 and match.group('untrusted') == b'<': # Hex string of a dictionary
+                continue
+            return None
+    text.append(decode(strings, encoding))
+    if None in text:
+        return None
+    return ''.join(text)
+
+def decode(strings: list, encoding: tuple | None) -> str | None:
+    """
+    Args:
+        strings (list): Unescaped bytes of literal strings shown with the same font
+        encoding (tuple): Encoding of the font (see font_encoding)
+
+    Returns:
+        str | None: Decoded text, None if a byte can not be trusted
+    """
+    if not strings:
+        return ''
+    data = b''.join(strings)
+    table, highest = encoding
+    if highest < 255 and max(data, default=0) > highest:
+        return None
+    return data.decode('latin-1').translate(table)
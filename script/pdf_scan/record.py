@@ -0,0 +1,135 @@
+from array import array
+import pandas as pd
+
+from .result_store import COLUMNS
+
+def best_first(pages, scores) -> list:
+    """
+    Args:
+        pages (Iterable): Detected pages
+        scores (Iterable): Score of each page
+
+    Returns:
+        list: [page, score] of each page, best scores first (Pages column of result_store.COLUMNS)
+    """
+    return [[page, score] for page, score in sorted(zip(pages, scores), key=lambda x: x[1], reverse=True)]
+
+class ScanRecord(object):
+    """
+    Compact result of a scanned pdf (or of a part of a large pdf) sent by workers to the renderer.
+    Detected pages are kept in arrays, html is only generated by the report.
+    """
+    __slots__ = ('path', 'filename', 'abs_path', 'url', 'timestamp', 'hash', 'n_pages', 'pages', 'scores', 'part', 'n_parts', 'timed_out', 'counted', 'exact', 'counts', 'words', 'profiles', 'partial')
+
+    def __init__(self, path: str, filename: str, abs_path: str, url: str, timestamp, hash: str, n_pages: int,
+                 pages: array = None, scores: array = None, part: int = 0, n_parts: int = 1, timed_out: array = None,
+                 counted: array = None, exact: bytes = b'', counts: bytes = b'', words: tuple = (), profiles: list = None, partial: int = 0) -> None:
+        """
+        Args:
+            path (str): Path of the pdf, as put in the queue
+            filename (str): Name of the pdf
+            abs_path (str): Absolute path of the pdf, used for links to pages
+            url (str): Url of the pdf, empty if unknown
+            timestamp (datetime): Time the pdf has been added to the queue
+            hash (str): Hash of the pdf content
+            n_pages (int): Number of pages of the pdf
+            pages (array): Detected pages (starting at 1)
+            scores (array): Score of each detected page
+            part (int): Index of the part for large pdf split in page ranges
+            n_parts (int): Number of parts, 1 if the pdf is not split
+            timed_out (array): Pages not scanned because of page_timeout or file_timeout (starting at 1).
+                0 when the scan timed out before the pages of the pdf were counted
+            counted (array): Pages whose keyword counts are in counts (starting at 1), empty when Option.count_matrix is disabled
+            exact (bytes): 1 for each counted page whose text has been extracted, 0 when counts come from the content stream (pruned page)
+            counts (bytes): Keyword counts of each counted page (uint16 matrix, one row by page, one column by word of words)
+            words (tuple): Keywords counted by the worker
+            profiles (list): (pages, scores) arrays of the pages detected for each profile of Option.profiles
+            partial (int): Number of pages scanned when the scan stopped early (see Option.max_hits and Option.max_pages), 0 if every page has been scanned
+        """
+        self.path = path
+        self.filename = filename
+        self.abs_path = abs_path
+        self.url = url
+        self.timestamp = timestamp
+        self.hash = hash
+        self.n_pages = n_pages
+        self.pages = pages if pages is not None else array('I')
+        self.scores = scores if scores is not None else array('q')
+        self.part = part
+        self.n_parts = n_parts
+        self.timed_out = timed_out if timed_out is not None else array('I')
+        self.counted = counted if counted is not None else array('I')
+        self.exact = exact
+        self.counts = counts
+        self.words = words
+        self.profiles = profiles if profiles is not None else []
+        self.partial = partial
+
+    def __getstate__(self) -> tuple:
+        return tuple(getattr(self, name) for name in ScanRecord.__slots__)
+
+    def __setstate__(self, state: tuple) -> None:
+        self.profiles, self.partial = [], 0 # Records journaled by older versions
+        for name, value in zip(ScanRecord.__slots__, state):
+            setattr(self, name, value)
+
+    @property
+    def key(self) -> tuple:
+        """
+        Key shared by every part of the same scan
+        """
+        return (self.path, self.timestamp)
+
+    @classmethod
+    def merge(cls, parts: list) -> 'ScanRecord':
+        """
+        Args:
+            parts (list): Every part of a split pdf
+
+        Returns:
+            ScanRecord: Record of the whole pdf
+        """
+        first = parts[0]
+        merged = cls(first.path, first.filename, first.abs_path, first.url, first.timestamp, first.hash, max(part.n_pages for part in parts),
+                     words=first.words, profiles=[(array('I'), array('q')) for _ in first.profiles], partial=sum(part.partial for part in parts))
+        for part in sorted(parts, key=lambda part: part.part):
+            merged.pages.extend(part.pages)
+            merged.scores.extend(part.scores)
+            merged.timed_out.extend(part.timed_out)
+            for (pages, scores), (part_pages, part_scores) in zip(merged.profiles, part.profiles):
+                pages.extend(part_pages)
+                scores.extend(part_scores)
+        return merged
+
+    def profile(self, index: int) -> 'ScanRecord':
+        """
+        Args:
+            index (int): Index of the profile in Option.profiles
+
+        Returns:
+            ScanRecord: Record with the pages detected for the profile
+        """
+        pages, scores = self.profiles[index]
+        return ScanRecord(self.path, self.filename, self.abs_path, self.url, self.timestamp, self.hash, self.n_pages, pages, scores,
+                          self.part, self.n_parts, self.timed_out, words=self.words, partial=self.partial)
+
+def records_to_dataframe(records: list) -> pd.DataFrame:
+    """
+    Args:
+        records (list): List of ScanRecord of whole pdf
+
+    Returns:
+        pd.DataFrame: Results with result_store.COLUMNS columns
+    """
+    return pd.DataFrame([(
+        record.filename,
+        record.url,
+        record.n_pages,
+        len(record.pages),
+        best_first(record.pages, record.scores),
+        sorted(set(record.timed_out)),
+        record.partial,
+        True,
+        record.timestamp,
+        record.hash
+    ) for record in records], columns=COLUMNS)
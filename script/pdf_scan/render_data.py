@@ -1,82 +1,305 @@
-import multiprocessing, time, os
+import queue, time, os, json, tempfile
 import pandas as pd
 from datetime import datetime
-from ipywidgets import Label
-
-def render_data(option, qresult: multiprocessing.SimpleQueue, start_time: datetime, old_data: pd.DataFrame, render_date_label: Label = None, row_result: list = []) -> list:
-    with open('script/html/base.html', 'r') as f:
-        final_html = f.read()
-
-    # Get all data
-    if option.watch_import:
-        # Block function for the first result. Use when watching mode is enabled.
-        # Usefull to have not infinit loop when qresult is empty
-        new = qresult.get()
-        render_date_label.value = "Last render: in progress..."
-        if new is not None: # None can be used to force render when watching mode is enabled
-            row_result.append(new)
-        time.sleep(5) # Wait for the next result, use to not render every time # TODO: Create option for this
-
-    render_date_label.value = "Last render: in progress..."
-    while not qresult.empty():
-        new = qresult.get()
-        if new is not None: # None can be used to force render when watching mode is enabled
-            row_result.append(new)
-
-    if len(row_result) != 0 and len(old_data) != 0:
-        result_data = pd.concat(row_result, ignore_index=True)
-        result_data = pd.concat([result_data, old_data], ignore_index=True)
-
-    elif len(row_result) != 0:
-        result_data = pd.concat(row_result, ignore_index=True)
-    
-    else:
-        result_data = old_data
-
-    result_data.to_csv(option.data_folder + 'save.csv', index=False)
-
-    # Format results
-
-    # result_data['Url'] = result_data.apply(
-    #     lambda x: '<a class="filename" href="{url}" target="_blank">{filename}</a>'.format(
-    #         url=x['Url'],
-    #         filename=x['Filename']
-    #         ),
-    #     axis=1
-    # )
-    result_data = result_data.astype({'N': int})
-    result_data.sort_values(by=['Timestamp'], ascending=False, inplace=True)
-    result_data.reset_index(drop=True, inplace=True)
-    result_data.drop_duplicates(subset=['Filename'], keep='first', inplace=True)
-    result_data.sort_values(by=['N'], ascending=False, inplace=True)
-    result_data.sort_values(by=option.sort_data, ascending=(option.sort_data=='Filename'), inplace=True)
-    result_data.drop(columns=['Filename', 'Timestamp'], inplace=True)
-    result_data.rename(columns={'Url': 'Filename'}, inplace=True)
-
-    # Convert to html
-    html_result = result_data.to_html(index=False, escape=False, classes="full-width")
-
-    if option.watch_import:
-        time_by_scan = ''
-    else:
-        time_by_scan = f" ({str((datetime.now() - start_time)/max(1, len(result_data) - len(old_data))).split('.')[0]}/scan)"
-    replace_key = [
-        ("table", html_result),
-        ("keywords", option.keywords.to_html(index=False, escape=False)),
-        ("n_pdf", f"{len(result_data)} (Scan: {len(result_data) - len(old_data)}, Skip: {len(old_data)})"),
-        ("total_pages", f"{result_data['Nb pages'].sum()} (Scan: {result_data[result_data['N'] == 1]['Nb pages'].sum()}, Skip: {result_data[result_data['N'] == 0]['Nb pages'].sum()})"),
-        ("detected_pages", f"{result_data['Nb detected'].sum()} (Scan: {result_data[result_data['N'] == 1]['Nb detected'].sum()}, Skip: {result_data[result_data['N'] == 0]['Nb detected'].sum()})"),
-        ("threshold", option.threshold),
-        ("thread", f"{option.n_workers} (cpu: {os.cpu_count()})"),
-        ("time", str(datetime.now() - start_time).split(".")[0]),
-        ("time_by_scan", time_by_scan),
-        ("render_timestamp", datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
-    ]
-    for key, value in replace_key:
-        final_html = final_html.replace("{{"+ key +"}}", str(value))
-    
-    with open('result.html', 'w') as f:
-        f.write(final_html)
-    
-    render_date_label.value = f"Last render: {datetime.now().strftime('%H:%M:%S')}"
-    return row_result # Only usefull when watching mode is enabled
+
+from .result_store import ResultStore
+from .record import ScanRecord, records_to_dataframe
+from .metrics import Metrics
+from .count_matrix import CountMatrix
+from .ngram_index import NgramIndex
+
+HTML_FOLDER = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'html')
+COLUMNS = ['filename', 'url', 'n_pages', 'n_detected', 'new', 'timestamp', 'path', 'pages', 'timed_out', 'partial'] # Columns of a row of the data file
+RESCORE = 'rescore' # Put in the result queue when keyword_file has been reloaded, results are scored again
+STOP = 'stop' # Put in the result queue once the workers have stopped, after their last results: the watcher renders them and stops
+
+def data_file(result_file: str) -> str:
+    """
+    Args:
+        result_file (str): Path of result_file
+
+    Returns:
+        str: Path of the data file of result_file, loaded by its page
+    """
+    return os.path.splitext(result_file)[0] + '.data.js'
+
+def write_file(path: str, content: str) -> None:
+    """
+    Write in a temporary file then replace path, a browser never reads a half-written file
+    """
+    with tempfile.NamedTemporaryFile('w', dir=os.path.dirname(os.path.abspath(path)), prefix='.result-', delete=False) as f:
+        f.write(content)
+    os.chmod(f.name, 0o644)
+    os.replace(f.name, path)
+
+def json_row(filename: str, url: str, n_pages: int, n_detected: int, pages: list | str, timed_out: list, partial: int, n: bool,
+             timestamp: pd.Timestamp, path: str) -> str:
+    """
+    Args:
+        filename (str): Name of the pdf
+        url (str): Url of the pdf, empty if unknown
+        n_pages (int): Number of pages
+        n_detected (int): Number of detected pages
+        pages (list|str): [page, score] of detected pages, best scores first. Html of results older than links
+        timed_out (list): Pages whose scan timed out, 0 when the whole pdf timed out
+        partial (int): Number of pages scanned by a partial scan, 0 for a full scan
+        n (bool): Scanned during this run
+        timestamp (pd.Timestamp): Time the pdf has been added to the queue
+        path (str): Absolute path of the pdf, for the links to detected pages. Empty without detected pages
+
+    Returns:
+        str: Json list with COLUMNS values, the html of detected pages is built by the page (html/report.js)
+    """
+    row = [filename, url, n_pages, n_detected, n, timestamp.value // 10**6, path, pages, timed_out, partial]
+    return json.dumps(row, ensure_ascii=False, separators=(',', ':')).replace('</', '<\\/') # Data file is loaded as a script
+
+class Renderer(object):
+    """
+    Render result_file from the result store. Rows are written as json in a data file next to result_file (see data_file),
+    the page sorts, filters and paginates them in the browser and only creates the rows on screen (html/report.js).
+    The template is read once and the json of each row is kept between renders, so a render only formats the rows received since the previous one.
+    Each keyword profile (see Option.profiles) is rendered in its own result_file by a child Renderer.
+    """
+    def __init__(self, option, start_time: datetime, store: ResultStore, render_date_label = None, metrics: Metrics = None, profile: str = '') -> None:
+        """
+        Args:
+            option (Option): Option object
+            start_time (datetime): Start time of the script
+            store (ResultStore): Saved results
+            render_date_label (ipywidgets.Label): Label of the widget showing the last render date. None without widgets
+            metrics (Metrics): Metrics of the run, summarized in result_file and written in data_folder. None to disable them
+            profile (str): Keyword profile rendered (option is then Option.profile), empty for keyword_file
+        """
+        self.option = option
+        self.start_time = start_time
+        self.store = store
+        self.render_date_label = render_date_label
+        self.metrics = metrics
+        self.profile = profile
+
+        with open(os.path.join(HTML_FOLDER, 'base.html'), 'r') as f:
+            self.template = f.read()
+
+        self.rows = {} # {filename: (timestamp, nb pages, nb detected, new, json of the row)}
+        self.parts = {} # {(path, timestamp): {part: ScanRecord}} of large pdf split by workers
+        self.add_rows(store.to_dataframe(profile))
+        self.matrix = CountMatrix(os.path.join(option.data_folder, 'counts')) if option.count_matrix and not profile else None
+        self.keywords_changed = False # RESCORE received
+        self.stopped = False # STOP received
+        self.rescan = set() # Filenames which must be scanned again after a rescore, taken by the caller
+        self.profiles = [Renderer(option.profile(name), start_time, store, None, metrics, name) for name in option.profiles]
+        for renderer in self.profiles: # Counts of every profile are in the same matrix
+            renderer.matrix = self.matrix
+
+    def set_label(self, value: str) -> None:
+        if self.render_date_label is not None:
+            self.render_date_label.value = value
+
+    def add_rows(self, data: pd.DataFrame) -> None:
+        """
+        Format rows and keep them for the next renders
+
+        Args:
+            data (pd.DataFrame): Results with result_store.COLUMNS columns
+        """
+        for filename, url, n_pages, n_detected, pages, timed_out, partial, n, timestamp, _ in data.itertuples(index=False):
+            timestamp = pd.Timestamp(timestamp)
+            path = os.path.abspath(os.path.join(self.option.pdf_folder, filename)) if pages else ''
+            self.rows[filename] = (timestamp, int(n_pages), int(n_detected), bool(n),
+                                   json_row(filename, url, int(n_pages), int(n_detected), pages, timed_out, int(partial), bool(n), timestamp, path))
+
+    def merge_part(self, record: ScanRecord) -> ScanRecord | None:
+        """
+        Keep a part of a large pdf until every part has been scanned. A part received twice (scanned again after its worker was killed) is kept once
+
+        Args:
+            record (ScanRecord): Scanned part
+
+        Returns:
+            ScanRecord | None: Record of the whole pdf once the last part is received, None otherwise
+        """
+        parts = self.parts.setdefault(record.key, {})
+        parts[record.part] = record
+        if len(parts) < record.n_parts:
+            return None
+        del self.parts[record.key]
+        return ScanRecord.merge(list(parts.values()))
+
+    def collect(self, qresult: queue.Queue) -> list:
+        """
+        Get results from workers. In watching mode, wait for the first result then keep collecting until no result
+        arrives during render_debounce seconds, or until render_max_latency seconds have passed
+
+        Args:
+            qresult (queue.Queue): Queue containing batches of results of workers
+
+        Returns:
+            list: List of ScanRecord received from workers
+        """
+        row_result = []
+        if self.option.watch_import:
+            # Block function for the first result. Usefull to have not infinit loop when qresult is empty
+            new = qresult.get()
+            self.set_label("Last render: in progress...")
+            if not self.receive(new, row_result): # None can be used to force render when watching mode is enabled
+                return row_result
+
+            deadline = time.monotonic() + self.option.render_max_latency
+            while (remaining := deadline - time.monotonic()) > 0:
+                try:
+                    new = qresult.get(timeout=min(self.option.render_debounce, remaining))
+                except queue.Empty:
+                    break
+                if not self.receive(new, row_result):
+                    break
+
+        self.set_label("Last render: in progress...")
+        while True:
+            try:
+                new = qresult.get_nowait()
+            except queue.Empty:
+                break
+            self.receive(new, row_result)
+        return row_result
+
+    def receive(self, new, row_result: list) -> bool:
+        """
+        Args:
+            new (list | None | str): Item of the result queue: batch of ScanRecord, None to render now, RESCORE or STOP
+            row_result (list): Received ScanRecord, extended with new
+
+        Returns:
+            bool: False if new asks to render now (None, RESCORE or STOP)
+        """
+        if isinstance(new, str) and new == RESCORE:
+            self.keywords_changed = True
+            return False
+        if isinstance(new, str) and new == STOP:
+            self.stopped = True
+            return False
+        if new is None:
+            return False
+        row_result.extend(new)
+        return True
+
+    def rescore(self, filenames: set | None = None) -> None:
+        """
+        Score saved results again with the current keywords and threshold (see CountMatrix.rescore).
+        Pdf which can not be scored from the count matrix are added to self.rescan
+
+        Args:
+            filenames (set|None): Filenames to score again. None for every result
+        """
+        data = self.store.to_dataframe(self.profile)
+        if filenames is not None:
+            data = data[data['Filename'].isin(filenames)]
+        if self.matrix is None:
+            self.rescan.update(data['Filename'])
+            return
+        index = NgramIndex(os.path.join(self.option.data_folder, 'index')) if self.option.ngram_index else None
+        try:
+            updated, rescan = self.matrix.rescore(data, self.option, index.texts if index is not None else None)
+        finally:
+            if index is not None:
+                index.close()
+        self.store.upsert(updated, self.profile)
+        self.add_rows(updated)
+        self.rescan.update(rescan)
+
+    def render(self, row_result: list) -> None:
+        """
+        Save new results and write result_file
+
+        Args:
+            row_result (list): List of new ScanRecord (see collect)
+        """
+        start = time.perf_counter()
+        # Only new results are written, old results stay in the store
+        if self.matrix is not None:
+            for record in row_result:
+                self.matrix.append(record)
+        records = [record if record.n_parts == 1 else self.merge_part(record) for record in row_result]
+        records = [record for record in records if record is not None]
+        keywords_changed = self.keywords_changed
+        self.update(records)
+        for index, renderer in enumerate(self.profiles):
+            if keywords_changed:
+                renderer.option = self.option.profile(renderer.profile)
+                renderer.keywords_changed = True
+            renderer.update([record.profile(index) for record in records])
+            self.rescan.update(renderer.rescan)
+            renderer.rescan.clear()
+        if keywords_changed and self.matrix is not None: # Every profile has been scored again
+            self.matrix.save_scoring(self.option)
+
+        if self.metrics is not None:
+            self.metrics.add_stage('render', time.perf_counter() - start)
+            self.metrics.write(self.option.data_folder)
+
+        self.set_label(f"Last render: {datetime.now().strftime('%H:%M:%S')}")
+
+    def update(self, records: list) -> None:
+        """
+        Save new results of the profile and write its result_file
+
+        Args:
+            records (list): ScanRecord of whole pdf, with the pages detected for the profile
+        """
+        if len(records) != 0:
+            new_data = records_to_dataframe(records) # DataFrame built once for every new record
+            self.store.upsert(new_data, self.profile)
+            self.add_rows(new_data)
+        if self.keywords_changed:
+            self.keywords_changed = False
+            self.rescore()
+        else: # Scanned before keyword_file was reloaded
+            outdated = {record.filename for record in records if record.words and record.words != self.option.scorer.words}
+            if outdated:
+                self.rescore(outdated)
+
+        # Rows are sorted by the page, sort_data is only its initial order
+        data = f'showResults({{"columns":{json.dumps(COLUMNS)},"sort":"{self.option.sort_data}","rows":[\n' + ',\n'.join(row[4] for row in self.rows.values()) + '\n]});\n'
+
+        n_new = sum(1 for row in self.rows.values() if row[3])
+        pages = [sum(row[1] for row in self.rows.values() if row[3] == new) for new in (True, False)]
+        detected = [sum(row[2] for row in self.rows.values() if row[3] == new) for new in (True, False)]
+
+        if self.option.watch_import:
+            time_by_scan = ''
+        else:
+            time_by_scan = f" ({str((datetime.now() - self.start_time)/max(1, n_new)).split('.')[0]}/scan)"
+        replace_key = [
+            ("profile", f" - {self.profile}" if self.profile else ""),
+            ("data_file", f"{os.path.basename(data_file(self.option.result_file))}?v={time.time_ns()}"), # Reloaded by the browser after each render
+            ("keywords", self.option.keywords.to_html(index=False, escape=False)),
+            ("n_pdf", f"{len(self.rows)} (Scan: {n_new}, Skip: {len(self.rows) - n_new})"),
+            ("total_pages", f"{sum(pages)} (Scan: {pages[0]}, Skip: {pages[1]})"),
+            ("detected_pages", f"{sum(detected)} (Scan: {detected[0]}, Skip: {detected[1]})"),
+            ("threshold", self.option.threshold),
+            ("thread", f"{self.option.n_workers} (cpu: {os.cpu_count()})"),
+            ("time", str(datetime.now() - self.start_time).split(".")[0]),
+            ("time_by_scan", time_by_scan),
+            ("render_timestamp", datetime.now().strftime("%Y-%m-%d %H:%M:%S")),
+            ("metrics", self.metrics.to_html() if self.metrics is not None else "")
+        ]
+        final_html = self.template
+        for key, value in replace_key:
+            final_html = final_html.replace("{{"+ key +"}}", str(value))
+
+        write_file(data_file(self.option.result_file), data) # Data first: the new page never loads old data
+        write_file(self.option.result_file, final_html)
+
+def render_data(option, qresult: queue.Queue, start_time: datetime, store: ResultStore, render_date_label = None, metrics: Metrics = None) -> None:
+    """
+    Render every result once. Used when watching mode is disabled
+
+    Args:
+        option (Option): Option object
+        qresult (queue.Queue): Queue containing results of workers
+        start_time (datetime): Start time of the script
+        store (ResultStore): Saved results
+        render_date_label (ipywidgets.Label): Label of the widget showing the last render date. None without widgets
+        metrics (Metrics): Metrics of the run. None to disable them
+    """
+    renderer = Renderer(option, start_time, store, render_date_label, metrics)
+    renderer.render(renderer.collect(qresult))
@@ -0,0 +1,301 @@
+import os, re, json, sqlite3
+import pandas as pd
+
+COLUMNS = ['Filename', 'Url', 'Nb pages', 'Nb detected', 'Pages', 'Timed out', 'Partial', 'N', 'Timestamp', 'Hash']
+CSV_COLUMNS = ['Filename', 'Url', 'Nb pages', 'Nb detected', 'Detected pages', 'N', 'Timestamp', 'Hash'] # Columns of save.csv, with html links
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS results (
+        filename TEXT PRIMARY KEY,
+        url TEXT NOT NULL,
+        n_pages INTEGER NOT NULL,
+        n_detected INTEGER NOT NULL,
+        pages TEXT NOT NULL,
+        timed_out TEXT NOT NULL,
+        partial INTEGER NOT NULL,
+        n INTEGER NOT NULL,
+        timestamp TEXT NOT NULL,
+        hash TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS results_hash ON results (hash);
+    CREATE TABLE IF NOT EXISTS profile_results (
+        profile TEXT,
+        filename TEXT,
+        n_detected INTEGER NOT NULL,
+        pages TEXT NOT NULL,
+        PRIMARY KEY (profile, filename)
+    ) WITHOUT ROWID;
+"""
+URL = re.compile(r'href="([^"]*)"') # Url in the html link of save.csv
+LINK = re.compile(r'title="Score: (-?\d+)" href="[^"]*#page=(\d+)"') # Detected page in the html links of save.csv
+TIMED_OUT = re.compile(r'<span class="timed-out"[^>]*>(\d+|Timed out)</span>') # Timed out page in the html links of save.csv
+PARTIAL = re.compile(r'<span class="partial"[^>]*>Partial \((\d+)/\d+\)</span>') # Pages scanned by a partial scan in the html links of save.csv
+
+def detected_html(path: str, n_pages: int, pages: list | str, timed_out: list, partial: int) -> str:
+    """
+    Args:
+        path (str): Absolute path of the pdf
+        n_pages (int): Number of pages of the pdf
+        pages (list|str): [page, score] of detected pages, best scores first. Html of results older than links
+        timed_out (list): Pages whose scan timed out, 0 when the whole pdf timed out
+        partial (int): Number of pages scanned by a partial scan, 0 for a full scan
+
+    Returns:
+        str: Html links to detected pages, followed by pages whose scan timed out and the number of pages of a partial scan (save.csv format)
+    """
+    if isinstance(pages, str):
+        return pages
+    best_score = max((score for _, score in pages), default=None)
+    links = [
+        f'<a class="{"max-score" if score == best_score else ""}" title="Score: {score}" href="{path}#page={page}" target="_blank">{page}</a>'
+        for page, score in pages
+    ]
+    links.extend(f'<span class="timed-out" title="Scan timed out">{page if page > 0 else "Timed out"}</span>' for page in timed_out)
+    if partial > 0:
+        links.append(f'<span class="partial" title="Scan stopped early">Partial ({partial}/{n_pages})</span>')
+    return ' '.join(links)
+
+def parse_detected(html: str) -> tuple:
+    """
+    Args:
+        html (str): Html links to detected pages, written in save.csv or saved by older versions (see detected_html)
+
+    Returns:
+        tuple: (pages, timed out pages, partial) of detected_html. Html without links (results older than links) is kept as pages
+    """
+    pages = [[int(page), int(score)] for score, page in LINK.findall(html)]
+    timed_out = [0 if page == 'Timed out' else int(page) for page in TIMED_OUT.findall(html)]
+    partial = PARTIAL.search(html)
+    if html and not pages and not timed_out and not partial:
+        return html, [], 0
+    return pages, timed_out, int(partial.group(1)) if partial else 0
+
+def parse_url(html: str) -> str:
+    """
+    Args:
+        html (str): Html link to the url of a pdf, written in save.csv or saved by older versions
+
+    Returns:
+        str: Url of the link, empty if there is none
+    """
+    url = URL.search(html)
+    return url.group(1) if url else ''
+
+class ResultStore(object):
+    """
+    Scan results indexed by filename, stored in SQLite (WAL mode).
+    New results are upserted row by row instead of rewriting every result.
+    Detected pages are saved as json [page, score] lists, html links are only built by the report (see render_data.json_row) and save.csv.
+    Detected pages of the keyword profiles (see Option.profiles) are in the profile_results table, other columns are shared.
+    """
+    def __init__(self, data_folder: str) -> None:
+        """
+        Args:
+            data_folder (str): Folder containing saved data
+        """
+        self.db = sqlite3.connect(os.path.join(data_folder, 'results.sqlite'), timeout=60, isolation_level=None, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        if 'detected_pages' in [column for _, column, *_ in self.db.execute('PRAGMA table_info(results)')]: # Store of an older version
+            self.convert()
+        self.db.executescript(SCHEMA)
+
+    def convert(self) -> None:
+        """
+        Convert the html links of detected pages and urls saved by older versions to the columns of COLUMNS
+        """
+        profiles = 'profile_results' in {name for name, in self.db.execute("SELECT name FROM sqlite_master WHERE type = 'table'")} # Not in stores of versions without profiles
+        self.db.executescript("""
+            BEGIN;
+            DROP INDEX IF EXISTS results_hash;
+            ALTER TABLE results RENAME TO html_results;
+        """ + ('ALTER TABLE profile_results RENAME TO html_profile_results;' if profiles else '') + SCHEMA) # Stays in the transaction
+        self.db.executemany('INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+            (filename, parse_url(url), n_pages, n_detected, *self.dumps(*parse_detected(detected)), n, timestamp, h)
+            for filename, url, n_pages, n_detected, detected, n, timestamp, h in self.db.execute('SELECT * FROM html_results').fetchall()
+        ))
+        self.db.execute('DROP TABLE html_results')
+        if profiles:
+            self.db.executemany('INSERT INTO profile_results VALUES (?, ?, ?, ?)', (
+                (profile, filename, n_detected, json.dumps(parse_detected(detected)[0]))
+                for profile, filename, n_detected, detected in self.db.execute('SELECT * FROM html_profile_results').fetchall()
+            ))
+            self.db.execute('DROP TABLE html_profile_results')
+        self.db.execute('COMMIT')
+
+    @staticmethod
+    def dumps(pages: list | str, timed_out: list, partial: int) -> tuple:
+        """
+        Returns:
+            tuple: Values of the pages, timed_out and partial columns
+        """
+        return json.dumps(pages), json.dumps([int(page) for page in timed_out]), int(partial)
+
+    def __len__(self) -> int:
+        return self.db.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    def migrate(self, csv_file: str) -> int:
+        """
+        Import a save.csv file written by older versions. Only done when the store is empty
+
+        Args:
+            csv_file (str): Path of save.csv
+
+        Returns:
+            int: Number of imported rows
+        """
+        if len(self) != 0 or not os.path.isfile(csv_file):
+            return 0
+        old_data = pd.read_csv(csv_file, index_col=False, dtype={'Filename': str, 'Nb pages': int, 'Nb detected': int, 'Detected pages': str, 'N': bool, 'Timestamp': str, 'Hash': str})
+        if 'Hash' not in old_data.columns: # save.csv written before content hashes were tracked
+            old_data['Hash'] = ''
+        if 'Url' not in old_data.columns:
+            old_data['Url'] = ''
+        old_data = old_data.fillna({'Url': '', 'Detected pages': ''})
+        old_data['Url'] = old_data['Url'].map(parse_url)
+        parsed = [parse_detected(html) for html in old_data['Detected pages']]
+        old_data['Pages'] = [pages for pages, _, _ in parsed]
+        old_data['Timed out'] = [timed_out for _, timed_out, _ in parsed]
+        old_data['Partial'] = [partial for _, _, partial in parsed]
+        old_data['Timestamp'] = pd.to_datetime(old_data['Timestamp'])
+        old_data.sort_values(by=['Timestamp'], inplace=True) # Last result of a filename is kept by the upsert
+        self.upsert(old_data)
+        return len(self)
+
+    def upsert(self, data: pd.DataFrame, profile: str = '') -> None:
+        """
+        Insert new results, replace results of already known filenames
+
+        Args:
+            data (pd.DataFrame): Results with COLUMNS columns
+            profile (str): Profile of the detected pages. Empty for keyword_file, other columns are only saved for keyword_file
+        """
+        data = data[COLUMNS].fillna({'Url': '', 'Hash': ''})
+        self.db.execute('BEGIN')
+        if profile:
+            self.db.executemany('INSERT OR REPLACE INTO profile_results VALUES (?, ?, ?, ?)', (
+                (profile, filename, int(n_detected), json.dumps(pages)) for filename, n_detected, pages in data[['Filename', 'Nb detected', 'Pages']].itertuples(index=False)
+            ))
+            self.db.execute('COMMIT')
+            return
+        self.db.executemany('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+            (filename, url, int(n_pages), int(n_detected), *self.dumps(pages, timed_out, partial), int(bool(n)), pd.Timestamp(timestamp).isoformat(), h)
+            for filename, url, n_pages, n_detected, pages, timed_out, partial, n, timestamp, h in data.itertuples(index=False)
+        ))
+        self.db.execute('COMMIT')
+
+    def delete(self, filenames: set) -> None:
+        """
+        Args:
+            filenames (set): Filenames to remove
+        """
+        self.db.execute('BEGIN')
+        for table in ('results', 'profile_results'):
+            self.db.executemany(f'DELETE FROM {table} WHERE filename = ?', ((filename,) for filename in filenames))
+        self.db.execute('COMMIT')
+
+    def clear(self) -> None:
+        self.db.execute('DELETE FROM results')
+        self.db.execute('DELETE FROM profile_results')
+
+    def reset_new(self) -> None:
+        """
+        Mark every result as not scanned during this run
+        """
+        self.db.execute('UPDATE results SET n = 0 WHERE n != 0')
+
+    def hashes(self) -> dict:
+        """
+        Returns:
+            dict: {filename: content hash} of every result. Hash is empty for results imported from an old save.csv
+        """
+        return dict(self.db.execute('SELECT filename, hash FROM results'))
+
+    def set_hashes(self, hashes: dict) -> None:
+        """
+        Args:
+            hashes (dict): {filename: content hash} to save
+        """
+        self.db.execute('BEGIN')
+        self.db.executemany('UPDATE results SET hash = ? WHERE filename = ?', ((h, filename) for filename, h in hashes.items()))
+        self.db.execute('COMMIT')
+
+    def mark_stale(self, filenames: set) -> None:
+        """
+        Results to scan again, even in a later run: their hash does not match their pdf anymore
+
+        Args:
+            filenames (set): Filenames of the results
+        """
+        self.set_hashes({filename: 'stale' for filename in filenames})
+
+    def select(self, profile: str = '') -> tuple:
+        """
+        Returns:
+            tuple: Query of the results of profile with COLUMNS columns, and its parameters. Pdf not scored for the profile have no detected page
+        """
+        if not profile:
+            return 'SELECT * FROM results', ()
+        return ('SELECT results.filename, url, n_pages, COALESCE(profile_results.n_detected, 0), COALESCE(profile_results.pages, \'[]\'), timed_out, partial, n, timestamp, hash '
+                'FROM results LEFT JOIN profile_results ON profile_results.filename = results.filename AND profile = ?', (profile,))
+
+    def partial(self) -> set:
+        """
+        Returns:
+            set: Filenames of the results of partial scans (see Option.max_hits and Option.max_pages)
+        """
+        return {filename for filename, in self.db.execute('SELECT filename FROM results WHERE partial > 0')}
+
+    def get(self, filename: str, profile: str = '') -> dict | None:
+        """
+        Args:
+            filename (str): Filename of the result
+            profile (str): Profile of the detected pages, empty for keyword_file
+
+        Returns:
+            dict | None: Result with COLUMNS keys, None if unknown
+        """
+        query, parameters = self.select(profile)
+        row = self.db.execute(query + ' WHERE results.filename = ?', parameters + (filename,)).fetchone()
+        if row is None:
+            return None
+        row = dict(zip(COLUMNS, row))
+        row['Pages'], row['Timed out'] = json.loads(row['Pages']), json.loads(row['Timed out'])
+        row['N'] = bool(row['N'])
+        row['Timestamp'] = pd.Timestamp(row['Timestamp'])
+        return row
+
+    def to_dataframe(self, profile: str = '') -> pd.DataFrame:
+        """
+        Args:
+            profile (str): Profile of the detected pages, empty for keyword_file
+
+        Returns:
+            pd.DataFrame: Every result with COLUMNS columns
+        """
+        data = pd.DataFrame(self.db.execute(*self.select(profile)).fetchall(), columns=COLUMNS)
+        data['Pages'] = data['Pages'].map(json.loads)
+        data['Timed out'] = data['Timed out'].map(json.loads)
+        data['N'] = data['N'].astype(bool)
+        data['Timestamp'] = pd.to_datetime(data['Timestamp'])
+        return data
+
+    def export(self, file: str, pdf_folder: str) -> None:
+        """
+        Export every result with html links (CSV_COLUMNS), for compatibility with tools reading save.csv
+
+        Args:
+            file (str): Destination file. '.parquet' files are written with pandas.to_parquet, other files as csv
+            pdf_folder (str): Folder containing pdf, for the links to detected pages
+        """
+        data = self.to_dataframe()
+        data['Detected pages'] = [detected_html(os.path.abspath(os.path.join(pdf_folder, filename)), n_pages, pages, timed_out, partial)
+                                  for filename, n_pages, pages, timed_out, partial in data[['Filename', 'Nb pages', 'Pages', 'Timed out', 'Partial']].itertuples(index=False)]
+        data['Url'] = [f'<a class="filename" href="{url}" target="_blank">{filename}</a>' for filename, url in zip(data['Filename'], data['Url'])]
+        data = data[CSV_COLUMNS]
+        if file.endswith('.parquet'):
+            data.to_parquet(file, index=False)
+        else:
+            data.to_csv(file, index=False)
+
+    def close(self) -> None:
+        self.db.close()
@@ -0,0 +1,257 @@
+import os, heapq, itertools, threading, time
+from multiprocessing.managers import BaseManager
+
+class Scheduler(object):
+    """
+    Queue of pdf to scan, shared by the main process and workers through a SchedulerManager proxy.
+    Pdf added from the widget (priority lane) come first, in order of arrival. Other pdf are ordered by
+    estimated cost, largest first, so the longest scans start early. Pdf retried after a timeout (retry lane) come last,
+    so a slow pdf does not delay the others. Small pdf are given in bundles.
+    Workers block on a condition until a task arrives or every task is done.
+    Tasks given to worker nodes (see coordinator.py) are leased: they are requeued if their node stops sending heartbeats.
+    """
+    def __init__(self) -> None:
+        self.heap = [] # (lane, -cost, order, cost, task)
+        self.order = itertools.count()
+        self.unfinished = 0
+        self.condition = threading.Condition()
+        self.leases = {} # {lease: (node, cost, task)} of tasks given to worker nodes
+        self.nodes = {} # {node: time.monotonic() of its last heartbeat}
+        self.keywords = (0, None) # (version, keywords) reloaded from the keyword files, see set_keywords
+
+    def put(self, task: dict, cost: int | None = None) -> None:
+        """
+        Args:
+            task (dict): Task of a pdf. task['retry'] puts it in the retry lane, task['priority'] in the priority lane
+            cost (int|None): Estimated cost of the task (size in bytes). None to use the size of task['path']
+        """
+        if cost is None:
+            try:
+                cost = os.path.getsize(task['path'])
+            except OSError:
+                cost = 0
+        task.pop('lease', None) # Task requeued by a worker node
+        with self.condition:
+            self._push(task, cost)
+            self.unfinished += 1
+
+    def _push(self, task: dict, cost: int) -> None:
+        """
+        Must be called with the condition acquired
+        """
+        if task.get('retry'):
+            heapq.heappush(self.heap, (2, -cost, next(self.order), cost, task))
+        elif task.get('priority'):
+            heapq.heappush(self.heap, (0, 0, next(self.order), cost, task))
+        else:
+            heapq.heappush(self.heap, (1, -cost, next(self.order), cost, task))
+        self.condition.notify()
+
+    def get(self, timeout: int | float | None = None, until_done: bool = False, bundle_size: int = 0, max_tasks: int = 0,
+            node: str | None = None) -> list:
+        """
+        Wait for the next tasks
+
+        Args:
+            timeout (int|float|None): Maximum waiting time in seconds. None to wait without limit
+            until_done (bool): Stop waiting when every task put has been done (batch mode)
+            bundle_size (int): Tasks are bundled while the total cost of the bundle stays under bundle_size bytes. 0 to disable
+            max_tasks (int): Maximum number of tasks of the bundle. 0 for no limit
+            node (str|None): Name of the worker node asking for tasks. Its tasks are leased, with their lease in task['lease']. None for local workers
+
+        Returns:
+            list: Bundle of tasks, empty if the timeout expired or if every task is done
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.condition:
+            while not self.heap:
+                if until_done and self.unfinished == 0:
+                    return []
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return []
+                self.condition.wait(remaining)
+
+            lane, _, _, total, task = heapq.heappop(self.heap)
+            bundle = [(total, task)]
+            # The heap is ordered by decreasing cost: once a task is small, the next ones of its lane are smaller.
+            # A bundle takes at most half of the waiting tasks (rounded up), other workers get the others
+            while len(bundle) < len(self.heap) and len(bundle) != max_tasks and self.heap[0][0] == lane and total + self.heap[0][3] <= bundle_size:
+                total += self.heap[0][3]
+                bundle.append(heapq.heappop(self.heap)[3:])
+            if node is not None:
+                self.nodes.setdefault(node, time.monotonic())
+                for cost, task in bundle:
+                    task['lease'] = next(self.order)
+                    self.leases[task['lease']] = (node, cost, task)
+            return [task for _, task in bundle]
+
+    def task_done(self, n: int = 1, lease: int | None = None) -> None:
+        """
+        Args:
+            n (int): Number of tasks done
+            lease (int|None): Lease of the task done by a worker node (task['lease'])
+        """
+        with self.condition:
+            if lease is not None and self.leases.pop(lease, None) is None: # Expired lease: the task has been requeued
+                return
+            self.unfinished -= n
+            if self.unfinished <= 0:
+                self.condition.notify_all()
+
+    def join(self) -> None:
+        """
+        Wait until every task put has been done
+        """
+        with self.condition:
+            while self.unfinished > 0:
+                self.condition.wait()
+
+    def release(self, tasks: list) -> None:
+        """
+        Put back tasks given by get which will not be done (cancelled worker). They stay counted in unfinished
+
+        Args:
+            tasks (list): Tasks given by get
+        """
+        with self.condition:
+            for task in tasks:
+                lease = task.pop('lease', None)
+                if lease is not None:
+                    if lease not in self.leases: # Expired lease: the task has already been requeued
+                        continue
+                    _, cost, _ = self.leases.pop(lease)
+                else:
+                    try:
+                        cost = os.path.getsize(task['path'])
+                    except OSError:
+                        cost = 0
+                self._push(task, cost)
+
+    def done(self) -> bool:
+        """
+        Returns:
+            bool: True if every task put has been done
+        """
+        with self.condition:
+            return self.unfinished <= 0
+
+    def heartbeat(self, node: str) -> None:
+        """
+        Args:
+            node (str): Name of the worker node, still alive
+        """
+        with self.condition:
+            self.nodes[node] = time.monotonic()
+
+    def leave(self, node: str) -> None:
+        """
+        Unregister a stopping worker node. Its unfinished tasks are requeued
+
+        Args:
+            node (str): Name of the worker node
+        """
+        with self.condition:
+            self._requeue(node)
+            self.nodes.pop(node, None)
+            self.condition.notify_all()
+
+    def expire(self, timeout: int | float) -> dict:
+        """
+        Unregister the worker nodes without heartbeat for timeout seconds and requeue their tasks
+
+        Args:
+            timeout (int|float): Lease duration in seconds
+
+        Returns:
+            dict: {node: number of requeued tasks} of expired nodes
+        """
+        with self.condition:
+            now = time.monotonic()
+            expired = {node: self._requeue(node) for node, heartbeat in self.nodes.items() if now - heartbeat > timeout}
+            for node in expired:
+                del self.nodes[node]
+            if expired:
+                self.condition.notify_all()
+            return expired
+
+    def _requeue(self, node: str) -> int:
+        """
+        Must be called with the condition acquired
+
+        Returns:
+            int: Number of requeued tasks
+        """
+        leases = [lease for lease, (owner, _, _) in self.leases.items() if owner == node]
+        for lease in leases:
+            _, cost, task = self.leases.pop(lease)
+            del task['lease']
+            self._push(task, cost) # Still counted in unfinished
+        return len(leases)
+
+    def wait_nodes(self, timeout: int | float | None = None) -> bool:
+        """
+        Wait until every worker node has left or expired
+
+        Args:
+            timeout (int|float|None): Maximum waiting time in seconds. None to wait without limit
+
+        Returns:
+            bool: True if every worker node has left
+        """
+        with self.condition:
+            return self.condition.wait_for(lambda: not self.nodes, timeout)
+
+    def set_url(self, path: str, url: str, **task) -> None:
+        """
+        Give an url to the waiting tasks of a pdf put without one
+
+        Args:
+            path (str): Path of the pdf, as in its task
+            url (str): Url of the pdf
+            **task: Other values to update in the waiting tasks (priority)
+        """
+        with self.condition:
+            entries = [entry for entry in self.heap if entry[4]['path'] == path]
+            if not entries:
+                return
+            self.heap = [entry for entry in self.heap if entry[4]['path'] != path]
+            heapq.heapify(self.heap)
+            for _, _, _, cost, waiting in entries:
+                self._push({**waiting, 'url': url, **task}, cost) # Still counted in unfinished
+
+    def set_keywords(self, keywords) -> None:
+        """
+        Publish keywords reloaded from the keyword files. Workers use them from their next bundle (see Worker.sync_keywords)
+
+        Args:
+            keywords (tuple): Keywords of keyword_file and of each profile, as Option.keywords and Option.profile_keywords
+        """
+        with self.condition:
+            self.keywords = (self.keywords[0] + 1, keywords)
+
+    def get_keywords(self, version: int) -> tuple | None:
+        """
+        Args:
+            version (int): Version of the keywords used by the worker
+
+        Returns:
+            tuple | None: (version, keywords) if keywords have been reloaded since version, None otherwise
+        """
+        with self.condition:
+            return self.keywords if self.keywords[0] != version else None
+
+    def qsize(self) -> int:
+        """
+        Returns:
+            int: Number of tasks waiting for a worker
+        """
+        with self.condition:
+            return len(self.heap)
+
+class SchedulerManager(BaseManager):
+    """
+    Server process hosting the Scheduler
+    """
+
+SchedulerManager.register('Scheduler', Scheduler)
@@ -0,0 +1,280 @@
+import os, signal, threading, time, multiprocessing
+
+from .worker import Worker, ResultChannel, retry_task, BUNDLE, INDEX, TASK_START, PAGE_START, PAGE, N_PAGES, STOP, STOP_PAGE, SENT, STATE_SIZE
+from .scheduler import Scheduler
+
+KILL_GRACE = 5 # Seconds given to a worker to abandon a page or a pdf before being killed
+
+class WorkerProcess(multiprocessing.Process):
+    """
+    Process of a worker. Joining it also waits for the thread relaying its results (see Supervisor.relay),
+    so every result it has sent is in qresult once it is joined
+    """
+    relay = None
+
+    def join(self, timeout: int | float | None = None) -> None:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        super().join(timeout)
+        if self.relay is not None and self.exitcode is not None:
+            self.relay.join(None if deadline is None else max(0, deadline - time.monotonic()))
+
+    def relaying(self) -> bool:
+        """
+        Returns:
+            bool: True while the process runs or its last results are not in qresult yet
+        """
+        return self.is_alive() or (self.relay is not None and self.relay.is_alive())
+
+class Supervisor(object):
+    """
+    Start workers and replace the ones that retire (see Worker.retire_reason). Their queued tasks stay in the scheduler,
+    the replacing worker takes them. The process list is updated in place, so it can be used to cancel workers.
+    Each worker sends its results in its own pipe, read by a thread putting them in qresult (see relay).
+
+    When page_timeout or file_timeout is set, a watchdog thread reads the shared state of each worker and asks the ones
+    scanning a page or a pdf for too long to abandon it (STOP, see Worker.abandon): the page is marked as timed out,
+    the pdf goes to the retry lane and is marked as timed out if its retry times out too. A worker which does not answer
+    within KILL_GRACE seconds (stuck in a C extension) is killed: only its own pipe may be left with a half-written message.
+    The tasks of its bundle whose record has not been sent (see worker.SENT) are requeued, its pdf goes to the retry lane
+    without the page that timed out.
+
+    With Option.autotune, the number of workers is changed by resize. Workers whose id is above the shared pool size
+    stop after their bundle (see Worker.run) and are started again if the pool grows back.
+    """
+    def __init__(self, option, qresult, qlog: multiprocessing.SimpleQueue, queue: Scheduler,
+                 CancelProcessEvent: multiprocessing.Event, reporter = None, node: str | None = None, shared = None) -> None:
+        """
+        Args:
+            option (Option): Option object
+            qresult (queue.Queue): Queue containing results of workers (proxy of the queue of the coordinator on a worker node)
+            qlog (multiprocessing.SimpleQueue): Queue containing log messages of workers
+            queue (Scheduler): Queue of pdf to scan
+            CancelProcessEvent (multiprocessing.Event): Event to cancel the process
+            reporter (atpbar.Reporter): Reporter of the progress bars. None to disable them
+            node (str|None): Name of the worker node (see coordinator.run_node). None on the main process
+            shared (coordinator.SharedFolder|None): Path of the pdf of the coordinator on a worker node
+        """
+        self.option = option
+        self.qresult = qresult
+        self.qlog = qlog
+        self.queue = queue
+        self.CancelProcessEvent = CancelProcessEvent
+        self.reporter = reporter
+        self.node = node
+        self.shared = shared
+
+        self.process = []
+        self.lock = threading.Lock()
+        self.spawn_lock = threading.Lock()
+        self.stopped = False
+
+        self.timeouts = option.page_timeout > 0 or option.file_timeout > 0
+        self.states = [] # Shared state of each worker, see worker.BUNDLE...N_PAGES
+        self.bundles = {} # {worker_id: (bundle number, tasks)} sent by workers through qlog
+        self.pool = multiprocessing.RawValue('i', 0) if option.autotune and node is None else None # Number of workers to keep
+        self.idle = set() # Ids of the workers stopped by resize
+
+    def start(self, n_workers: int) -> list:
+        """
+        Args:
+            n_workers (int): Number of workers
+
+        Returns:
+            list: List of process
+        """
+        if self.pool is not None:
+            self.pool.value = n_workers
+        for i in range(n_workers):
+            if self.timeouts:
+                self.states.append(multiprocessing.RawArray('d', STATE_SIZE))
+            self.process.append(self.spawn(i + 1))
+        if self.timeouts:
+            threading.Thread(target=self.watchdog, daemon=True).start()
+        return self.process
+
+    def spawn(self, worker_id: int) -> WorkerProcess:
+        state = None
+        if self.timeouts:
+            state = self.states[worker_id - 1]
+            state[:] = [0] * len(state)
+            self.bundles.pop(worker_id, None)
+        # A worker started meanwhile would inherit the write end of the pipe: the relay would not see this worker stop
+        with self.spawn_lock:
+            reader, writer = multiprocessing.Pipe(duplex=False)
+            work = Worker(self.option, ResultChannel(writer), self.qlog, self.queue, self.reporter, worker_id, state, self.node, self.shared, self.pool)
+            p = WorkerProcess(target=work.run, args=(self.CancelProcessEvent,), name=f"P{worker_id}")
+            p.start()
+            writer.close()
+        p.relay = threading.Thread(target=self.relay, args=(reader,), daemon=True)
+        p.relay.start()
+        return p
+
+    def relay(self, reader) -> None:
+        """
+        Thread putting the batches of records of a worker in qresult, until the worker stops
+
+        Args:
+            reader (multiprocessing.connection.Connection): Read end of the pipe of the worker
+        """
+        with reader:
+            while True:
+                try:
+                    batch = reader.recv()
+                except (EOFError, OSError): # Worker stopped, or killed while sending: its half-written batch is dropped
+                    return
+                self.qresult.put(batch)
+
+    def respawn(self, worker_id: int) -> None:
+        """
+        Replace a worker that has retired
+
+        Args:
+            worker_id (int): Id of the worker
+        """
+        with self.lock:
+            if self.stopped or self.CancelProcessEvent.is_set():
+                return
+            self.process[worker_id - 1].join(timeout=5) # The worker stops right after retiring
+            if self.pool is not None and worker_id > self.pool.value: # Removed by resize meanwhile
+                self.idle.add(worker_id)
+                return
+            self.process[worker_id - 1] = self.spawn(worker_id)
+
+    def resize(self, n_workers: int) -> None:
+        """
+        Change the number of workers (Option.autotune). Removed workers stop after their current bundle
+
+        Args:
+            n_workers (int): Number of workers
+        """
+        with self.lock:
+            if self.stopped or self.CancelProcessEvent.is_set():
+                return
+            self.pool.value = n_workers
+            for worker_id in sorted(worker_id for worker_id in self.idle if worker_id <= n_workers):
+                self.idle.remove(worker_id)
+                self.process[worker_id - 1] = self.spawn(worker_id)
+            for worker_id in range(len(self.process) + 1, n_workers + 1):
+                if self.timeouts:
+                    self.states.append(multiprocessing.RawArray('d', STATE_SIZE))
+                self.process.append(self.spawn(worker_id))
+
+    def release(self, worker_id: int) -> None:
+        """
+        Register a worker stopped by resize. It is started again if the pool has grown back meanwhile
+
+        Args:
+            worker_id (int): Id of the worker
+        """
+        with self.lock:
+            self.process[worker_id - 1].join(timeout=5) # The worker stops right after being released
+            if worker_id > self.pool.value or self.stopped or self.CancelProcessEvent.is_set():
+                self.idle.add(worker_id)
+            else:
+                self.process[worker_id - 1] = self.spawn(worker_id)
+
+    def join(self, timeout: int | float | None = None) -> bool:
+        """
+        Wait for every worker to stop. Retired workers are not replaced anymore
+
+        Args:
+            timeout (int|float|None): Maximum waiting time in seconds. None to wait without limit
+
+        Returns:
+            bool: True if every worker has stopped
+        """
+        with self.lock:
+            self.stopped = True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for p in self.process:
+            p.join(None if deadline is None else max(0, deadline - time.monotonic()))
+        return not any(p.relaying() for p in self.process)
+
+    def assign(self, worker_id: int, number: int, bundle: list) -> None:
+        """
+        Args:
+            worker_id (int): Id of the worker
+            number (int): Number of the bundle for this worker (state[BUNDLE])
+            bundle (list): Tasks of the bundle
+        """
+        self.bundles[worker_id] = (number, bundle)
+
+    def watchdog(self) -> None:
+        """
+        Thread killing and replacing the workers exceeding page_timeout or file_timeout
+        """
+        period = min(1, min(timeout for timeout in (self.option.page_timeout, self.option.file_timeout) if timeout > 0) / 4)
+        while not self.stopped and not self.CancelProcessEvent.is_set():
+            time.sleep(period)
+            for worker_id in range(1, len(self.states) + 1):
+                overdue = self.overdue(worker_id)
+                if overdue is not None:
+                    self.timeout(worker_id, *overdue)
+
+    def overdue(self, worker_id: int) -> tuple | None:
+        """
+        Args:
+            worker_id (int): Id of the worker
+
+        Returns:
+            tuple | None: (bundle number, index of the task, page) if the worker exceeded its time budget (page is 0 for file_timeout), None otherwise
+        """
+        state = self.states[worker_id - 1]
+        task_start, page_start = state[TASK_START], state[PAGE_START]
+        number, bundle = self.bundles.get(worker_id, (0, []))
+        if task_start == 0 or number != state[BUNDLE]: # Idle, or its bundle has not been received yet
+            return None
+        index = int(state[INDEX])
+        factor = self.option.retry_timeout_factor if bundle[index].get('retry') else 1
+        now = time.time()
+        if self.option.page_timeout > 0 and page_start > 0 and now - page_start > self.option.page_timeout * factor:
+            return (number, index, int(state[PAGE]))
+        if self.option.file_timeout > 0 and now - task_start > self.option.file_timeout * factor:
+            return (number, index, 0)
+        return None
+
+    def timeout(self, worker_id: int, number: int, index: int, page: int) -> None:
+        """
+        Ask a worker exceeding its time budget to abandon its page or its pdf. If it has not after KILL_GRACE seconds,
+        kill it, requeue its unfinished tasks and start a new worker
+
+        Args:
+            worker_id (int): Id of the worker
+            number (int): Number of the bundle of the worker
+            index (int): Index of the task which timed out in the bundle
+            page (int): Page which timed out (starting at 1), 0 if the whole task timed out
+        """
+        with self.lock:
+            if self.stopped or self.CancelProcessEvent.is_set():
+                return
+            state = self.states[worker_id - 1]
+            now = time.time()
+            if state[STOP] == 0:
+                if self.overdue(worker_id) != (number, index, page): # Finished meanwhile
+                    return
+                state[STOP_PAGE], state[STOP] = page, now
+                if hasattr(signal, 'SIGUSR1'): # Otherwise the worker only checks STOP between pages
+                    try:
+                        os.kill(self.process[worker_id - 1].pid, signal.SIGUSR1)
+                    except ProcessLookupError: # Stopped meanwhile
+                        pass
+                return
+            if now - state[STOP] < KILL_GRACE:
+                return
+            self.process[worker_id - 1].kill()
+            self.process[worker_id - 1].join() # Results sent before the kill are in qresult
+
+            bundle = self.bundles[worker_id][1]
+            # Tasks before done have been marked as done by the worker (it may have finished the late one before being killed),
+            # tasks before sent have their record in qresult. Tasks done whose record was still in the batch are scanned again
+            done = int(state[INDEX]) + (state[TASK_START] == 0) if state[BUNDLE] == number else len(bundle)
+            sent = min(int(state[SENT]), done) if state[BUNDLE] == number else len(bundle)
+            for i in range(sent, len(bundle)):
+                task = bundle[i]
+                if i == index:
+                    task = retry_task(task, page, int(state[N_PAGES]), self.qlog, self.qresult, self.shared)
+                if task is not None:
+                    self.queue.put(task)
+            for task in bundle[done:]:
+                self.queue.task_done(lease=task.get('lease'))
+            self.process[worker_id - 1] = self.spawn(worker_id)
@@ -0,0 +1,148 @@
+import os, sqlite3, time, zlib
+
+from .hashing import text_hash
+
+ACCESS_BATCH = 64 # Documents read from the cache before their access time is written
+
+class TextCache(object):
+    """
+    On-disk cache of normalized page text, keyed by the hash of the pdf content and the page number.
+    Texts are stored once by their own hash, so identical pages of different documents share the same entry.
+    Documents are also keyed by the extraction backends: text extracted by other backends is not reused.
+    Access times of cache hits are written with the next put_document, or every ACCESS_BATCH documents read, and the
+    total size of the texts is kept up to date by triggers, so reads and eviction checks do not scan the table.
+    """
+    def __init__(self, folder: str, max_size: int, backends: str) -> None:
+        """
+        Args:
+            folder (str): Folder of the cache (created if needed)
+            max_size (int): Maximum size of the compressed texts in bytes. Least recently used texts are evicted above it
+            backends (str): Comma separated names of the backends extracting the texts (see backends.select_backends)
+        """
+        os.makedirs(folder, exist_ok=True)
+        self.max_size = max_size
+        self.backends = backends
+        self.accessed = {} # {text_hash: time.time() of its last read} not written yet
+        self.n_accessed = 0
+
+        self.db = sqlite3.connect(os.path.join(folder, 'text_cache.sqlite'), timeout=60, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript("""
+            BEGIN IMMEDIATE;
+            CREATE TABLE IF NOT EXISTS documents (doc_hash TEXT PRIMARY KEY, n_pages INTEGER NOT NULL);
+            CREATE TABLE IF NOT EXISTS pages (doc_hash TEXT, page INTEGER, text_hash TEXT NOT NULL, PRIMARY KEY (doc_hash, page)) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS texts (text_hash TEXT PRIMARY KEY, data BLOB NOT NULL, size INTEGER NOT NULL, last_access REAL NOT NULL);
+            CREATE INDEX IF NOT EXISTS pages_text_hash ON pages (text_hash);
+            CREATE INDEX IF NOT EXISTS texts_last_access ON texts (last_access);
+            CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+            INSERT OR IGNORE INTO stats SELECT 'size', COALESCE(SUM(size), 0) FROM texts;
+            CREATE TRIGGER IF NOT EXISTS texts_insert AFTER INSERT ON texts BEGIN
+                UPDATE stats SET value = value + NEW.size WHERE name = 'size';
+            END;
+            CREATE TRIGGER IF NOT EXISTS texts_delete AFTER DELETE ON texts BEGIN
+                UPDATE stats SET value = value - OLD.size WHERE name = 'size';
+            END;
+            COMMIT;
+        """)
+
+    def get_document(self, doc_hash: str) -> tuple[int | None, dict]:
+        """
+        Args:
+            doc_hash (str): Hash of the pdf content
+
+        Returns:
+            tuple: Number of pages (None if the document is unknown) and dict {page index: normalized text} of cached pages
+        """
+        doc_hash = self.key(doc_hash)
+        row = self.db.execute('SELECT n_pages FROM documents WHERE doc_hash = ?', (doc_hash,)).fetchone()
+        if row is None:
+            return None, {}
+
+        rows = self.db.execute("""
+            SELECT pages.page, texts.text_hash, texts.data FROM pages
+            JOIN texts ON texts.text_hash = pages.text_hash
+            WHERE pages.doc_hash = ?
+        """, (doc_hash,)).fetchall()
+        if rows:
+            now = time.time()
+            self.accessed.update((h, now) for _, h, _ in rows)
+            self.n_accessed += 1
+            if self.n_accessed >= ACCESS_BATCH:
+                self.flush_access()
+        return row[0], {page: zlib.decompress(data).decode('utf-8', 'surrogatepass') for page, _, data in rows}
+
+    def put_document(self, doc_hash: str, n_pages: int, pages: dict) -> None:
+        """
+        Store the new pages of a document then evict old texts if the cache is too big
+
+        Args:
+            doc_hash (str): Hash of the pdf content
+            n_pages (int): Number of pages of the document
+            pages (dict): {page index: normalized text} of pages to add
+        """
+        doc_hash = self.key(doc_hash)
+        now = time.time()
+        texts = {}
+        for page, text in pages.items():
+            texts.setdefault(text_hash(text), text)
+
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            self.db.execute('INSERT OR REPLACE INTO documents VALUES (?, ?)', (doc_hash, n_pages))
+            self.db.executemany('INSERT OR REPLACE INTO pages VALUES (?, ?, ?)',
+                                ((doc_hash, page, text_hash(text)) for page, text in pages.items()))
+            self.db.executemany('INSERT OR IGNORE INTO texts VALUES (?, ?, ?, ?)',
+                                ((h, data, len(data), now) for h, data in
+                                 ((h, zlib.compress(text.encode('utf-8', 'surrogatepass'))) for h, text in texts.items())))
+            self._write_access()
+            self._evict()
+            self.db.execute('COMMIT')
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+
+    def key(self, doc_hash: str) -> str:
+        return f'{doc_hash}:{self.backends}'
+
+    def _write_access(self) -> None:
+        """
+        Write the access times of the texts read since the last call. Must be called inside a transaction
+        """
+        self.db.executemany('UPDATE texts SET last_access = ? WHERE text_hash = ?', ((t, h) for h, t in self.accessed.items()))
+        self.accessed, self.n_accessed = {}, 0
+
+    def _evict(self) -> None:
+        """
+        Remove least recently used texts until the cache is under 90% of max_size. Must be called inside a transaction
+        """
+        size = self.db.execute("SELECT value FROM stats WHERE name = 'size'").fetchone()[0]
+        if size <= self.max_size:
+            return
+        to_free = size - int(self.max_size * 0.9)
+        evicted = []
+        for h, s in self.db.execute('SELECT text_hash, size FROM texts ORDER BY last_access'):
+            evicted.append((h,))
+            to_free -= s
+            if to_free <= 0:
+                break
+        self.db.executemany('DELETE FROM texts WHERE text_hash = ?', evicted)
+        self.db.executemany('DELETE FROM pages WHERE text_hash = ?', evicted)
+
+    def flush_access(self) -> None:
+        """
+        Write the access times of the texts read since the last put_document
+        """
+        if not self.accessed:
+            return
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            self._write_access()
+            self.db.execute('COMMIT')
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+
+    def close(self) -> None:
+        self.flush_access()
+        self.db.close()
@@ -1,132 +1,682 @@
-import os, re, multiprocessing, atpbar, pypdf
-import pandas as pd
-from unidecode import unidecode
+import os, signal, contextlib, mmap, threading, multiprocessing, pypdf
+import numpy as np
+from array import array
+from pypdf.generic import ArrayObject, IndirectObject
+
+from .hashing import file_hash
+from .text_cache import TextCache
+from .record import ScanRecord
+from .metrics import StageTimer, current_rss
+from .prefilter import raw_text
+from .backends import Extractor, select_backends
+from .ngram_index import NgramIndex
+from .journal import Journal
+from .keyword_matcher import KeywordMatcher, ProfileScorer
+from .scheduler import Scheduler
 
 import time
 
+# Fields of the shared state of a worker, read by the watchdog of the Supervisor (times are time.time(), 0 when idle).
+# STOP is set by the watchdog to make the worker abandon STOP_PAGE (0 for the whole pdf), SENT is the number of tasks
+# of the bundle whose record has been sent (or which have none)
+BUNDLE, INDEX, TASK_START, PAGE_START, PAGE, N_PAGES, STOP, STOP_PAGE, SENT = range(9)
+STATE_SIZE = 9
+
+class ResultChannel(object):
+    """
+    Write end of the pipe of a worker, read by a thread of the Supervisor which puts the batches in qresult (see Supervisor.relay).
+    Each worker has its own pipe: a worker killed while sending only loses its own message, and a send returns once
+    the batch is in the pipe, so it is not lost if the worker is killed afterwards
+    """
+    def __init__(self, connection) -> None:
+        """
+        Args:
+            connection (multiprocessing.connection.Connection): Write end of the pipe
+        """
+        self.connection = connection
+        self.lock = threading.Lock() # Batches are sent by the worker and by its flush_overdue thread
+
+    def __getstate__(self):
+        return self.connection
+
+    def __setstate__(self, connection) -> None:
+        self.__init__(connection)
+
+    def put(self, batch: list) -> None:
+        with self.lock:
+            self.connection.send(batch)
+
+class TaskAbandoned(BaseException):
+    """
+    Raised in a worker asked by the watchdog to abandon a page (page_timeout) or its pdf (file_timeout, page 0).
+    Not an Exception, so it is not caught by the error handling of pdf libraries
+    """
+    def __init__(self, page: int) -> None:
+        super().__init__(page)
+        self.page = page
+
+def retry_task(task: dict, page: int, n_pages: int, qlog: multiprocessing.SimpleQueue, qresult, shared = None) -> dict | None:
+    """
+    Args:
+        task (dict): Task which timed out
+        page (int): Page which timed out (starting at 1), 0 if the whole task timed out
+        n_pages (int): Number of pages of the pdf, 0 if unknown
+        qlog (multiprocessing.SimpleQueue): Queue containing log messages of workers
+        qresult (queue.Queue|ResultChannel): Queue containing results of workers (or channel of a worker), receiving the record of a task given up
+        shared (coordinator.SharedFolder|None): Path of the pdf of the coordinator on a worker node
+
+    Returns:
+        dict | None: Task to put in the retry lane, None if the task is given up and marked as timed out
+    """
+    name = os.path.basename(task['path'])
+    if page > 0:
+        qlog.put(('timeout', (name, f"page {page} exceeded page_timeout. Skipping it")))
+        return dict(task, retry=True, timed_out_pages=[*task.get('timed_out_pages', []), page])
+    if not task.get('retry'):
+        qlog.put(('timeout', (name, "file_timeout exceeded. Retrying it after the other pdf")))
+        return dict(task, retry=True)
+
+    qlog.put(('timeout', (name, "file_timeout exceeded again. Marking it as timed out")))
+    first_page, last_page = task.get('range', (0, n_pages))
+    timed_out = array('I', range(first_page + 1, last_page + 1)) if last_page > 0 else array('I', [0])
+    qresult.put([ScanRecord(
+        path=task['path'],
+        filename=name,
+        abs_path=shared.abs_path(task['path']) if shared is not None else os.path.abspath(task['path']),
+        url=task['url'],
+        timestamp=task['timestamp'],
+        hash=task.get('hash') or '',
+        n_pages=n_pages,
+        timed_out=timed_out,
+        part=task.get('part', 0),
+        n_parts=task.get('n_parts', 1)
+    )])
+    return None
+
 class Worker(object):
     worker_id = 1
-    def __init__(self, option, result: multiprocessing.SimpleQueue, logger: multiprocessing.SimpleQueue, queue: multiprocessing.JoinableQueue, reporter: atpbar.reporter.ProgressReporter) -> None:
+    def __init__(self, option, result: ResultChannel, logger: multiprocessing.SimpleQueue, queue: Scheduler, reporter = None,
+                 worker_id: int | None = None, state = None, node: str | None = None, shared = None, pool = None) -> None:
+        """
+        Args:
+            result (ResultChannel): Channel sending the batches of records to the main process
+            state (multiprocessing.RawArray): Shared state of the worker (see BUNDLE...SENT), None when timeouts are disabled
+            node (str|None): Name of the worker node leasing the tasks (see coordinator.run_node). None on the main process
+            shared (coordinator.SharedFolder|None): Path of the pdf of the coordinator on a worker node
+            pool (multiprocessing.RawValue): Number of workers to keep (see Supervisor.resize), None when autotune is disabled
+        """
         self.option = option
         self.result = result
         self.logger = logger
         self.queue = queue
         self.reporter = reporter
+        self._text_cache = None
+        self._backends = None
+        self._ngram_index = None
+        self._journal = None
+        self._batch = []
+        self._batch_start = 0
+        self._covered = 0 # Tasks of the bundle whose record is in the batch or sent, or which have none (see SENT)
+        self._lock = contextlib.nullcontext() # Replaced by a lock in the process when the batch is also flushed by flush_overdue
+        self._bundle = []
+        self._interruptible = False # In a section of the scan which the watchdog can interrupt (see interruptible)
+        self.n_tasks = 0
+        self.state = state
+        self.node = node
+        self.shared = shared
+        self.pool = pool
+        self.parent = os.getpid()
+        self.keywords_version = 0 # Version of the keywords of the scheduler used by option.scorer (see sync_keywords)
+
+        if worker_id is None:
+            self.worker_id = Worker.worker_id
+            Worker.update_id()
+        else: # Worker replacing a retired one
+            self.worker_id = worker_id
 
-        self.worker_id = Worker.worker_id
-        Worker.update_id()
-        
-        #self.result = pd.DataFrame(columns=['Filename', 'Nb pages', 'Nb detected', 'Detected pages'])
     
     @classmethod
     def update_id(cls) -> None:
         cls.worker_id += 1
 
     def run(self, CancelProcessEvent: multiprocessing.Event) -> None:
-        output = pd.DataFrame(columns=['Filename', 'Nb pages', 'Nb detected', 'Detected pages', 'N', 'Timestamp'])
-        atpbar.register_reporter(self.reporter)
+        signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl+C is handled by the main process, with CancelProcessEvent
+        if self.reporter is not None:
+            import atpbar
+            atpbar.register_reporter(self.reporter)
+        if self.state is not None:
+            self._lock = threading.RLock()
+            threading.Thread(target=self.flush_overdue, daemon=True).start()
+            if hasattr(signal, 'SIGUSR1'): # Sent by the watchdog after setting STOP
+                signal.signal(signal.SIGUSR1, self.abandon)
         self.logger.put(('started', self.worker_id))
         time.sleep(0.5)
         while True:
             try: # try to catch and print errors in the logger
                 if CancelProcessEvent.is_set():
+                    self.flush()
                     self.logger.put(('info', f"[P{self.worker_id}] Worker has been cancelled"))
                     break
-                try:
-                    pdf_data = self.queue.get_nowait()
-                except multiprocessing.queues.Empty:
-                    if self.option.watch_import:
-                        time.sleep(1)
+                if self.node is not None and os.getppid() != self.parent: # Worker node killed: its leases expire
+                    break
+                if self.pool is not None and self.worker_id > self.pool.value: # Removed by autotune
+                    self.flush()
+                    self.logger.put(('released', self.worker_id))
+                    break
+                start = time.perf_counter()
+                max_tasks = self.option.max_tasks_per_worker - self.n_tasks if self.option.max_tasks_per_worker > 0 else 0
+                # Block until a pdf arrives, or until every pdf (and part of pdf) has been scanned in batch mode. Wake up every second to check CancelProcessEvent
+                bundle = self.queue.get(timeout=1, until_done=not self.option.watch_import, bundle_size=self.option.bundle_size * 1024,
+                                        max_tasks=max_tasks, node=self.node)
+                if not bundle:
+                    self.flush()
+                    if self.option.watch_import or not self.queue.done():
                         continue
                     else:
                         self.logger.put(('info', f"[P{self.worker_id}] Queue is empty: Stoping worker"))
-                        self.result.put(output)
                         break
-                
-                pdf_data = self.scan_task(pdf_data)
-                new_output = self.format_task(pdf_data)
 
-                if self.option.watch_import:
-                    self.result.put(new_output)
-                else:
-                    output = pd.concat([output, new_output], ignore_index=True)
-                self.queue.task_done()
+                self.sync_keywords()
+                if self.state is not None: # The watchdog only knows the current bundle: records of the previous one are sent first
+                    self.flush()
+                self.announce(bundle)
+                for index, pdf_data in enumerate(bundle):
+                    if CancelProcessEvent.is_set(): # Other pdf of the bundle go back to the queue, for the next run or other nodes
+                        self.queue.release(bundle[index:])
+                        break
+                    self.process(pdf_data, start, index)
+                    start = time.perf_counter()
 
-            except pypdf.errors.PdfStreamError:
-                self.logger.put(('error', f"[P{self.worker_id}] Error while reading \"{os.path.basename(pdf_data['path'])}\" file. File will be removed"))
-                os.remove(pdf_data['path'])
-                self.queue.task_done()
+                reason = self.retire_reason()
+                if reason is not None: # Memory of pypdf objects is given back to the system by stopping the process
+                    self.flush()
+                    self.logger.put(('retired', (self.worker_id, reason)))
+                    break
 
             except Exception as error:
                 self.logger.put(('exception', error))
-                try:
-                    self.queue.task_done()
-                except ValueError:
-                    pass
+
+        if self._text_cache is not None: # Access times of the last cache hits
+            self._text_cache.close()
+
+    def process(self, pdf_data: dict, start: float, index: int = 0) -> None:
+        """
+        Scan a pdf, send its result and mark its task as done
+
+        Args:
+            pdf_data (dict): Task of the queue
+            start (float): time.perf_counter() when the worker started waiting for this task
+            index (int): Index of the task in its bundle
+        """
+        if self.state is not None:
+            self.state[INDEX], self.state[PAGE_START], self.state[N_PAGES] = index, 0, 0
+            self.state[TASK_START] = time.time()
+        try:
+            timer = StageTimer()
+            start = timer.lap('wait', start)
+            pdf_data = self.scan_task(pdf_data, timer)
+            start = time.perf_counter()
+            record = self.format_task(pdf_data)
+            start = timer.lap('format', start)
+            self.send(record)
+            timer.lap('send', start)
+            self.logger.put(('metrics', timer.sample()))
+
+        except TaskAbandoned: # file_timeout: retried after the other pdf, or marked as timed out
+            task = retry_task(pdf_data, 0, int(self.state[N_PAGES]), self.logger, self.result, self.shared)
+            if task is not None:
+                self.queue.put(task)
+
+        except pypdf.errors.PdfStreamError:
+            self.logger.put(('error', f"[P{self.worker_id}] Error while reading \"{os.path.basename(pdf_data['path'])}\" file. File will be removed"))
+            os.remove(self.local_path(pdf_data['path']))
+
+        except Exception as error:
+            self.logger.put(('exception', error))
+
+        finally:
+            if self.state is not None: # Before task_done: the watchdog counts the task as done once it is idle
+                self.state[TASK_START], self.state[STOP] = 0, 0
+                with self._lock:
+                    self._covered = index + 1
+                    if not self._batch:
+                        self.state[SENT] = self._covered
+            self.n_tasks += 1
+            self.queue.task_done(lease=pdf_data.get('lease'))
+
+    def retire_reason(self) -> str | None:
+        """
+        Returns:
+            str | None: Reason to replace this worker by a new process (max_tasks_per_worker or max_worker_memory reached), None to keep it
+        """
+        if self.n_tasks == 0:
+            return None
+        if self.option.max_tasks_per_worker > 0 and self.n_tasks >= self.option.max_tasks_per_worker:
+            return f"{self.n_tasks} tasks done"
+        if self.option.max_worker_memory > 0 and (rss := current_rss()) > self.option.max_worker_memory * 1024**2:
+            return f"{rss / 1024**2:.0f} Mo used"
+        return None
+
+    def send(self, record: ScanRecord) -> None:
+        """
+        Write a record in the journal and add it to the batch sent to the renderer. The batch is sent when it reaches
+        result_batch_size records or when its first record is older than result_batch_latency seconds
+
+        Args:
+            record (ScanRecord): Record to send
+        """
+        with self._lock:
+            journal = self.journal()
+            if journal is not None:
+                journal.append(record)
+            if not self._batch:
+                self._batch_start = time.monotonic()
+            self._batch.append(record)
+            if self.state is not None:
+                self._covered = int(self.state[INDEX]) + 1
+            if len(self._batch) >= self.option.result_batch_size or time.monotonic() - self._batch_start >= self.option.result_batch_latency:
+                self.flush()
+
+    def flush(self) -> None:
+        """
+        Send the current batch of records to the renderer. The watchdog requeues the tasks of the bundle after SENT
+        if it kills this worker
+        """
+        with self._lock:
+            if self._batch:
+                if self._journal is not None:
+                    self._journal.sync()
+                self.result.put(self._batch)
+                self._batch = []
+            if self.state is not None:
+                self.state[SENT] = self._covered
+
+    def flush_overdue(self) -> None:
+        """
+        Thread sending the batch while a pdf takes more than half of its time budget,
+        so previous pdf of the bundle are not scanned again if the watchdog kills this worker
+        """
+        budget = min(timeout for timeout in (self.option.page_timeout, self.option.file_timeout) if timeout > 0)
+        while True:
+            time.sleep(budget / 4)
+            task_start = self.state[TASK_START]
+            if task_start > 0 and time.time() - task_start > budget / 2:
+                self.flush()
+
+    def abandon(self, signum: int, frame) -> None:
+        """
+        SIGUSR1 handler. The watchdog asks to abandon the page or the pdf exceeding its time budget:
+        the scan is interrupted if it is in an interruptible section, otherwise at the next one
+        """
+        if self._interruptible:
+            self.check_stop()
+
+    def check_stop(self) -> None:
+        """
+        Raises:
+            TaskAbandoned: If the watchdog asked to abandon the pdf, or the page being scanned
+        """
+        if self.state[STOP] > 0:
+            page = int(self.state[STOP_PAGE])
+            if page == 0 or page == self.state[PAGE]:
+                raise TaskAbandoned(page)
+            self.state[STOP] = 0 # Page scanned meanwhile
+
+    @contextlib.contextmanager
+    def interruptible(self):
+        """
+        Section of the scan of a pdf which the watchdog can interrupt (see abandon). It must not write in a queue:
+        an interrupted put would leave a message half written
+        """
+        if self.state is None:
+            yield
+            return
+        self._interruptible = True
+        try:
+            self.check_stop()
+            yield
+        finally:
+            self._interruptible = False
+
+    def sync_keywords(self) -> None:
+        """
+        Use the keywords reloaded by the main process when keyword_file changes (see Scheduler.set_keywords)
+        """
+        keywords = self.queue.get_keywords(self.keywords_version)
+        if keywords is not None:
+            self.keywords_version, (self.option.keywords, self.option.profile_keywords) = keywords
+            self.option.matcher = KeywordMatcher(self.option.keywords)
+            self.option.scorer = ProfileScorer.from_option(self.option)
+
+    def announce(self, bundle: list) -> None:
+        """
+        Send the tasks of the current bundle to the watchdog, which requeues them if this worker is killed
+
+        Args:
+            bundle (list): Tasks of the bundle
+        """
+        if self.state is None:
+            return
+        if bundle is not self._bundle:
+            self._bundle = bundle
+            with self._lock:
+                self._covered, self.state[SENT] = 0, 0
+            self.state[BUNDLE] += 1
+        self.logger.put(('bundle', (self.worker_id, int(self.state[BUNDLE]), bundle)))
     
     def test(self):
+        import atpbar
         for _ in atpbar.atpbar(range(50), name=f"{self.worker_id}"):
             time.sleep(0.5)  
     
-    def scan_task(self, pdf_data: dict) -> dict:
-        with open(pdf_data['path'], 'rb') as pdfFileObj:
-            pdf = pypdf.PdfReader(pdfFileObj)
+    def scan_task(self, pdf_data: dict, timer: StageTimer = None) -> dict:
+        """
+        Args:
+            pdf_data (dict): Task of the queue
+            timer (StageTimer): Timer of the stages of this pdf. None to not time them
+
+        Returns:
+            dict: pdf_data with the detected pages
+        """
+        timer = timer if timer is not None else StageTimer()
+        start = time.perf_counter()
+        cache = self.text_cache()
+        path = self.local_path(pdf_data['path'])
+        doc_hash = pdf_data.get('hash') or file_hash(path)
+        n_pages, cached_pages = cache.get_document(doc_hash) if cache is not None else (None, {})
+        new_pages = {}
+        texts = {} # Normalized text of every page of the range, for the n-gram index
+        start = timer.lap('cache', start)
+
+        with contextlib.ExitStack() as stack:
+            pdf = None
+            if n_pages is None or len(cached_pages) < n_pages: # Open the pdf only if some pages are not in cache
+                # Memory-mapped: workers scanning parts of the same pdf share the OS page cache instead of copying the file
+                pdfFileObj = stack.enter_context(open(path, 'rb'))
+                with self.interruptible():
+                    pdf = pypdf.PdfReader(stack.enter_context(mmap.mmap(pdfFileObj.fileno(), 0, access=mmap.ACCESS_READ)))
+                    n_pages = len(pdf.pages)
+                    extractor = Extractor(self.backends(), path, pdf, timer.backends)
+                stack.callback(extractor.close)
+            if self.state is not None:
+                self.state[N_PAGES] = n_pages
+            start = timer.lap('open', start)
 
             pdf_data.update({
+                "hash": doc_hash,
                 "filename": os.path.basename(pdf_data['path']),
-                "abs_path": os.path.abspath(pdf_data['path']),
-                "n_pages": len(pdf.pages),
-                "detected_page": pd.DataFrame({'Page': [], 'Score': []})
+                "abs_path": self.shared.abs_path(pdf_data['path']) if self.shared is not None else os.path.abspath(pdf_data['path']),
+                "n_pages": n_pages,
+                "pages": array('I'),
+                "scores": array('q'),
+                "timed_out": array('I'),
+                "counted": array('I'),
+                "exact": bytearray(),
+                "words": self.option.scorer.words,
+                "profiles": [(array('I'), array('q')) for _ in self.option.profiles],
+                "partial": 0
             })
+            counts = [] # Keyword counts of each counted page
+
+            # Split large pdf in page ranges, other workers scan the next ranges. Not with partial scans, which stop early
+            partial_scan = self.option.max_hits > 0 or self.option.max_pages > 0
+            if 'range' not in pdf_data and not partial_scan and self.option.split_pages > 0 and n_pages - len(cached_pages) > self.option.split_pages:
+                ranges = [(start, min(start + self.option.split_pages, n_pages)) for start in range(0, n_pages, self.option.split_pages)]
+                size = os.path.getsize(path)
+                for part, page_range in enumerate(ranges[1:], 1):
+                    self.queue.put({
+                        "path": pdf_data['path'],
+                        "timestamp": pdf_data['timestamp'],
+                        "url": pdf_data['url'],
+                        "hash": doc_hash,
+                        "priority": pdf_data.get('priority', False),
+                        "retry": pdf_data.get('retry', False),
+                        "timed_out_pages": pdf_data.get('timed_out_pages', []),
+                        "range": page_range,
+                        "part": part,
+                        "n_parts": len(ranges)
+                    }, size * (page_range[1] - page_range[0]) // n_pages)
+                pdf_data.update({"range": ranges[0], "part": 0, "n_parts": len(ranges)})
+                self.logger.put(('info', f"[P{self.worker_id}] {pdf_data['filename']} has {n_pages} pages. Splitting it in {len(ranges)} parts"))
+                self.announce(self._bundle) # The watchdog must not split the pdf again if it requeues this task
+
+            first_page, last_page = pdf_data.get('range', (0, n_pages))
+            name = f"[P{self.worker_id}] {pdf_data['filename']}"
+            if 'range' in pdf_data:
+                name += f" ({pdf_data['part'] + 1}/{pdf_data['n_parts']})"
+            timer.name = name.split('] ', 1)[1]
+
+            skipped = set(pdf_data.get('timed_out_pages', ()))
+            n_hits = 0
+            for n_scanned, k in enumerate(self.progress(self.page_order(first_page, last_page), name)):
+                if partial_scan and self.stop_early(pdf_data, n_scanned):
+                    pdf_data['partial'] = n_scanned
+                    break
+                page_start = start = time.perf_counter()
+                if k+1 in skipped: # Page that timed out in a worker killed by the watchdog
+                    pdf_data['timed_out'].append(k+1)
+                    continue
+                if self.state is not None:
+                    self.state[PAGE], self.state[PAGE_START] = k+1, time.time()
+                try:
+                    with self.interruptible():
+                        text = cached_pages.get(k)
+                        if text is None and self.option.prefilter:
+                            raw, raw_counts = self.upper_bound(pdf.pages[k])
+                            start = timer.lap('prefilter', start)
+                            if raw is not None and not self.option.scorer.can_detect(raw_counts): # The page can not be detected: no extraction
+                                texts[k] = raw
+                                if self.option.count_matrix:
+                                    pdf_data['counted'].append(k+1)
+                                    pdf_data['exact'].append(0)
+                                    counts.append(raw_counts)
+                                timer.page(k+1, start - page_start, pruned=True)
+                                self.release_page(pdf, k)
+                                continue
+                        if text is None:
+                            text = extractor.text(k)
+                            timer.memory(current_rss())
+                            self.release_page(pdf, k)
+                            start = timer.lap('extract', start)
+                            text = KeywordMatcher.normalize(text)
+                            new_pages[k] = text
+                            start = timer.lap('normalize', start)
+                        else:
+                            n_hits += 1
+                        texts[k] = text
+                        page_counts = self.option.scorer.count(text)
+                        if self.option.count_matrix:
+                            pdf_data['counted'].append(k+1)
+                            pdf_data['exact'].append(1)
+                            counts.append(page_counts)
+                        score, *profile_scores = self.option.scorer.scores(page_counts)
+                        if score >= self.option.threshold:
+                            pdf_data['pages'].append(k+1) # +1 car les pdf commence page 1 dans les Reader
+                            pdf_data['scores'].append(score)
+                        for (pages, scores), profile_score, threshold in zip(pdf_data['profiles'], profile_scores, self.option.scorer.thresholds[1:]):
+                            if profile_score >= threshold:
+                                pages.append(k+1)
+                                scores.append(profile_score)
+                        timer.page(k+1, timer.lap('score', start) - page_start)
+                except TaskAbandoned as abandoned:
+                    if abandoned.page == 0: # file_timeout: the whole pdf is abandoned (see process)
+                        raise
+                    self.state[PAGE_START], self.state[STOP] = 0, 0
+                    pdf_data['timed_out'].append(k+1)
+                    self.logger.put(('timeout', (pdf_data['filename'], f"page {k+1} exceeded page_timeout. Skipping it")))
+
+        if counts: # Compact: larger counts are saturated
+            pdf_data['counts'] = np.minimum(np.vstack(counts), np.iinfo(np.uint16).max - 1).astype(np.uint16).tobytes()
+
+        if cache is not None:
+            start = time.perf_counter()
+            if new_pages:
+                cache.put_document(doc_hash, n_pages, new_pages)
+            timer.lap('cache', start)
+            self.logger.put(('cache', (n_hits, len(new_pages))))
 
-            for k in atpbar.atpbar(range(pdf_data['n_pages']), name=f"[P{self.worker_id}] {pdf_data['filename']}"):
-                text = pdf.pages[k].extract_text()
-                score = self.analyse_text(text)
-                if score >= self.option.threshold:
-                    pdf_data['detected_page'] = pd.concat([
-                        pdf_data['detected_page'], 
-                        pd.DataFrame({'Page': [k+1], 'Score': [score]}) # +1 car les pdf commence page 1 dans les Reader
-                    ])
+        index = self.ngram_index()
+        if index is not None and pdf_data['partial'] == 0: # A chunk is indexed once: only with the text of every page
+            start = time.perf_counter()
+            index.put(pdf_data['filename'], doc_hash, first_page, last_page, texts)
+            timer.lap('index', start)
 
         return pdf_data
 
+    def page_order(self, first_page: int, last_page: int) -> list:
+        """
+        Args:
+            first_page (int): Index of the first page to scan
+            last_page (int): Index after the last page to scan
+
+        Returns:
+            list: Indexes of the pages, in the order of Option.page_order
+        """
+        pages = list(range(first_page, last_page))
+        if self.option.page_order == 'reverse':
+            pages.reverse()
+        elif self.option.page_order == 'last_third':
+            split = len(pages) - len(pages) // 3
+            pages = pages[split:] + pages[:split]
+        return pages
+
+    def stop_early(self, pdf_data: dict, n_scanned: int) -> bool:
+        """
+        Args:
+            pdf_data (dict): Task being scanned, with the pages detected so far
+            n_scanned (int): Number of pages already scanned
+
+        Returns:
+            bool: True if the scan of the pdf can stop: max_pages pages scanned or max_hits pages detected for every profile
+        """
+        if self.option.max_pages > 0 and n_scanned >= self.option.max_pages:
+            return True
+        return self.option.max_hits > 0 and min(len(pages) for pages in [pdf_data['pages'], *(pages for pages, _ in pdf_data['profiles'])]) >= self.option.max_hits
+
+    @staticmethod
+    def release_page(pdf: pypdf.PdfReader, k: int) -> None:
+        """
+        Remove the content stream of a scanned page from the reader cache, so its decoded data can be freed.
+        Objects shared by pages (fonts, images) stay in cache
+
+        Args:
+            pdf (pypdf.PdfReader): Reader of the pdf
+            k (int): Index of the page
+        """
+        contents = pdf.pages[k].raw_get('/Contents') if '/Contents' in pdf.pages[k] else None
+        refs = [contents]
+        if isinstance(contents, IndirectObject) and isinstance(contents.get_object(), ArrayObject):
+            refs.extend(contents.get_object())
+        elif isinstance(contents, ArrayObject):
+            refs = list(contents)
+        for ref in refs:
+            if isinstance(ref, IndirectObject):
+                pdf.resolved_objects.pop((ref.generation, ref.idnum), None)
+
+    def local_path(self, path: str) -> str:
+        """
+        Args:
+            path (str): Path of a pdf of the queue
+
+        Returns:
+            str: Path to read the pdf in this process (the shared storage on a worker node)
+        """
+        return self.shared.local_path(path) if self.shared is not None else path
+
+    def progress(self, pages: range, name: str):
+        """
+        Args:
+            pages (range): Pages to scan
+            name (str): Name of the progress bar
+
+        Returns:
+            Iterable: pages, wrapped in an atpbar progress bar when a reporter is given
+        """
+        if self.reporter is None:
+            return pages
+        import atpbar
+        return atpbar.atpbar(pages, name=name)
+
+    def text_cache(self) -> TextCache | None:
+        """
+        Open the text cache of this worker. The connection is opened lazily, inside the worker process
+
+        Returns:
+            TextCache | None: Text cache, None if disabled
+        """
+        if self.option.cache_size > 0 and self._text_cache is None:
+            self._text_cache = TextCache(os.path.join(self.option.data_folder, 'cache'), self.option.cache_size * 1024**2,
+                                         ','.join(backend.name for backend in self.backends()))
+        return self._text_cache
+
+    def backends(self) -> list:
+        """
+        Returns:
+            list: Text extraction backends of this worker, in order of preference (see Option.backends)
+        """
+        if self._backends is None:
+            self._backends = select_backends(self.option.backends)
+        return self._backends
+
+    def ngram_index(self) -> NgramIndex | None:
+        """
+        Open the n-gram index lazily, inside the worker process
+
+        Returns:
+            NgramIndex | None: N-gram index, None if disabled
+        """
+        if self.option.ngram_index and self._ngram_index is None:
+            self._ngram_index = NgramIndex(os.path.join(self.option.data_folder, 'index'), self.option.ngram_index_size * 1024**2)
+        return self._ngram_index
+
+    def journal(self) -> Journal | None:
+        """
+        Open the segment of this worker in the journal lazily, inside the worker process
+
+        Returns:
+            Journal | None: Journal, None if disabled or on a worker node (its tasks are requeued by the coordinator)
+        """
+        if self.option.journal and self.node is None and self._journal is None:
+            self._journal = Journal(os.path.join(self.option.data_folder, 'journal'))
+        return self._journal
+
+    def upper_bound(self, page: pypdf.PageObject) -> tuple:
+        """
+        Args:
+            page (pypdf.PageObject): Page of the pdf
+
+        Returns:
+            tuple: Normalized text of the page read from its content stream and its keyword counts (see Option.scorer),
+                an upper bound of the counts of its extracted text. (None, None) if it can not be trusted
+        """
+        text = raw_text(page)
+        if text is None:
+            return None, None
+        text = KeywordMatcher.normalize(text)
+        return text, self.option.scorer.count(text)
+
     def analyse_text(self, text: str) -> int:
-        text = unidecode(text).lower() # Retrait des accents et mise en minuscule
-        text = re.sub('\s+','',text) # Retrait des espaces
-
-        def counter(text: str, row: pd.Series) -> int:        
-            if row['Nb min'] <= text.count(row['Word']) <= row['Nb max']:
-                return row['Score if true']
-            else:
-                return row['Score if false']
-            
-        return self.option.keywords.apply(lambda x: counter(text, x), axis=1).sum()
-
-    def format_task(self, pdf_data: dict) -> pd.DataFrame:
-        best_score = pdf_data['detected_page']['Score'].max()
-        
-        if len(pdf_data['detected_page']) > 0:
-            pdf_data['detected_page']['Page'] = pdf_data['detected_page'].apply(
-                lambda x: '<a class="{max_score}" title="Score: {score}" href="{abs_path}#page={page}" target="_blank">{page}</a>'.format(
-                    abs_path=pdf_data['abs_path'],
-                    page=int(x['Page']),
-                    score=x['Score'],
-                    max_score='max-score' if x['Score'] == best_score else ''
-                ),
-                axis=1
-            )
-            pdf_data['detected_page'].sort_values(by='Score', ascending=False, inplace=True)
-        else:
-            pdf_data['detected_page']['Page'] = ""
-
-        pdf_data['url'] = f'<a class="filename" href="{pdf_data["url"]}" target="_blank">{pdf_data["filename"]}</a>'
-
-        return pd.DataFrame({
-            'Filename': [pdf_data['filename']],
-            'Url': [pdf_data['url']],
-            'Nb pages': [pdf_data['n_pages']],
-            'Nb detected': [len(pdf_data['detected_page'])],
-            'Detected pages': [' '.join(list(pdf_data['detected_page']['Page']))],
-            'N': [True],
-            'Timestamp': [pdf_data['timestamp']]
-        })
\ No newline at end of file
+        return self.option.matcher.score(text)
+
+    @staticmethod
+    def format_task(pdf_data: dict) -> ScanRecord:
+        return ScanRecord(
+            path=pdf_data['path'],
+            filename=pdf_data['filename'],
+            abs_path=pdf_data['abs_path'],
+            url=pdf_data['url'],
+            timestamp=pdf_data['timestamp'],
+            hash=pdf_data['hash'],
+            n_pages=pdf_data['n_pages'],
+            pages=pdf_data['pages'],
+            scores=pdf_data['scores'],
+            part=pdf_data.get('part', 0),
+            n_parts=pdf_data.get('n_parts', 1),
+            timed_out=pdf_data.get('timed_out'),
+            counted=pdf_data.get('counted'),
+            exact=bytes(pdf_data.get('exact', b'')),
+            counts=pdf_data.get('counts', b''),
+            words=pdf_data.get('words', ()),
+            profiles=pdf_data.get('profiles'),
+            partial=pdf_data.get('partial', 0)
+        )
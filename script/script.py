@@ -1,24 +1,40 @@
-import logging, colorlog
-import re, os, atpbar, time
+import logging
+import re, os, time, signal
 import multiprocessing, threading
+from queue import Queue
 import pandas as pd
 from datetime import datetime
 from unidecode import unidecode
-from ipywidgets import Label
 
-from .pdf_scan.worker import Worker
-from .pdf_scan.render_data import render_data
+from .pdf_scan.supervisor import Supervisor
+from .pdf_scan.autotune import Autotuner
+from .pdf_scan.render_data import Renderer, RESCORE, STOP
+from .pdf_scan.count_matrix import CountMatrix
+from .pdf_scan.journal import Journal
+from .pdf_scan.record import ScanRecord, records_to_dataframe
+from .pdf_scan.keyword_matcher import KeywordMatcher, ProfileScorer
+from .pdf_scan.manifest import Manifest
+from .pdf_scan.result_store import ResultStore
+from .pdf_scan.folder_watcher import FolderWatcher
+from .pdf_scan.metrics import Metrics
+from .pdf_scan.backends import select_backends
+from .pdf_scan.ngram_index import NgramIndex
+from .pdf_scan.coordinator import serve
+from .pdf_scan.scheduler import Scheduler, SchedulerManager
 
-def initialize(logger: logging.Logger) -> tuple:
+def initialize(logger: logging.Logger, widgets: bool = True) -> tuple:
     """
     Function to initialize the script
 
     Args:
         logger (logging.Logger): Logger object
+        widgets (bool): Create the widget label showing the last render. False when running without jupyter
 
     Returns:
         tuple: Tuple containing start_time, logger, queue, qresult, CancelProcessEvent and render_date_label
     """
+    import colorlog
+
     # Setup
     start_time = datetime.now()
 
@@ -27,15 +43,60 @@ def initialize(logger: logging.Logger) -> tuple:
     handler.setFormatter(colorlog.ColoredFormatter('%(log_color)s[%(levelname)s] %(message)s'))
     logger.addHandler(handler)
 
-    queue = multiprocessing.JoinableQueue()
-    qresult = multiprocessing.SimpleQueue()
+    manager = SchedulerManager() # Kept alive by the queue proxy
+    manager.start(signal.signal, (signal.SIGINT, signal.SIG_IGN)) # Ctrl+C is handled by the main process
+    queue = manager.Scheduler()
+    qresult = Queue() # Only put by the main process: threads relaying the results of workers, the coordinator and the widgets
 
     CancelProcessEvent = multiprocessing.Event()
 
-    render_date_label = Label(value="")
+    if widgets:
+        from ipywidgets import Label # Imported only when needed: slow to import and not available without jupyter
+        render_date_label = Label(value="")
+    else:
+        render_date_label = None
 
     return(start_time, logger, queue, qresult, CancelProcessEvent, render_date_label)
 
+def load_keywords(option, logger: logging.Logger) -> None:
+    """
+    Read keyword_file in option.keywords and the keyword files of option.profiles in option.profile_keywords,
+    then compile option.matcher and option.scorer
+
+    Args:
+        option (Option): Option object
+        logger (logging.Logger): Logger object
+    """
+    option.keywords = read_keywords(option.keyword_file, option.check_keyword, logger)
+    option.profile_keywords = {name: read_keywords(keyword_file, option.check_keyword, logger) for name, (keyword_file, _) in option.profiles.items()}
+    option.matcher = KeywordMatcher(option.keywords) # Compiled once, used by every worker
+    option.scorer = ProfileScorer.from_option(option)
+
+def read_keywords(keyword_file: str, check_keyword: bool, logger: logging.Logger) -> pd.DataFrame:
+    """
+    Args:
+        keyword_file (str): Csv file of keywords
+        check_keyword (bool): Check that keywords are correctly formatted (see Option.check_keyword)
+        logger (logging.Logger): Logger object
+
+    Returns:
+        pd.DataFrame: Keywords (Word, Nb min, Nb max, Score if true, Score if false)
+    """
+    keywords = pd.read_csv(keyword_file, dtype={'Word': str, 'Nb min': float, 'Nb max': float, 'Score if true': int, 'Score if false': int})
+    
+    # Check if keywords are correctly formatted
+    if check_keyword:
+        logger.info(f"Checking keywords of {keyword_file}")
+        for index, row in keywords.iterrows():
+            if row['Nb min'] > row['Nb max']:
+                raise ValueError(f"Word {row['Word']} has a min value greater than max value")
+            text = unidecode(row['Word']).lower() # Retrait des accents et mise en minuscule
+            text = re.sub('\s+','',text) # Retrait des espaces
+            if text != row['Word']:
+                logger.warning(f"Word \"{row['Word']}\" contains spaces or accents. It has been replaced by \"{text}\"")
+                keywords.at[index, 'Word'] = text
+    return keywords
+
 def main(opt, ini: tuple) -> list:
     """
     Main function of the script
@@ -63,110 +124,302 @@ def main(opt, ini: tuple) -> list:
 
     global option
     option = opt
-    #option.keywords = pd.DataFrame(columns=['Word', 'Nb min', 'Nb max', 'Score if true', 'Score if false'],
-    #            data=option.keywords)
-    option.keywords = pd.read_csv(option.keyword_file, dtype={'Word': str, 'Nb min': float, 'Nb max': float, 'Score if true': int, 'Score if false': int})
-    
-    # Check if keywords are correctly formatted
-    if option.check_keyword:
-        logger.info("Checking keywords")
-        for index, row in option.keywords.iterrows():
-            if row['Nb min'] > row['Nb max']:
-                raise ValueError(f"Word {row['Word']} has a min value greater than max value")
-            text = unidecode(row['Word']).lower() # Retrait des accents et mise en minuscule
-            text = re.sub('\s+','',text) # Retrait des espaces
-            if text != row['Word']:
-                logger.warning(f"Word \"{row['Word']}\" contains spaces or accents. It has been replaced by \"{text}\"")
-                option.keywords.at[index, 'Word'] = text
+    load_keywords(option, logger)
+    logger.info(f"Text extraction backends: {', '.join(backend.name for backend in select_backends(option.backends))}")
 
-    # Load old data
+    # Load old results
+    store = ResultStore(option.data_folder)
     if option.force_scan and option.clear_when_force_scan:
-        old_data = pd.DataFrame(columns=['Filename', 'Url', 'Nb pages', 'Nb detected', 'Detected pages', 'N', 'Timestamp'])
-        logger.warning("Clearing save.csv file and force scanning all pdf")
-    
-    elif os.path.isfile(option.data_folder + 'save.csv'):
-        with open(option.data_folder + 'save.csv', 'r') as f:
-            old_data = pd.read_csv(f, index_col=False, dtype={'Filename': str, 'Nb pages': int, 'Nb detected': int, 'Detected pages': str, 'N': bool, 'Timestamp': str})
-            old_data['N'] = False
-            old_data['Timestamp'] = pd.to_datetime(old_data['Timestamp'])
-            logger.info(f"Loaded {len(old_data)} sets from save.csv")
-    else:
-        old_data = pd.DataFrame(columns=['Filename', 'Nb pages', 'Nb detected', 'Detected pages', 'N', 'Timestamp'])
-        logger.warning("No save.csv file found")
-    old_data['N'] = False
+        store.clear()
+        logger.warning("Clearing saved results and force scanning all pdf")
+    elif (n_imported := store.migrate(option.data_folder + 'save.csv')) > 0:
+        logger.info(f"Imported {n_imported} sets from save.csv")
+    store.reset_new()
+    logger.info(f"Loaded {len(store)} sets from saved results")
 
-    # Scan pdf in pdf_folder and add all pdf to queue
-    n_skip = 0
+    # Compare pdf_folder with the manifest (size, mtime and content hash of each pdf)
     logger.info(f"Scanning {option.pdf_folder} for pdf files")
-    for pdf in os.listdir(option.pdf_folder):
+    manifest = Manifest(option.data_folder)
+    files, deleted = manifest.refresh(option.pdf_folder)
+    manifest.close()
+    index = NgramIndex(option.data_folder + 'index') if option.ngram_index else None
+    if deleted:
+        logger.info(f"{len(deleted)} pdf files have been deleted since the last run. Removing their results")
+        store.delete(deleted)
+        if index is not None:
+            index.delete(deleted)
+
+    # Save results of pdf scanned by an interrupted run, before it rendered them
+    matrix = CountMatrix(option.data_folder + 'counts') if option.count_matrix else None
+    journal = Journal(option.data_folder + 'journal')
+    if not (option.force_scan and option.clear_when_force_scan) and (n_replayed := replay_journal(journal, store, matrix, files, option)) > 0:
+        logger.info(f"Recovered {n_replayed} results of an interrupted run from the journal")
+    journal.clear()
+
+    # Score saved results again if keyword_file or threshold changed since they were rendered
+    if matrix is not None:
+        if option.force_scan and option.clear_when_force_scan:
+            matrix.clear()
+        elif not option.force_scan and matrix.scoring_changed(option):
+            n_updated, rescan = 0, set()
+            for profile in ['', *option.profiles]:
+                updated, profile_rescan = matrix.rescore(store.to_dataframe(profile), option.profile(profile) if profile else option,
+                                                         index.texts if index is not None else None)
+                store.upsert(updated, profile)
+                n_updated += len(updated)
+                rescan.update(profile_rescan)
+            store.mark_stale(rescan)
+            logger.info(f"Keywords or threshold have changed: {n_updated} results updated from the count matrix, {len(rescan)} pdf to scan again")
+        matrix.save_scoring(option)
+    if option.max_hits == 0 and option.max_pages == 0 and (partial := store.partial()):
+        logger.info(f"{len(partial)} results come from partial scans (max_hits, max_pages). Scanning their pdf fully")
+        store.mark_stale(partial)
+    scanned = store.hashes()
+    unknown_hash = {pdf: files[pdf] for pdf, h in scanned.items() if h == '' and pdf in files} # Results saved without hash are trusted by filename
+    store.set_hashes(unknown_hash)
+    scanned.update(unknown_hash)
+    by_hash = {h: pdf for pdf, h in scanned.items()}
+
+    # Add new or changed pdf to queue. Reuse results of byte identical pdf
+    n_skip = 0
+    duplicates = []
+    for pdf, h in files.items():
         path = os.path.join(option.pdf_folder, pdf)
-        if not path.endswith('.pdf'): # Ignore non pdf files
-            continue
-        if (not option.force_scan) and (pdf in old_data['Filename'].values): # Ignore already scanned pdf
-            n_skip += 1
-            continue
+        if not option.force_scan:
+            if scanned.get(pdf) == h: # Ignore already scanned pdf
+                n_skip += 1
+                continue
+            if h in by_hash: # Same content already scanned under another name
+                logger.info(f"{pdf} is identical to {by_hash[h]}. Reusing its results")
+                for profile in ['', *option.profiles]:
+                    duplicates.append((profile, copy_result(store.get(by_hash[h], profile), pdf)))
+                if index is not None:
+                    index.link(pdf, h)
+                continue
         logger.info(f"Adding {pdf} to queue")
-        queue.put({"path": os.path.relpath(path), "timestamp": datetime.now(), "url": ""})
+        submit_pdf(queue, path, hash=h)
+    for profile in ['', *option.profiles]:
+        if rows := [row for row_profile, row in duplicates if row_profile == profile]:
+            store.upsert(pd.DataFrame(rows), profile)
+    if index is not None:
+        index.close()
 
     # Initialize workers
+    n_thread = max(option.n_workers, 1)
+    if option.autotune: # Number of workers chosen by the last run
+        low, high = Autotuner.bounds(option)
+        n_thread = Autotuner.load(option) or min(max(n_thread, low), high)
     if option.watch_import:
-        n_thread = max(option.n_workers, 1)
         logger.info(f">> Watching {option.pdf_folder} for new pdf and scans")
     else:
-        n_thread = min(max(option.n_workers, 1), queue.qsize())
+        if option.split_pages == 0 or queue.qsize() == 0: # Otherwise a single large pdf is shared by every worker
+            n_thread = min(n_thread, queue.qsize())
+    if option.coordinator: # Worker nodes can do the whole scan
+        n_thread = min(n_thread, option.n_workers)
 
     n_pdf = queue.qsize()
-    logger.info(f">> {n_skip} pdf files have been skipped")
+    logger.info(f">> {n_skip} pdf files have been skipped, {len(duplicates) // (1 + len(option.profiles))} reused from identical pdf")
     if option.watch_import:
         logger.info(f">> Adding {n_pdf} sets into a data queue that {n_thread} workers will work. Watching enabled for new pdf...")
     else:
         logger.info(f">> Adding {n_pdf} sets into a data queue that {n_thread} workers will work from until empty")
 
     as_started = [False for _ in range(n_thread)]
-    process = []
-    reporter = atpbar.find_reporter()
+    if option.progress_bar:
+        import atpbar # Imported only when needed: atpbar imports ipywidgets
+        reporter = atpbar.find_reporter()
+    else:
+        reporter = None
     qlog = multiprocessing.SimpleQueue()
-    threading.Thread(target=qlogger, args=(as_started, qlog, logger, CancelProcessEvent)).start()
-    for i in range(len(as_started)):
-        work = Worker(option, qresult, qlog, queue, reporter)
-        p = multiprocessing.Process(target=work.run, args=(CancelProcessEvent,), name=f"P{i+1}")
-        p.start()
-        process.append(p)
+    metrics = Metrics()
+    supervisor = Supervisor(option, qresult, qlog, queue, CancelProcessEvent, reporter)
+    logging_thread = threading.Thread(target=qlogger, args=(as_started, qlog, logger, metrics, supervisor), daemon=True)
+    logging_thread.start()
+    if option.coordinator:
+        serve(option, queue, qresult, qlog, logger, CancelProcessEvent)
+    process = supervisor.start(len(as_started))
     
     while not all(as_started): # Wait for all workers to start
         time.sleep(0.1)
+    if option.autotune and process:
+        logger.info(f"Autotune: starting with {len(process)} workers, between {' and '.join(map(str, Autotuner.bounds(option)))}")
+        threading.Thread(target=Autotuner(option, supervisor, queue, metrics, as_started, logger, CancelProcessEvent).run, daemon=True).start()
 
     # Depend if we watch for new pdf and scans or not
     if option.watch_import:
-        # Watch for new pdf and scans
-        threading.Thread(target=watcher, args=(CancelProcessEvent, logger, option, qresult, start_time, old_data, render_date_label)).start()
+        if option.watch_folder: # Pdf added to pdf_folder by other tools
+            FolderWatcher(option.pdf_folder, lambda path: submit_pdf(queue, path), CancelProcessEvent, logger).start()
+
+        # Watch for new pdf and scans. Not a daemon: the last results are rendered before the process exits (see stop_workers)
+        threading.Thread(target=watcher, args=(logger, option, queue, qresult, journal, start_time, store, render_date_label, metrics)).start()
+        threading.Thread(target=keyword_watcher, args=(CancelProcessEvent, logger, option, queue, qresult), daemon=True).start()
 
     else:
         # Only one scan, wait for all workers to finish
-        queue.join()
-        atpbar.flush() # Flush atpbar (progress bar)
+        renderer = Renderer(option, start_time, store, render_date_label, metrics)
+        row_result = []
+        try:
+            queue.join()
+            # Workers send their last results when they stop. Read them meanwhile: a process does not stop before its results are read
+            while not supervisor.join(timeout=0.1):
+                row_result.extend(renderer.collect(qresult))
+            while option.coordinator and not queue.wait_nodes(0.1): # Worker nodes send their last results before leaving
+                row_result.extend(renderer.collect(qresult))
+        except KeyboardInterrupt:
+            logger.warning("Interrupted: workers stop after their current pdf. Pdf not scanned yet are scanned at the next start")
+            CancelProcessEvent.set()
+            while not supervisor.join(timeout=0.1):
+                row_result.extend(renderer.collect(qresult))
+        qlog.put(('stop', None)) # After the last messages of the workers: their metrics are all counted
+        logging_thread.join()
+        if option.progress_bar:
+            atpbar.flush() # Flush atpbar (progress bar)
         logger.info("All workers have finished")
+        if option.cache_size > 0:
+            n_cache = max(1, metrics.cache_hits + metrics.cache_misses)
+            logger.info(f"Text cache: {metrics.cache_hits} hits, {metrics.cache_misses} misses ({metrics.cache_hits / n_cache:.0%} hit rate)")
 
         # Render data
-        render_data(option, qresult, start_time, old_data)
-        logger.info(f"Results have been written to {option.result_file}")
+        renderer.render(row_result + renderer.collect(qresult))
+        journal.truncate(lambda record: rendered(renderer.store, record)) # Records of a killed worker not received are kept for the next start
+        store.export(option.data_folder + 'save.csv', option.pdf_folder)
+        logger.info(f"Time by stage: {metrics.summary()}")
+        logger.info(f"Extraction backends: {metrics.backends_summary()}")
+        logger.info(f"Results have been written to {option.result_file}, metrics to {option.data_folder}metrics.json and metrics.prom")
         logger.info(f"Program finished in {str(datetime.now() - start_time).split('.')[0]}")
 
     return process # Return process to be able to cancel them with the cancel button
 
-def qlogger(as_started: list, qlog: multiprocessing.SimpleQueue, logger: logging.Logger, CancelProcessEvent: multiprocessing.Event) -> None:
+_submitted = {} # {absolute path: (size, modification time, url)} of pdf put in the queue by submit_pdf
+_submit_lock = threading.Lock() # submit_pdf is called by the folder watcher, the widget and bulk_import threads
+
+def submit_pdf(queue: Scheduler, path: str, url: str = "", rescan: bool = False, **task) -> bool:
+    """
+    Put a pdf in the queue, unless this version of the file has already been put by another source
+    (initial scan, folder watcher or widget). If the previous submission had no url, the url is given to its waiting task,
+    or to its result when it is rendered (see watcher)
+
+    Args:
+        queue (Scheduler): Queue of pdf to scan
+        path (str): Path of the pdf
+        url (str): Url of the pdf, empty if unknown
+        rescan (bool): Put the pdf even if this version has already been put (keywords reloaded)
+        **task: Other values of the task (hash, priority)
+
+    Returns:
+        bool: True if the pdf has been put in the queue
+    """
+    stat = os.stat(path)
+    with _submit_lock:
+        previous = _submitted.get(os.path.abspath(path))
+        if not rescan and previous is not None and previous[:2] == (stat.st_size, stat.st_mtime_ns):
+            if url and not previous[2]: # Put by the folder watcher before the widget which downloaded it
+                _submitted[os.path.abspath(path)] = (stat.st_size, stat.st_mtime_ns, url)
+                queue.set_url(os.path.relpath(path), url, **task)
+            return False
+        _submitted[os.path.abspath(path)] = (stat.st_size, stat.st_mtime_ns, url)
+    queue.put({"path": os.path.relpath(path), "timestamp": datetime.now(), "url": url, **task}, stat.st_size)
+    return True
+
+def replay_journal(journal: Journal, store: ResultStore, matrix: CountMatrix | None, files: dict, option) -> int:
+    """
+    Save the records written in the journal by an interrupted run and not rendered yet
+
+    Args:
+        journal (Journal): Journal of the previous run
+        store (ResultStore): Saved results
+        matrix (CountMatrix|None): Count matrix, None if disabled
+        files (dict): {filename: content hash} of the pdf of pdf_folder (see Manifest.refresh)
+        option (Option): Option object. Pdf scanned with other keywords or profiles (keyword_file reloaded during the run) are scanned again
+
+    Returns:
+        int: Number of saved results
+    """
+    scans = {} # {(path, timestamp): {part: ScanRecord}}
+    for record in journal.read():
+        if files.get(record.filename) == record.hash and record.words == option.scorer.words and len(record.profiles) == len(option.profiles): # Pdf not deleted nor modified since
+            scans.setdefault(record.key, {})[record.part] = record
+    records, parts = [], []
+    for scan in scans.values():
+        first = next(iter(scan.values()))
+        if len(scan) < first.n_parts: # Parts not scanned: the whole pdf is scanned again
+            continue
+        if rendered(store, first): # Rendered before the interruption
+            continue
+        records.append(first if first.n_parts == 1 else ScanRecord.merge(list(scan.values())))
+        parts.extend(scan.values())
+    if matrix is not None:
+        for record in sorted(parts, key=lambda record: record.timestamp):
+            matrix.append(record)
+    records.sort(key=lambda record: record.timestamp) # Last scan of a pdf is kept
+    if records:
+        store.upsert(records_to_dataframe(records))
+        for index, profile in enumerate(option.profiles):
+            store.upsert(records_to_dataframe([record.profile(index) for record in records]), profile)
+    return len(records)
+
+def rendered(store: ResultStore, record: ScanRecord) -> bool:
+    """
+    Returns:
+        bool: True if the result of the scan of record (or of a later scan) is saved in store
+    """
+    saved = store.get(record.filename)
+    return saved is not None and saved['Hash'] == record.hash and saved['Timestamp'] >= record.timestamp
+
+def stop_workers(process: list, qresult: Queue, CancelProcessEvent: multiprocessing.Event, logger: logging.Logger,
+                 timeout: int | float = 5) -> None:
+    """
+    Cancel the workers in watching mode, then let the watcher render their last results and stop
+
+    Args:
+        process (list): Process of the workers, returned by main
+        qresult (queue.Queue): Queue containing results of workers
+        CancelProcessEvent (multiprocessing.Event): Event to cancel the process
+        logger (logging.Logger): Logger object
+        timeout (int|float): Maximum waiting time in seconds for every worker. Workers still running are killed, the results of their scanned pdf are in the journal
+    """
+    CancelProcessEvent.set() # Workers send their results and stop after their current pdf
+    deadline = time.monotonic() + timeout
+    for p in process:
+        p.join(timeout=max(0, deadline - time.monotonic()))
+        if p.is_alive():
+            p.kill()
+            p.join() # Its relay puts the results it sent before STOP
+            logger.info(f"[{p.name}] has been killed")
+    qresult.put(STOP) # After the last results of the workers
+
+def copy_result(row: dict, filename: str) -> dict:
+    """
+    Copy the result of a pdf for an identical pdf saved under another name. Links to its pages are built from its filename by the report
+
+    Args:
+        row (dict): Result of the already scanned pdf
+        filename (str): Name of the identical pdf
+
+    Returns:
+        dict: Result of the identical pdf
+    """
+    copy = dict(row)
+    copy['Filename'] = filename
+    return copy
+
+def qlogger(as_started: list, qlog: multiprocessing.SimpleQueue, logger: logging.Logger, metrics: Metrics, supervisor: Supervisor) -> None:
     """
-    Function to log messages from qlog. Use to log messages from multiprocessing.Process workers
+    Function to log messages from qlog. Use to log messages from multiprocessing.Process workers.
+    Runs until a 'stop' message, so messages sent by workers while they are cancelled are still handled
 
     Args:
         as_started (list): List of boolean to know if a worker has started
         qlog (multiprocessing.SimpleQueue): Queue containing log messages
         logger (logging.Logger): Logger object
-        CancelProcessEvent (multiprocessing.Event): Event to cancel the process
+        metrics (Metrics): Run statistics sent by workers (stage timings, text cache hits and misses)
+        supervisor (Supervisor): Supervisor replacing retired workers and watching timeouts
     """
-    while not CancelProcessEvent.is_set():
+    while True:
         level, message = qlog.get()
         match level:
+            case 'stop':
+                return
             case 'debug':
                 logger.debug(message)
             case 'info':
@@ -182,19 +435,94 @@ def qlogger(as_started: list, qlog: multiprocessing.SimpleQueue, logger: logging
             case 'started':
                 logger.info(f"[P{message}] Worker has started")
                 as_started[message-1] = True
+            case 'cache':
+                hits, misses = message
+                metrics.add_cache(hits, misses)
+                logger.debug(f"Text cache: {hits} hits, {misses} misses")
+            case 'metrics':
+                metrics.add(message)
+            case 'retired':
+                worker_id, reason = message
+                logger.info(f"[P{worker_id}] Worker has been retired ({reason}). Starting a new one")
+                metrics.add_recycled()
+                supervisor.respawn(worker_id)
+            case 'released':
+                logger.info(f"[P{message}] Worker has been stopped by autotune")
+                supervisor.release(message)
+            case 'bundle':
+                supervisor.assign(*message)
+            case 'timeout':
+                filename, reason = message
+                logger.warning(f"{filename}: {reason}")
+                metrics.add_timeout()
             case _:
                 logger.warning(f"Unknown level {level} with message {message}")
 
-def watcher(CancelProcessEvent: multiprocessing.Event, logger: logging.Logger, *args) -> None:
+def watcher(logger: logging.Logger, option, queue: Scheduler, qresult: Queue, journal: Journal, *args) -> None:
     """
-    Function to render new pdf. Only used if watch_import is True
+    Function to render new pdf. Only used if watch_import is True. Stops once STOP is received (see stop_workers)
+
+    Args:
+        logger (logging.Logger): Logger object
+        option (Option): Option object
+        queue (Scheduler): Queue of pdf to scan, for pdf which can not be scored again from the count matrix
+        qresult (queue.Queue): Queue containing results of workers
+        journal (Journal): Journal of the workers, whose rendered records are removed after each render
+        *args: Arguments to pass to Renderer. Must contain start_time, store, render_date_label and metrics. See Renderer for more information
+    """
+    renderer = Renderer(option, *args)
+    while not renderer.stopped:
+        records = renderer.collect(qresult)
+        for record in records:
+            if not record.url: # Url given by the widget after the folder watcher put the pdf (see submit_pdf)
+                record.url = _submitted.get(record.abs_path, (0, 0, ''))[2]
+        renderer.render(records)
+        if option.journal:
+            journal.truncate(lambda record: rendered(renderer.store, record))
+        if renderer.rescan:
+            logger.info(f"Scanning {len(renderer.rescan)} pdf again for the new keywords")
+            renderer.store.mark_stale(renderer.rescan)
+            for filename in renderer.rescan:
+                path = os.path.join(option.pdf_folder, filename)
+                if os.path.isfile(path):
+                    submit_pdf(queue, path, rescan=True)
+            renderer.rescan.clear()
+    logger.info("Watcher has been cancelled")
+
+def keyword_watcher(CancelProcessEvent: multiprocessing.Event, logger: logging.Logger, option, queue: Scheduler, qresult: Queue,
+                    poll_interval: int | float = 1) -> None:
+    """
+    Function reloading keyword_file and the keyword files of option.profiles when one of them changes. Only used if watch_import is True.
+    Workers use the new keywords from their next pdf, and the watcher scores saved results again
 
     Args:
         CancelProcessEvent (multiprocessing.Event): Event to cancel the process
         logger (logging.Logger): Logger object
-        *args: Arguments to pass to render_data. Must contain option, qresult, start_time and old_data. See render_data for more information
+        option (Option): Option object
+        queue (Scheduler): Queue of pdf to scan, sharing the keywords with workers
+        qresult (queue.Queue): Queue containing results of workers
+        poll_interval (int|float): Time (in second) between two checks of the keyword files
     """
-    result_data = []
-    while not CancelProcessEvent.is_set():
-        result_data = render_data(*args, row_result=result_data)
-    logger.info("Watcher has been cancelled")
\ No newline at end of file
+    files = [option.keyword_file] + [keyword_file for keyword_file, _ in option.profiles.values()]
+    mtimes = [os.stat(file).st_mtime_ns for file in files]
+    while not CancelProcessEvent.wait(poll_interval):
+        try:
+            current = [os.stat(file).st_mtime_ns for file in files]
+        except OSError: # Being replaced by an editor
+            continue
+        if current == mtimes:
+            continue
+        changed = [file for file, mtime, new in zip(files, mtimes, current) if mtime != new]
+        mtimes = current
+        previous = (option.keywords, option.profile_keywords, option.matcher, option.scorer)
+        try:
+            load_keywords(option, logger)
+        except Exception as error:
+            option.keywords, option.profile_keywords, option.matcher, option.scorer = previous
+            logger.error(f"{', '.join(changed)} can not be loaded, previous keywords are kept: {error}")
+            continue
+        if option.keywords.equals(previous[0]) and all(option.profile_keywords[name].equals(previous[1][name]) for name in option.profiles):
+            continue
+        logger.info(f"{', '.join(changed)} has changed: scoring results again")
+        queue.set_keywords((option.keywords, option.profile_keywords))
+        qresult.put(RESCORE)
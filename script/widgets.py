@@ -1,10 +1,12 @@
 import os, re
 from validators import url as is_url
-from datetime import datetime
 
 import ipywidgets as widgets
 
 from .import_pdf.pdf_import import url_request
+from .script import submit_pdf, stop_workers
+
+CANCEL_TIMEOUT = 5 # Time (in second) given to workers to stop before they are killed
 
 def my_widgets(opt, ini: tuple, process: list) -> tuple:
     """
@@ -90,11 +92,7 @@ def my_widgets(opt, ini: tuple, process: list) -> tuple:
             result = url_request(opt, url.value, name)
             if result:
                 path = opt.pdf_folder + name
-                queue.put({
-                    "path": os.path.relpath(path),
-                    "timestamp": datetime.now(),
-                    "url": re.sub(r'\?download=true$', '', url.value)
-                    })
+                submit_pdf(queue, path, re.sub(r'\?download=true$', '', url.value), priority=True) # Scanned before the backlog
                 print(f"PDF added to {path}")
                 print(f"PDF added to queue (Queue length: {queue.qsize()})")
                 year.value += 1
@@ -138,10 +136,7 @@ def my_widgets(opt, ini: tuple, process: list) -> tuple:
             button_cancel.description = "Confirm cancel"
             button_cancel.button_style = "danger"
             return
-        for p in process:
-            p.kill()
-            logger.info(f"[{p.name}] has been canceled")
-        CancelProcessEvent.set()
+        stop_workers(process, qresult, CancelProcessEvent, logger, CANCEL_TIMEOUT)
         logger.info("All threads have been canceled")
         app_to_hide = [universtity, year, url, button_add, button_force_add, button_force_render, button_change_sort_mode, button_cancel]
         for b in app_to_hide:
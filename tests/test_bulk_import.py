@@ -0,0 +1,131 @@
+"""
+Tests of script/import_pdf/bulk_import.py against a local HTTP server.
+
+    python -m pytest tests
+"""
+import os, tempfile, threading, unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pandas as pd
+
+from script.__main__ import DEFAULTS
+from script.option import Option
+from script.pdf_scan.scheduler import Scheduler
+from script.import_pdf.bulk_import import bulk_import
+
+PDF = b'%PDF-1.4\n' + bytes(range(256)) * 1024 + b'\n%%EOF\n'
+HTML = b'<!DOCTYPE html><html><body>Not found</body></html>'
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    /doc.pdf honours Range requests, /norange.pdf ignores them, /page.html is not a pdf. Other paths give 404
+    """
+    ranges = [] # Range header of every request, None without it
+
+    def do_GET(self) -> None:
+        Handler.ranges.append(self.headers.get('Range'))
+        if self.path == '/page.html':
+            return self.send_body(200, HTML, 'text/html')
+        if self.path not in ('/doc.pdf', '/norange.pdf'):
+            return self.send_body(404, b'', 'text/plain')
+        range_ = self.headers.get('Range')
+        if range_ and self.path == '/doc.pdf':
+            start = int(range_.removeprefix('bytes=').split('-')[0])
+            return self.send_body(206, PDF[start:], 'application/pdf', f'bytes {start}-{len(PDF) - 1}/{len(PDF)}')
+        return self.send_body(200, PDF, 'application/pdf')
+
+    def send_body(self, status: int, body: bytes, content_type: str, content_range: str | None = None) -> None:
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if content_range:
+            self.send_header('Content-Range', content_range)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+class BulkImportTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        cls.url = f'http://127.0.0.1:{cls.server.server_port}/'
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.pdf_folder = os.path.join(self.folder.name, 'pdf') + os.sep
+        os.makedirs(self.pdf_folder)
+        self.option = Option(**{**DEFAULTS, 'pdf_folder': self.pdf_folder, 'data_folder': os.path.join(self.folder.name, 'data') + os.sep})
+        Handler.ranges.clear()
+
+    def tearDown(self) -> None:
+        self.folder.cleanup()
+
+    def import_csv(self, rows: list, queue: Scheduler | None = None, force: bool = False) -> list:
+        csv_file = os.path.join(self.folder.name, 'list.csv')
+        pd.DataFrame(rows, columns=['name', 'year', 'url']).to_csv(csv_file, index=False)
+        return bulk_import(self.option, csv_file, queue, n_connections=2, force=force)
+
+    def read(self, filename: str) -> bytes:
+        with open(self.pdf_folder + filename, 'rb') as f:
+            return f.read()
+
+    def test_download_and_submit(self) -> None:
+        queue = Scheduler()
+        downloaded = self.import_csv([['a', '2020', self.url + 'doc.pdf'], ['b', '2021', self.url + 'norange.pdf'],
+                                      ['c', '2022', self.url + 'page.html'], ['d', '2023', self.url + 'missing.pdf'],
+                                      ['e', '2024', 'not an url']], queue)
+        self.assertEqual(sorted(downloaded), [self.pdf_folder + 'a_2020.pdf', self.pdf_folder + 'b_2021.pdf'])
+        self.assertEqual(self.read('a_2020.pdf'), PDF)
+        self.assertEqual(self.read('b_2021.pdf'), PDF)
+        self.assertEqual(sorted(os.listdir(self.pdf_folder)), ['a_2020.pdf', 'b_2021.pdf']) # Html page and 404 leave no file
+
+        tasks = queue.get(timeout=0)
+        tasks += queue.get(timeout=0)
+        self.assertEqual({os.path.abspath(task['path']): task['url'] for task in tasks},
+                         {self.pdf_folder + 'a_2020.pdf': self.url + 'doc.pdf', self.pdf_folder + 'b_2021.pdf': self.url + 'norange.pdf'})
+
+    def test_resume(self) -> None:
+        with open(self.pdf_folder + 'a_2020.pdf.part', 'wb') as f:
+            f.write(PDF[:1000])
+        self.assertEqual(self.import_csv([['a', '2020', self.url + 'doc.pdf']]), [self.pdf_folder + 'a_2020.pdf'])
+        self.assertEqual(Handler.ranges, ['bytes=1000-'])
+        self.assertEqual(self.read('a_2020.pdf'), PDF)
+        self.assertFalse(os.path.exists(self.pdf_folder + 'a_2020.pdf.part'))
+
+    def test_resume_ignored_by_server(self) -> None:
+        with open(self.pdf_folder + 'b_2021.pdf.part', 'wb') as f:
+            f.write(PDF[:1000])
+        self.assertEqual(self.import_csv([['b', '2021', self.url + 'norange.pdf']]), [self.pdf_folder + 'b_2021.pdf'])
+        self.assertEqual(self.read('b_2021.pdf'), PDF) # Downloaded again from the beginning
+
+    def test_resume_not_a_pdf(self) -> None:
+        with open(self.pdf_folder + 'a_2020.pdf.part', 'wb') as f:
+            f.write(HTML[:100])
+        self.assertEqual(self.import_csv([['a', '2020', self.url + 'doc.pdf']]), [self.pdf_folder + 'a_2020.pdf'])
+        self.assertEqual(Handler.ranges, [None])
+        self.assertEqual(self.read('a_2020.pdf'), PDF)
+
+    def test_existing_pdf(self) -> None:
+        with open(self.pdf_folder + 'a_2020.pdf', 'wb') as f:
+            f.write(b'%PDF-old')
+        self.assertEqual(self.import_csv([['a', '2020', self.url + 'doc.pdf']]), [])
+        self.assertEqual(self.read('a_2020.pdf'), b'%PDF-old')
+        self.assertEqual(self.import_csv([['a', '2020', self.url + 'doc.pdf']], force=True), [self.pdf_folder + 'a_2020.pdf'])
+        self.assertEqual(self.read('a_2020.pdf'), PDF)
+
+    def test_missing_columns(self) -> None:
+        csv_file = os.path.join(self.folder.name, 'list.csv')
+        pd.DataFrame([['a', self.url + 'doc.pdf']], columns=['name', 'url']).to_csv(csv_file, index=False)
+        with self.assertRaises(ValueError):
+            bulk_import(self.option, csv_file)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,132 @@
+"""
+Tests of script/pdf_scan/coordinator.py on localhost: a coordinator and two worker nodes, one of them killed while it holds a lease.
+
+    python -m pytest tests
+"""
+import os, sys, time, errno, signal, socket, logging, tempfile, subprocess, unittest, multiprocessing
+
+from benchmark.corpus import generate_corpus
+from script.__main__ import DEFAULTS
+from script.option import Option
+from script.pdf_scan.backends import Extractor
+from script.pdf_scan.result_store import ResultStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def coordinate(option: Option, gate: str, log_file: str) -> None:
+    """
+    Run the coordinator in a forked process. Its own worker waits for gate before extracting a page,
+    so the pdf are left to the worker nodes
+    """
+    from script.script import initialize, main
+
+    text = Extractor.text
+
+    def wait_gate(self, k: int) -> str:
+        while not os.path.exists(gate):
+            time.sleep(0.05)
+        return text(self, k)
+
+    Extractor.text = wait_gate
+    logger = logging.getLogger('test_coordinator')
+    logger.propagate = False
+    logger.addHandler(logging.FileHandler(log_file))
+    main(option, initialize(logger, widgets=False))
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+@unittest.skipUnless(hasattr(os, 'fork') and hasattr(os, 'mkfifo') and hasattr(os, 'killpg'), 'needs fork, mkfifo and killpg')
+class CoordinatorTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.pdf_folder = self.path('pdf') + os.sep
+        keyword_file = os.path.join(ROOT, 'keywords.csv')
+        self.paths = generate_corpus(self.pdf_folder, keyword_file, n_files=12, n_pages=3, words_per_page=200, hit_rate=0.5)
+        self.address = f'127.0.0.1:{free_port()}'
+        self.option = Option(**{**DEFAULTS, 'pdf_folder': self.pdf_folder, 'data_folder': self.path('data') + os.sep,
+                                'result_file': self.path('result.html'), 'keyword_file': keyword_file, 'n_workers': 1,
+                                'progress_bar': False, 'cache_size': 0, 'bundle_size': 0, 'coordinator': self.address,
+                                'authkey': 'test', 'lease_timeout': 1})
+        self.nodes = []
+
+    def tearDown(self) -> None:
+        for node in self.nodes:
+            if node.poll() is None:
+                os.killpg(node.pid, signal.SIGKILL)
+                node.wait()
+        self.folder.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.folder.name, name)
+
+    def start_node(self, name: str, pdf_folder: str) -> subprocess.Popen:
+        node = subprocess.Popen([sys.executable, '-m', 'script', 'node', '--coordinator', self.address, '--authkey', 'test',
+                                 '--n-workers', '1', '--pdf-folder', pdf_folder, '--data-folder', self.path(name), '--name', name],
+                                cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+        self.nodes.append(node)
+        return node
+
+    def wait_reader(self, fifos: list, timeout: int | float) -> int:
+        """
+        Returns:
+            int: Write end of the first fifo opened by a worker, which stays blocked until it is closed
+        """
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            for fifo in fifos:
+                try:
+                    return os.open(fifo, os.O_WRONLY | os.O_NONBLOCK)
+                except OSError as error:
+                    if error.errno != errno.ENXIO: # No reader yet
+                        raise
+            time.sleep(0.05)
+        self.fail("The node did not lease any pdf")
+
+    def wait_log(self, log_file: str, message: str, timeout: int | float) -> None:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with open(log_file) as f:
+                if message in f.read():
+                    return
+            time.sleep(0.05)
+        self.fail(f"{message} not logged by the coordinator")
+
+    def test_killed_node(self) -> None:
+        gate, log_file = self.path('gate'), self.path('coordinator.log')
+        coordinator = multiprocessing.get_context('fork').Process(target=coordinate, args=(self.option, gate, log_file))
+        coordinator.start()
+        try:
+            # The killed node reads fifos instead of the pdf: its worker blocks on the first one, holding its lease
+            os.makedirs(self.path('fifo'))
+            fifos = [os.path.join(self.path('fifo'), os.path.basename(path)) for path in self.paths]
+            for fifo in fifos:
+                os.mkfifo(fifo)
+            killed = self.start_node('killed', self.path('fifo') + os.sep)
+            fd = self.wait_reader(fifos, 60)
+            os.killpg(killed.pid, signal.SIGKILL)
+            killed.wait()
+            os.close(fd)
+
+            alive = self.start_node('alive', self.pdf_folder)
+            self.wait_log(log_file, "[alive] [P1] Worker has started", 60)
+            open(gate, 'w').close()
+            coordinator.join(120)
+            self.assertEqual(alive.wait(30), 0)
+        finally:
+            if coordinator.is_alive():
+                coordinator.kill()
+                coordinator.join()
+        self.assertEqual(coordinator.exitcode, 0)
+
+        with open(log_file) as f:
+            log = f.read()
+        self.assertIn("[killed] No heartbeat for 1 s. Requeuing its 1 tasks", log)
+
+        store = ResultStore(self.option.data_folder)
+        df = store.to_dataframe()
+        store.close()
+        self.assertEqual(sorted(df['Filename']), sorted(os.path.basename(path) for path in self.paths)) # Each pdf once
+        self.assertTrue((df['Nb pages'] == 3).all())
@@ -0,0 +1,89 @@
+"""
+Tests of script/pdf_scan/count_matrix.py: results scored again from the count matrix after a change of keyword_file
+and threshold match a fresh scan with the new keywords.
+
+    python -m pytest tests
+"""
+import os, logging, tempfile, unittest, multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from benchmark.corpus import generate_corpus
+from script.__main__ import DEFAULTS
+from script.option import Option
+from script.pdf_scan import count_matrix
+from script.pdf_scan.result_store import ResultStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def scan(option: Option, log_file: str) -> None:
+    """
+    Scan in a forked process, with small blocks and generations so the matrix is read from several of them
+    """
+    from script.script import initialize, main
+
+    count_matrix.BLOCK_ROWS, count_matrix.COMPACT_MIN_ROWS = 5, 8
+    logger = logging.getLogger('test_count_matrix')
+    logger.propagate = False
+    logger.addHandler(logging.FileHandler(log_file))
+    main(option, initialize(logger, widgets=False))
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'needs fork')
+class RescoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.pdf_folder = self.path('pdf') + os.sep
+        keyword_file = os.path.join(ROOT, 'keywords.csv')
+        self.paths = generate_corpus(self.pdf_folder, keyword_file, n_files=10, n_pages=4, words_per_page=200, hit_rate=0.6)
+        keywords = pd.read_csv(keyword_file)
+        keywords = keywords[keywords['Word'] != 'charge'] # Word removed, scores and counts changed
+        keywords.loc[keywords['Word'] == 'total', 'Score if true'] = 4
+        keywords.loc[keywords['Word'] == 'hetd', ['Score if true', 'Score if false']] = [1, 1]
+        keywords.loc[keywords['Word'] == 'heure', 'Nb min'] = 2
+        self.new_keyword_file = self.path('keywords.csv')
+        keywords.to_csv(self.new_keyword_file, index=False)
+
+    def tearDown(self) -> None:
+        self.folder.cleanup()
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.folder.name, name)
+
+    def run_scan(self, data_folder: str, keyword_file: str, threshold: int) -> str:
+        """
+        Returns:
+            str: Log of the scan
+        """
+        option = Option(**{**DEFAULTS, 'pdf_folder': self.pdf_folder, 'data_folder': self.path(data_folder) + os.sep,
+                           'result_file': self.path(data_folder + '.html'), 'keyword_file': keyword_file, 'threshold': threshold,
+                           'n_workers': 2, 'progress_bar': False, 'cache_size': 0})
+        log_file = self.path(data_folder + '.log')
+        process = multiprocessing.get_context('fork').Process(target=scan, args=(option, log_file))
+        process.start()
+        process.join(120)
+        if process.is_alive():
+            process.kill()
+        self.assertEqual(process.exitcode, 0)
+        with open(log_file) as f:
+            return f.read()
+
+    def results(self, data_folder: str) -> pd.DataFrame:
+        store = ResultStore(self.path(data_folder) + os.sep)
+        data = store.to_dataframe().sort_values('Filename', ignore_index=True)
+        store.close()
+        return data[['Filename', 'Nb pages', 'Nb detected', 'Pages']]
+
+    def test_rescore_matches_fresh_scan(self) -> None:
+        self.run_scan('rescored', os.path.join(ROOT, 'keywords.csv'), 7)
+        before = self.results('rescored')
+        log = self.run_scan('rescored', self.new_keyword_file, 5)
+        self.assertIn(f"{len(self.paths)} pdf files have been skipped", log)
+        self.assertIn("0 pdf to scan again", log)
+        self.assertGreater(count_matrix.CountMatrix(self.path('rescored/counts')).generation, 1) # Merged from several generations
+
+        self.run_scan('fresh', self.new_keyword_file, 5)
+        rescored = self.results('rescored')
+        pd.testing.assert_frame_equal(rescored, self.results('fresh'))
+        self.assertFalse(rescored['Pages'].equals(before['Pages'])) # The change of keywords changes the results
+        self.assertTrue(np.any(rescored['Nb detected'] > 0))
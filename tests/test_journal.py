@@ -0,0 +1,110 @@
+"""
+Tests of script/pdf_scan/journal.py: torn and corrupted entries, truncate, and a writer killed with SIGKILL.
+
+    python -m pytest tests
+"""
+import os, signal, tempfile, time, unittest, multiprocessing
+from array import array
+from datetime import datetime
+
+from script.pdf_scan.journal import Journal, HEADER, fcntl
+from script.pdf_scan.record import ScanRecord
+
+def make_record(filename: str) -> ScanRecord:
+    return ScanRecord(path='pdf/' + filename, filename=filename, abs_path='/pdf/' + filename, url='', timestamp=datetime(2024, 1, 1),
+                      hash='h' + filename, n_pages=3, pages=array('I', [1, 3]), scores=array('q', [9, 7]))
+
+def append_forever(folder: str) -> None:
+    journal = Journal(folder)
+    n = 0
+    while True:
+        journal.append(make_record(f'{n:06d}.pdf'))
+        n += 1
+
+class JournalTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.journal = Journal(self.folder.name)
+
+    def tearDown(self) -> None:
+        self.journal.close()
+        self.folder.cleanup()
+
+    def append(self, *filenames: str) -> None:
+        for filename in filenames:
+            self.journal.append(make_record(filename))
+
+    def filenames(self) -> list:
+        return [record.filename for record in Journal(self.folder.name).read()]
+
+    def test_read(self) -> None:
+        self.append('a.pdf', 'b.pdf')
+        records = Journal(self.folder.name).read()
+        self.assertEqual([record.filename for record in records], ['a.pdf', 'b.pdf'])
+        self.assertEqual(list(records[0].pages), [1, 3])
+        self.assertEqual(list(records[0].scores), [9, 7])
+        self.assertEqual(records[0].hash, 'ha.pdf')
+
+    def test_torn_last_entry(self) -> None:
+        self.append('a.pdf', 'b.pdf', 'c.pdf')
+        segment, = self.journal.segments()
+        size = os.path.getsize(segment)
+        for cut in (1, size // 6, size // 3 - HEADER.size + 2): # In the record, then in the header of the last entry
+            with open(segment, 'r+b') as f:
+                f.truncate(size - cut)
+            self.assertEqual(self.filenames(), ['a.pdf', 'b.pdf'], cut)
+
+    def test_crc_mismatch(self) -> None:
+        self.append('a.pdf', 'b.pdf', 'c.pdf')
+        segment, = self.journal.segments()
+        with open(segment, 'rb') as f:
+            data = bytearray(f.read())
+        first = HEADER.size + HEADER.unpack_from(data, 0)[0]
+        data[first + HEADER.size + 10] ^= 0xFF # In the record of b.pdf
+        with open(segment, 'wb') as f:
+            f.write(data)
+        self.assertEqual(self.filenames(), ['a.pdf']) # Entries after a corrupted one are not trusted
+
+    def test_segments_of_several_writers(self) -> None:
+        self.append('a.pdf')
+        other = Journal(self.folder.name)
+        other.append(make_record('b.pdf'))
+        other.close()
+        self.assertEqual(len(self.journal.segments()), 2)
+        self.assertEqual(sorted(self.filenames()), ['a.pdf', 'b.pdf'])
+
+    @unittest.skipIf(fcntl is None, 'truncate needs fcntl')
+    def test_truncate(self) -> None:
+        self.append('a.pdf', 'b.pdf', 'c.pdf', 'd.pdf')
+        reader = Journal(self.folder.name)
+        self.assertEqual(reader.truncate(lambda record: record.filename in ('a.pdf', 'c.pdf')), 2)
+        self.assertEqual(self.filenames(), ['b.pdf', 'd.pdf'])
+        self.assertEqual(reader.truncate(lambda record: False), 0)
+
+        self.append('e.pdf') # Its segment has been removed: written in a new one
+        self.assertEqual(sorted(self.filenames()), ['b.pdf', 'd.pdf', 'e.pdf'])
+        self.assertEqual(reader.truncate(lambda record: True), 3)
+        self.assertEqual(self.journal.segments(), [])
+
+        self.append('f.pdf')
+        self.assertEqual(self.filenames(), ['f.pdf'])
+
+    @unittest.skipUnless(hasattr(os, 'fork') and hasattr(signal, 'SIGKILL'), 'needs fork and SIGKILL')
+    def test_writer_killed(self) -> None:
+        process = multiprocessing.get_context('fork').Process(target=append_forever, args=(self.folder.name,))
+        process.start()
+        deadline = time.monotonic() + 10
+        while time.monotonic() < deadline and sum(os.path.getsize(segment) for segment in self.journal.segments()) < 100_000:
+            time.sleep(0.01)
+        os.kill(process.pid, signal.SIGKILL)
+        process.join()
+
+        filenames = self.filenames()
+        self.assertGreater(len(filenames), 10)
+        self.assertEqual(filenames, [f'{n:06d}.pdf' for n in range(len(filenames))]) # Every complete entry, in order
+
+        self.journal.clear()
+        self.assertEqual(self.journal.segments(), [])
+
+if __name__ == '__main__':
+    unittest.main()
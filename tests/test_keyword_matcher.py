@@ -0,0 +1,109 @@
+"""
+Tests of script/pdf_scan/keyword_matcher.py against the scoring of the first version of the worker (pandas apply).
+
+    python -m pytest tests
+"""
+import os, re, random, logging, tempfile, unittest
+
+import numpy as np
+import pandas as pd
+from unidecode import unidecode
+
+from script.script import read_keywords
+from script.pdf_scan.keyword_matcher import KeywordMatcher, ProfileScorer
+
+KEYWORDS = [ # Word, Nb min, Nb max, Score if true, Score if false
+    ['Heures complémentaires', 1, np.inf, 2, 0],
+    ['ÉTÉ', 2, 3, 3, -1],
+    ['total', 1, np.inf, 2, 0],
+    ['Total TTC', 0, 0, 1, 4],
+    ['cœur', 1, np.inf, 1, 0],
+    ['straße', 1, 2, 1, 0],
+    ['%', 3, np.inf, 1, 0],
+    ['aa', 2, np.inf, 5, 0], # Overlapping occurrences in 'aaa'
+]
+TEXTS = [
+    '',
+    'Heures   complémentaires\n\ttotal',
+    'HEURES COMPLEMENTAIRES heures complémentaires',
+    'Été, été, ÉTÉ et  e t e',
+    'Total TTC : 10 %, 20 %, 30 %',
+    'Le Cœur de la STRASSE, straße et Straße',
+    'aaa aaaa a a',
+    'ﬁn de l\'année: total TTC',
+]
+
+def analyse_text(keywords: pd.DataFrame, text: str) -> int:
+    """
+    Scoring of the first version of the worker, kept as reference
+    """
+    text = unidecode(text).lower() # Retrait des accents et mise en minuscule
+    text = re.sub(r'\s+', '', text) # Retrait des espaces
+
+    def counter(text: str, row: pd.Series) -> int:
+        if row['Nb min'] <= text.count(row['Word']) <= row['Nb max']:
+            return row['Score if true']
+        else:
+            return row['Score if false']
+
+    return keywords.apply(lambda x: counter(text, x), axis=1).sum()
+
+class KeywordMatcherTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        with tempfile.TemporaryDirectory() as folder:
+            keyword_file = os.path.join(folder, 'keywords.csv')
+            pd.DataFrame(KEYWORDS, columns=['Word', 'Nb min', 'Nb max', 'Score if true', 'Score if false']).to_csv(keyword_file, index=False)
+            logger = logging.getLogger('test_keyword_matcher')
+            logger.disabled = True
+            cls.keywords = read_keywords(keyword_file, True, logger) # Words without accents, spaces and in lower case
+        rng = random.Random(0)
+        pieces = ['heures', ' complé', 'mentaires', 'ÉT', 'É', 'été', 'Total', ' TTC', 'tot', 'al', 'cœur', 'STRAẞE', 'straße',
+                  '%', 'a', 'aa', ' ', '\n', '\t', ' ', 'x', '1']
+        cls.texts = TEXTS + [''.join(rng.choice(pieces) for _ in range(rng.randint(1, 40))) for _ in range(500)]
+
+    def test_keywords_normalized(self) -> None:
+        self.assertEqual(list(self.keywords['Word']), ['heurescomplementaires', 'ete', 'total', 'totalttc', 'coeur', 'strasse', '%', 'aa'])
+
+    def test_score_matches_baseline(self) -> None:
+        matcher = KeywordMatcher(self.keywords)
+        self.assertIsNone(matcher.automaton)
+        for text in self.texts:
+            self.assertEqual(matcher.score(text), analyse_text(self.keywords, text), repr(text))
+
+    def test_automaton_matches_baseline(self) -> None:
+        automaton_min_words = KeywordMatcher.automaton_min_words
+        KeywordMatcher.automaton_min_words = 1
+        try:
+            matcher = KeywordMatcher(self.keywords)
+        finally:
+            KeywordMatcher.automaton_min_words = automaton_min_words
+        if matcher.automaton is None:
+            self.skipTest('pyahocorasick is not installed')
+        for text in self.texts:
+            self.assertEqual(matcher.score(text), analyse_text(self.keywords, text), repr(text))
+
+    def test_matrix_matches_rows(self) -> None:
+        matcher = KeywordMatcher(self.keywords)
+        counts = np.array([matcher.count(matcher.normalize(text)) for text in self.texts])
+        self.assertEqual(list(matcher.score_matrix(counts)), [matcher.score_counts(row) for row in counts])
+        self.assertEqual(list(matcher.upper_bound_matrix(counts)), [matcher.upper_bound(row) for row in counts])
+
+    def test_upper_bound(self) -> None:
+        matcher = KeywordMatcher(self.keywords)
+        rng = np.random.default_rng(0)
+        for _ in range(200):
+            bound = rng.integers(0, 5, len(matcher.words))
+            best = max(matcher.score_counts(rng.integers(0, bound + 1)) for _ in range(50))
+            self.assertLessEqual(best, matcher.upper_bound(bound))
+        self.assertEqual(matcher.upper_bound(np.zeros(len(matcher.words), dtype=np.int64)), matcher.score_counts(np.zeros(len(matcher.words), dtype=np.int64)))
+
+    def test_profiles(self) -> None:
+        other = pd.DataFrame([['total', 2, np.inf, 1, 0], ['hetd', 1, np.inf, 2, 0]], columns=self.keywords.columns)
+        scorer = ProfileScorer([KeywordMatcher(self.keywords), KeywordMatcher(other)], [3, 1])
+        for text in self.texts:
+            counts = scorer.count(KeywordMatcher.normalize(text))
+            self.assertEqual(scorer.scores(counts), [analyse_text(self.keywords, text), analyse_text(other, text)], repr(text))
+
+if __name__ == '__main__':
+    unittest.main()
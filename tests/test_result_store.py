@@ -0,0 +1,126 @@
+"""
+Tests of script/pdf_scan/result_store.py: import of a save.csv of the first version and conversion of older stores.
+
+    python -m pytest tests
+"""
+import os, sqlite3, tempfile, unittest
+
+import pandas as pd
+
+from script.pdf_scan.result_store import ResultStore, COLUMNS
+
+def link(page: int, score: int, best: bool) -> str:
+    """
+    Link to a detected page, as written by the first version
+    """
+    return f'<a class="{"max-score" if best else ""}" title="Score: {score}" href="/data/pdf/a.pdf#page={page}" target="_blank">{page}</a>'
+
+def url(filename: str, url: str) -> str:
+    return f'<a class="filename" href="{url}" target="_blank">{filename}</a>'
+
+BASELINE_ROWS = [ # Filename, Url, Nb pages, Nb detected, Detected pages, N, Timestamp
+    ['a.pdf', url('a.pdf', 'https://example.org/a.pdf'), 12, 2, link(7, 12, True) + ' ' + link(3, 9, False), True, '2024-03-01 10:00:00.123456'],
+    ['b.pdf', url('b.pdf', ''), 4, 0, None, False, '2024-03-01 10:00:01'],
+    ['c.pdf', url('c.pdf', ''), 3, 0, None, True, '2024-03-01 09:00:00'],
+    ['c.pdf', url('c.pdf', 'https://example.org/c.pdf'), 5, 1, link(2, 8, True), True, '2024-03-02 09:00:00'], # Later scan of c.pdf
+]
+
+class ResultStoreTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.data_folder = self.folder.name + os.sep
+        self.csv_file = self.data_folder + 'save.csv'
+
+    def tearDown(self) -> None:
+        self.folder.cleanup()
+
+    def write_csv(self, rows: list, columns: list) -> None:
+        pd.DataFrame(rows, columns=columns).to_csv(self.csv_file, index=False)
+
+    def test_migrate_baseline(self) -> None:
+        self.write_csv(BASELINE_ROWS, ['Filename', 'Url', 'Nb pages', 'Nb detected', 'Detected pages', 'N', 'Timestamp'])
+        store = ResultStore(self.data_folder)
+        self.assertEqual(store.migrate(self.csv_file), 3)
+
+        a = store.get('a.pdf')
+        self.assertEqual(a['Url'], 'https://example.org/a.pdf')
+        self.assertEqual((a['Nb pages'], a['Nb detected']), (12, 2))
+        self.assertEqual(a['Pages'], [[7, 12], [3, 9]]) # Best scores first
+        self.assertEqual((a['Timed out'], a['Partial'], a['N'], a['Hash']), ([], 0, True, ''))
+        self.assertEqual(a['Timestamp'], pd.Timestamp('2024-03-01 10:00:00.123456'))
+
+        b = store.get('b.pdf')
+        self.assertEqual((b['Url'], b['Nb detected'], b['Pages'], b['N']), ('', 0, [], False))
+
+        c = store.get('c.pdf') # Last scan kept
+        self.assertEqual((c['Url'], c['Nb pages'], c['Pages']), ('https://example.org/c.pdf', 5, [[2, 8]]))
+        self.assertEqual(store.hashes(), {'a.pdf': '', 'b.pdf': '', 'c.pdf': ''}) # Scanned again to get their hash
+
+        self.write_csv(BASELINE_ROWS[:1], ['Filename', 'Url', 'Nb pages', 'Nb detected', 'Detected pages', 'N', 'Timestamp'])
+        self.assertEqual(store.migrate(self.csv_file), 0) # Only into an empty store
+        store.close()
+
+    def test_migrate_without_url(self) -> None:
+        self.write_csv([[row[0], *row[2:]] for row in BASELINE_ROWS[:2]], ['Filename', 'Nb pages', 'Nb detected', 'Detected pages', 'N', 'Timestamp'])
+        store = ResultStore(self.data_folder)
+        self.assertEqual(store.migrate(self.csv_file), 2)
+        self.assertEqual(store.get('a.pdf')['Url'], '')
+        self.assertEqual(store.get('a.pdf')['Pages'], [[7, 12], [3, 9]])
+        store.close()
+
+    def test_migrate_timed_out_and_partial(self) -> None:
+        detected = link(7, 12, True) + ' <span class="timed-out" title="Scan timed out">5</span> <span class="partial" title="Scan stopped early">Partial (6/12)</span>'
+        self.write_csv([['a.pdf', url('a.pdf', ''), 12, 1, detected, True, '2024-03-01', 'h1'],
+                        ['t.pdf', url('t.pdf', ''), 0, 0, '<span class="timed-out" title="Scan timed out">Timed out</span>', True, '2024-03-01', 'h2']],
+                       ['Filename', 'Url', 'Nb pages', 'Nb detected', 'Detected pages', 'N', 'Timestamp', 'Hash'])
+        store = ResultStore(self.data_folder)
+        self.assertEqual(store.migrate(self.csv_file), 2)
+        a, t = store.get('a.pdf'), store.get('t.pdf')
+        self.assertEqual((a['Pages'], a['Timed out'], a['Partial'], a['Hash']), ([[7, 12]], [5], 6, 'h1'))
+        self.assertEqual((t['Pages'], t['Timed out'], t['Partial']), ([], [0], 0))
+        self.assertEqual(store.partial(), {'a.pdf'})
+        store.close()
+
+    def test_export_round_trip(self) -> None:
+        self.write_csv(BASELINE_ROWS, ['Filename', 'Url', 'Nb pages', 'Nb detected', 'Detected pages', 'N', 'Timestamp'])
+        store = ResultStore(self.data_folder)
+        store.migrate(self.csv_file)
+        expected = store.to_dataframe().sort_values('Filename', ignore_index=True)
+        store.export(self.csv_file, '/data/pdf')
+        store.close()
+
+        other = tempfile.TemporaryDirectory()
+        self.addCleanup(other.cleanup)
+        store = ResultStore(other.name)
+        self.assertEqual(store.migrate(self.csv_file), 3)
+        pd.testing.assert_frame_equal(store.to_dataframe().sort_values('Filename', ignore_index=True), expected)
+        store.close()
+
+    def test_convert_html_store(self) -> None:
+        db = sqlite3.connect(self.data_folder + 'results.sqlite')
+        db.executescript("""
+            CREATE TABLE results (filename TEXT PRIMARY KEY, url TEXT NOT NULL, n_pages INTEGER NOT NULL, n_detected INTEGER NOT NULL,
+                                  detected_pages TEXT NOT NULL, n INTEGER NOT NULL, timestamp TEXT NOT NULL, hash TEXT NOT NULL);
+            CREATE INDEX results_hash ON results (hash);
+            CREATE TABLE profile_results (profile TEXT, filename TEXT, n_detected INTEGER NOT NULL, detected_pages TEXT NOT NULL,
+                                          PRIMARY KEY (profile, filename)) WITHOUT ROWID;
+        """)
+        db.executemany('INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?, ?)', [
+            ('a.pdf', url('a.pdf', 'https://example.org/a.pdf'), 12, 2, link(7, 12, True) + ' ' + link(3, 9, False), 1, '2024-03-01T10:00:00', 'h1'),
+            ('b.pdf', '', 4, 0, '', 0, '2024-03-01T10:00:01', 'h2'),
+        ])
+        db.execute('INSERT INTO profile_results VALUES (?, ?, ?, ?)', ('budget', 'a.pdf', 1, link(3, 4, True)))
+        db.commit()
+        db.close()
+
+        store = ResultStore(self.data_folder)
+        self.assertEqual(list(store.to_dataframe().columns), COLUMNS)
+        a = store.get('a.pdf')
+        self.assertEqual((a['Url'], a['Pages'], a['Timed out'], a['Partial'], a['Hash']), ('https://example.org/a.pdf', [[7, 12], [3, 9]], [], 0, 'h1'))
+        self.assertEqual(store.get('b.pdf')['Pages'], [])
+        self.assertEqual(store.get('a.pdf', 'budget')['Pages'], [[3, 4]])
+        self.assertEqual(store.get('b.pdf', 'budget')['Pages'], [])
+        store.close()
+
+if __name__ == '__main__':
+    unittest.main()
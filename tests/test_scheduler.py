@@ -0,0 +1,147 @@
+"""
+Tests of script/pdf_scan/scheduler.py, used directly without a SchedulerManager process.
+
+    python -m pytest tests
+"""
+import os, tempfile, threading, time, unittest
+
+from script.pdf_scan.scheduler import Scheduler
+
+class SchedulerTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.queue = Scheduler()
+
+    def tearDown(self) -> None:
+        self.folder.cleanup()
+
+    def put(self, name: str, size: int, **task) -> None:
+        """
+        Put the task of a pdf of size bytes, its cost
+        """
+        path = os.path.join(self.folder.name, name)
+        with open(path, 'wb') as f:
+            f.write(b'0' * size)
+        self.queue.put({'path': path, 'url': '', **task})
+
+    def get(self, **kwargs) -> list:
+        return [os.path.basename(task['path']) for task in self.queue.get(timeout=0, **kwargs)]
+
+    def get_all(self, **kwargs) -> list:
+        bundles = []
+        while bundle := self.get(**kwargs):
+            bundles.append(bundle)
+        return bundles
+
+    def test_lanes(self) -> None:
+        self.put('small', 10)
+        self.put('retry', 1000, retry=True)
+        self.put('large', 100)
+        self.put('priority_1', 5, priority=True)
+        self.put('medium', 50)
+        self.put('priority_2', 500, priority=True)
+        # Priority lane in order of arrival, then largest first, then the retry lane
+        self.assertEqual(self.get_all(), [['priority_1'], ['priority_2'], ['large'], ['medium'], ['small'], ['retry']])
+        self.assertEqual(self.queue.qsize(), 0)
+
+    def test_bundle_size(self) -> None:
+        for name, size in [('a', 100), ('b', 4), ('c', 3), ('d', 2), ('e', 1), ('f', 1)]:
+            self.put(name, size)
+        self.assertEqual(self.get_all(bundle_size=8), [['a'], ['b', 'c'], ['d', 'e'], ['f']])
+
+    def test_bundle_leaves_tasks(self) -> None:
+        for i in range(8):
+            self.put(f'{i}', 1)
+        # A bundle takes at most half of the waiting tasks (rounded up), other workers get the others
+        self.assertEqual([len(bundle) for bundle in self.get_all(bundle_size=100)], [4, 2, 1, 1])
+
+    def test_bundle_max_tasks(self) -> None:
+        for i in range(10):
+            self.put(f'{i}', 1)
+        self.assertEqual([len(bundle) for bundle in self.get_all(bundle_size=100, max_tasks=2)], [2, 2, 2, 2, 1, 1])
+
+    def test_bundle_one_lane(self) -> None:
+        self.put('priority', 1, priority=True)
+        self.put('a', 1)
+        self.put('b', 1)
+        self.put('c', 1)
+        self.put('retry', 1, retry=True)
+        self.put('d', 1)
+        self.assertEqual(self.get_all(bundle_size=100), [['priority'], ['a', 'b', 'c'], ['d'], ['retry']])
+
+    def test_join_after_release(self) -> None:
+        for name, size in [('a', 4), ('b', 3), ('c', 2), ('d', 1), ('e', 1), ('f', 1), ('g', 1)]:
+            self.put(name, size)
+        bundle = self.queue.get(timeout=0, bundle_size=100)
+        self.assertEqual(len(bundle), 4)
+        self.queue.task_done() # First task scanned, then the worker is cancelled
+        self.queue.release(bundle[1:])
+        self.assertFalse(self.queue.done())
+        self.assertEqual(self.queue.qsize(), 6)
+        self.assertEqual(self.get(), ['b']) # Released tasks keep their place
+
+        joined = threading.Event()
+        threading.Thread(target=lambda: (self.queue.join(), joined.set()), daemon=True).start()
+        self.queue.task_done()
+        for bundle in self.get_all():
+            self.assertFalse(joined.is_set())
+            self.queue.task_done(len(bundle))
+        self.assertTrue(joined.wait(5))
+        self.assertTrue(self.queue.done())
+        self.assertEqual(self.queue.get(timeout=0, until_done=True), [])
+
+    def test_get_waits(self) -> None:
+        self.assertEqual(self.queue.get(timeout=0.05), [])
+        self.assertEqual(self.queue.get(until_done=True), []) # Nothing put: done
+        threading.Timer(0.1, self.put, ('late', 1)).start()
+        start = time.monotonic()
+        self.assertEqual([os.path.basename(task['path']) for task in self.queue.get(timeout=5)], ['late'])
+        self.assertLess(time.monotonic() - start, 5)
+
+    def test_get_until_done(self) -> None:
+        self.put('a', 1)
+        task, = self.queue.get(timeout=0)
+        self.assertEqual(self.queue.get(timeout=0.05, until_done=True), []) # Task being scanned: waits for a split or a requeue
+        waiting = threading.Thread(target=lambda: self.assertEqual(self.queue.get(until_done=True), []), daemon=True)
+        waiting.start()
+        self.queue.task_done()
+        waiting.join(5)
+        self.assertFalse(waiting.is_alive())
+
+    def test_leases(self) -> None:
+        self.put('a', 3)
+        self.put('b', 2)
+        self.put('c', 1)
+        a, = [dict(task) for task in self.queue.get(timeout=0, node='node-1')] # Copies, as given by the SchedulerManager proxy
+        b, = [dict(task) for task in self.queue.get(timeout=0, node='node-2')]
+        self.assertNotEqual(a['lease'], b['lease'])
+        self.queue.heartbeat('node-2')
+        self.queue.task_done(lease=b['lease'])
+
+        self.queue.nodes['node-1'] -= 60 # No heartbeat for a minute
+        self.assertEqual(self.queue.expire(30), {'node-1': 1})
+        self.assertEqual(self.get(), ['a']) # Requeued without its lease
+        self.queue.task_done(lease=a['lease']) # Late result of the expired node: not counted
+        self.assertFalse(self.queue.done())
+        self.queue.task_done()
+
+        c, = [dict(task) for task in self.queue.get(timeout=0, node='node-2')]
+        self.queue.release([c]) # Cancelled node
+        self.assertEqual(self.queue.leases, {})
+        self.assertEqual(self.get(), ['c'])
+        self.queue.task_done()
+        self.assertTrue(self.queue.done())
+
+        self.queue.leave('node-2')
+        self.assertTrue(self.queue.wait_nodes(0))
+
+    def test_set_url(self) -> None:
+        self.put('a', 2)
+        self.put('b', 1)
+        self.queue.set_url(os.path.join(self.folder.name, 'b'), 'https://example.org/b.pdf', priority=True)
+        b, = self.queue.get(timeout=0)
+        self.assertEqual((os.path.basename(b['path']), b['url']), ('b', 'https://example.org/b.pdf'))
+        self.assertEqual(self.queue.qsize(), 1)
+
+if __name__ == '__main__':
+    unittest.main()
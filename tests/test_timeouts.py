@@ -0,0 +1,75 @@
+"""
+Tests of the watchdog of script/pdf_scan/supervisor.py: a worker stuck in C code on a page is killed without losing
+the records it had not sent yet.
+
+    python -m pytest tests
+"""
+import os, ctypes, signal, logging, tempfile, unittest, multiprocessing
+
+from benchmark.corpus import generate_corpus
+from script.__main__ import DEFAULTS
+from script.option import Option
+from script.pdf_scan import supervisor
+from script.pdf_scan.backends import Extractor
+from script.pdf_scan.journal import Journal
+from script.pdf_scan.result_store import ResultStore
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def scan(option: Option, stuck: str, marker: str) -> None:
+    """
+    Scan in a forked process, where the second page of stuck holds the GIL for a minute on its first attempt:
+    the worker can neither abandon it nor send its batch from its flush_overdue thread
+    """
+    from script.script import initialize, main
+
+    supervisor.KILL_GRACE = 1
+    text = Extractor.text
+
+    def hold_gil(self, k: int) -> str:
+        if os.path.basename(self.path) == stuck and k == 1:
+            try:
+                open(marker, 'x').close()
+            except FileExistsError: # Retried after the kill
+                return text(self, k)
+            signal.pthread_sigmask(signal.SIG_BLOCK, [signal.SIGUSR1]) # The abandon signal would end the sleep
+            ctypes.PyDLL(None).sleep(60) # Called with the GIL held
+        return text(self, k)
+
+    Extractor.text = hold_gil
+    logger = logging.getLogger('test_timeouts')
+    logger.propagate = False
+    main(option, initialize(logger, widgets=False))
+
+@unittest.skipUnless(hasattr(os, 'fork') and hasattr(signal, 'pthread_sigmask'), 'needs fork and pthread_sigmask')
+class WorkerKilledTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.folder = tempfile.TemporaryDirectory()
+        self.pdf_folder = os.path.join(self.folder.name, 'pdf') + os.sep
+        self.data_folder = os.path.join(self.folder.name, 'data') + os.sep
+        keyword_file = os.path.join(ROOT, 'keywords.csv')
+        self.paths = generate_corpus(self.pdf_folder, keyword_file, n_files=6, n_pages=3, words_per_page=200, hit_rate=0.5)
+        self.option = Option(**{**DEFAULTS, 'pdf_folder': self.pdf_folder, 'data_folder': self.data_folder,
+                                'result_file': os.path.join(self.folder.name, 'result.html'), 'keyword_file': keyword_file,
+                                'n_workers': 2, 'progress_bar': False, 'cache_size': 0, 'page_timeout': 1,
+                                'result_batch_size': 1000, 'result_batch_latency': 1000})
+
+    def tearDown(self) -> None:
+        self.folder.cleanup()
+
+    def test_unsent_records_scanned_again(self) -> None:
+        # Bundles of 3, 2 and 1 pdf, largest first: the third largest pdf is scanned after two pdf whose records are in the batch
+        stuck = os.path.basename(sorted(self.paths, key=os.path.getsize, reverse=True)[2])
+        process = multiprocessing.get_context('fork').Process(target=scan, args=(self.option, stuck, os.path.join(self.folder.name, 'stuck')))
+        process.start()
+        process.join(120)
+        if process.is_alive():
+            process.kill()
+        self.assertEqual(process.exitcode, 0)
+        self.assertTrue(os.path.exists(os.path.join(self.folder.name, 'stuck')))
+
+        store = ResultStore(self.data_folder)
+        self.assertEqual(sorted(store.hashes()), sorted(os.path.basename(path) for path in self.paths))
+        self.assertEqual(store.get(stuck)['Timed out'], [2])
+        store.close()
+        self.assertEqual(Journal(self.data_folder + 'journal').read(), []) # Records of the killed worker are in the store